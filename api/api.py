@@ -1,8 +1,20 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from db.database import DatabaseManager
-from config import DB_PATH
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from api.cache import ResponseCache
+from api.stream import TickBroadcaster
+from db.database import DatabaseManager, ConnectionPool, DEFAULT_POOL_SIZE
+from db.migrations import ROLLUP_METRICS, ROLLUP_STATS
+from db.rollups import RESOLUTION_SECONDS, TIMESTAMP_FORMAT
+from config import DB_PATH, MONITOR_INTERVAL
+from typing import List, Optional
+import asyncio
+import datetime
+import math
+import os
 import random
+import threading
 
 app = FastAPI(title="Datacenter API", version="1.0")
 
@@ -15,13 +27,47 @@ app.add_middleware(
 )
 
 
+# Read-only connections shared by all requests; size bounds concurrent DB access.
+db_pool = ConnectionPool(
+    db_path=DB_PATH,
+    size=int(os.environ.get("API_DB_POOL_SIZE", DEFAULT_POOL_SIZE)),
+    read_only=True,
+)
+
+
+# Computes live aggregates once per ingest tick for every /stream client.
+broadcaster = TickBroadcaster(db_pool)
+
+# Concurrent /predict calls are micro-batched into shared NNP forward passes. Created on
+# the first call, so serving the dashboard does not load torch or start an inference thread.
+predictor_service = None
+predictor_service_lock = threading.Lock()
+
+
+def get_predictor_service():
+    global predictor_service
+    with predictor_service_lock:
+        if predictor_service is None:
+            from scheduling.predictor_service import PredictorService
+            predictor_service = PredictorService(max_wait=float(os.environ.get("NNP_MAX_WAIT", 0.002))).start()
+    return predictor_service
+
+
+@app.on_event("shutdown")
+def close_db_pool():
+    broadcaster.stop()
+    if predictor_service is not None:
+        predictor_service.stop()
+    db_pool.close()
+
+
 def get_db():
-    db_manager = DatabaseManager(db_path=DB_PATH)
-    db_manager.connect()
-    try:
+    with db_pool.connection() as db_manager:
         yield db_manager
-    finally:
-        db_manager.close()
+
+# Aggregates shared by dashboard clients. Entries also expire as soon as a new
+# metrics tick is committed (the ingest generation changes).
+response_cache = ResponseCache(ttl=float(os.environ.get("API_CACHE_TTL", 5)))
 
 @app.get("/gpus/{gpu_id}")
 def get_gpu_details(gpu_id: str, db: DatabaseManager = Depends(get_db)):
@@ -36,10 +82,9 @@ def get_gpu_details(gpu_id: str, db: DatabaseManager = Depends(get_db)):
         raise HTTPException(status_code=404, detail="GPU not found")
     cur.execute("""
         SELECT utilization, memory_used_gb, temperature, power_watts, timestamp 
-        FROM gpu_metrics 
-        WHERE gpu_id = ? 
-          AND timestamp = (SELECT MAX(timestamp) FROM gpu_metrics WHERE gpu_id = ?)
-    """, (gpu_id, gpu_id))
+        FROM gpu_latest_metrics 
+        WHERE gpu_id = ?
+    """, (gpu_id,))
     dynamic_info = cur.fetchone()
     return {"static": static_info, "dynamic": dynamic_info}
 
@@ -64,33 +109,22 @@ def list_gpus_in_rack(rack_id: str, db: DatabaseManager = Depends(get_db)):
     gpus = cur.fetchall()
     return {"gpus": gpus}
 
-@app.get("/cluster_overview")
-def cluster_overview(db: DatabaseManager = Depends(get_db)):
+def compute_cluster_health(cur):
     """
-    Returns a health overview for each cluster using the latest metric entry per GPU.
-    Only 4 random clusters are returned.
+    Health of every cluster from the latest metric entry per GPU.
+    Shared (and cached) by /cluster_overview and /overview.
     """
-    cur = db.conn.cursor()
     query = """
         SELECT c.cluster_name, AVG(gm.utilization) as avg_util, AVG(gm.temperature) as avg_temp, 
                SUM(CASE WHEN gm.utilization >= 95 THEN 1 ELSE 0 END) as alerts
         FROM clusters c
         JOIN racks r ON c.cluster_name = r.cluster_name
         JOIN gpus g ON r.rack_id = g.rack_id
-        JOIN (
-            SELECT gpu_id, utilization, temperature, timestamp
-            FROM gpu_metrics
-            WHERE (gpu_id, timestamp) IN (
-                SELECT gpu_id, MAX(timestamp)
-                FROM gpu_metrics
-                GROUP BY gpu_id
-            )
-        ) gm ON g.gpu_id = gm.gpu_id
+        JOIN gpu_latest_metrics gm ON g.gpu_id = gm.gpu_id
         GROUP BY c.cluster_name
     """
-    rows = cur.execute(query).fetchall()
-    cluster_overview = []
-    for cluster_name, avg_util, avg_temp, alerts in rows:
+    clusters = []
+    for cluster_name, avg_util, avg_temp, alerts in cur.execute(query).fetchall():
         if avg_util < 90:
             status = "Healthy"
         elif avg_util < 95:
@@ -103,43 +137,27 @@ def cluster_overview(db: DatabaseManager = Depends(get_db)):
             temp_class = "High"
         else:
             temp_class = "Critical"
-        cluster_overview.append({
+        clusters.append({
             "cluster_name": cluster_name,
             "status": status,
             "current_utilization": round(avg_util, 2),
             "current_temperature": temp_class,
             "alerts": "None" if alerts == 0 else f"{alerts} active"
         })
-    # Return only 4 random clusters
-    if len(cluster_overview) > 4:
-        cluster_overview = random.sample(cluster_overview, 4)
-    return {"cluster_overview": cluster_overview}
+    return clusters
 
-@app.get("/overview")
-def overview(db: DatabaseManager = Depends(get_db)):
+def compute_fleet_summary(cur):
     """
-    Provides an overall dashboard view including:
-      - Total GPUs
-      - Average utilization (using the latest metric for each GPU)
-      - Average power efficiency, computed as (avg utilization / avg power) * 100,
-        based on the latest metric for each GPU.
-      - GPU counts by vendor
-      - Cluster health overview (4 random clusters)
+    Fleet-wide numbers for /overview: total GPUs, average utilization and power
+    efficiency from the latest record per GPU, and GPU counts by vendor.
     """
-    cur = db.conn.cursor()
-    
     # Total GPUs.
     total_gpus = cur.execute("SELECT COUNT(*) FROM gpus").fetchone()[0]
     
     # Compute average utilization and average power using the latest record per GPU.
     agg_query = """
         SELECT AVG(gm.utilization) as avg_util, AVG(gm.power_watts) as avg_power
-        FROM gpu_metrics gm
-        WHERE (gm.gpu_id, gm.timestamp) IN (
-            SELECT gpu_id, MAX(timestamp)
-            FROM gpu_metrics
-            GROUP BY gpu_id
-        )
+        FROM gpu_latest_metrics gm
     """
     agg = cur.execute(agg_query).fetchone()
     avg_util = agg[0] if agg[0] is not None else 0
@@ -152,57 +170,87 @@ def overview(db: DatabaseManager = Depends(get_db)):
     for vendor, count in rows:
         vendor_counts[vendor] = count
 
-    # Get cluster health overview as in /cluster_overview.
-    cluster_query = """
-        SELECT c.cluster_name, AVG(gm.utilization) as avg_util, AVG(gm.temperature) as avg_temp, 
-               SUM(CASE WHEN gm.utilization >= 95 THEN 1 ELSE 0 END) as alerts
-        FROM clusters c
-        JOIN racks r ON c.cluster_name = r.cluster_name
-        JOIN gpus g ON r.rack_id = g.rack_id
-        JOIN (
-            SELECT gpu_id, utilization, temperature, timestamp
-            FROM gpu_metrics
-            WHERE (gpu_id, timestamp) IN (
-                SELECT gpu_id, MAX(timestamp)
-                FROM gpu_metrics
-                GROUP BY gpu_id
-            )
-        ) gm ON g.gpu_id = gm.gpu_id
-        GROUP BY c.cluster_name
-    """
-    clusters = []
-    for row in cur.execute(cluster_query).fetchall():
-        cluster_name, avg_util_cluster, avg_temp, alerts = row
-        if avg_util_cluster < 90:
-            status = "Healthy"
-        elif avg_util_cluster < 95:
-            status = "Warning"
-        else:
-            status = "Critical"
-        if avg_temp < 60:
-            temp_class = "Normal"
-        elif avg_temp < 80:
-            temp_class = "High"
-        else:
-            temp_class = "Critical"
-        clusters.append({
-            "cluster_name": cluster_name,
-            "status": status,
-            "current_utilization": round(avg_util_cluster, 2),
-            "current_temperature": temp_class,
-            "alerts": "None" if alerts == 0 else f"{alerts} active"
-        })
-    if len(clusters) > 4:
-        clusters = random.sample(clusters, 4)
-    
     return {
         "total_gpus": total_gpus,
         "avg_utilization": round(avg_util, 2),
         "avg_power_efficiency": round(power_efficiency, 2),
         "vendor_counts": vendor_counts,
-        "cluster_health": clusters
     }
 
+def cached(db, key, compute):
+    """Serves `compute(cursor)` from the response cache until it expires or new metrics are committed."""
+    cur = db.conn.cursor()
+    return response_cache.get_or_compute(key, db.get_ingest_generation(), lambda: compute(cur))
+
+@app.get("/cluster_overview")
+def cluster_overview(db: DatabaseManager = Depends(get_db)):
+    """
+    Returns a health overview for each cluster using the latest metric entry per GPU.
+    Only 4 random clusters are returned.
+    """
+    cluster_overview = cached(db, "cluster_health", compute_cluster_health)
+    # Return only 4 random clusters
+    if len(cluster_overview) > 4:
+        cluster_overview = random.sample(cluster_overview, 4)
+    return {"cluster_overview": cluster_overview}
+
+@app.get("/overview")
+def overview(db: DatabaseManager = Depends(get_db)):
+    """
+    Provides an overall dashboard view including:
+      - Total GPUs
+      - Average utilization (using the latest metric for each GPU)
+      - Average power efficiency, computed as (avg utilization / avg power) * 100,
+        based on the latest metric for each GPU.
+      - GPU counts by vendor
+      - Cluster health overview (4 random clusters)
+    """
+    summary = cached(db, "fleet_summary", compute_fleet_summary)
+    # Get cluster health overview as in /cluster_overview.
+    clusters = cached(db, "cluster_health", compute_cluster_health)
+    if len(clusters) > 4:
+        clusters = random.sample(clusters, 4)
+    
+    return {**summary, "cluster_health": clusters}
+
+@app.get("/stream")
+async def stream(request: Request, clusters: Optional[str] = None, racks: Optional[str] = None):
+    """
+    Server-Sent Events stream of live metrics. The first event is a snapshot; every
+    committed ingest tick then sends a "tick" event with only what changed: fleet
+    summary, cluster and rack aggregates, and GPU samples. clusters and racks are
+    comma-separated filters; GPU samples are only sent for filtered subscriptions.
+    """
+    subscription = broadcaster.subscribe(
+        asyncio.get_running_loop(),
+        clusters=clusters.split(",") if clusters else None,
+        racks=racks.split(",") if racks else None,
+    )
+
+    async def events():
+        try:
+            yield broadcaster.render(broadcaster.state, subscription, snapshot=True)
+            while not await request.is_disconnected():
+                try:
+                    yield await asyncio.wait_for(subscription.queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+        finally:
+            broadcaster.unsubscribe(subscription)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/stream_stats")
+def stream_stats():
+    """Subscriber count and per-tick compute time of the live stream."""
+    return broadcaster.stats()
+
+@app.get("/cache_stats")
+def cache_stats():
+    """Hit/miss counters of the /overview and /cluster_overview response cache."""
+    return response_cache.stats()
+
 @app.get("/rl_performance")
 def get_rl_performance(db: DatabaseManager = Depends(get_db)):
     """
@@ -214,3 +262,172 @@ def get_rl_performance(db: DatabaseManager = Depends(get_db)):
     records = cur.fetchall()
     results = [{"day": r[0], "average_reward": r[1], "timestamp": r[2]} for r in records]
     return {"rl_performance": results}
+
+@app.get("/migrations")
+def get_task_migrations(limit: int = Query(100, ge=1, le=1000),
+                        cluster: Optional[str] = None,
+                        gpu_id: Optional[str] = None,
+                        db: DatabaseManager = Depends(get_db)):
+    """
+    Most recent task migrations made by the rebalancer, newest first.
+    Filter by cluster, or by gpu_id to see moves off or onto one GPU.
+    """
+    conditions, params = [], []
+    if cluster:
+        conditions.append("cluster_name = ?")
+        params.append(cluster)
+    if gpu_id:
+        conditions.append("(from_gpu_id = ? OR to_gpu_id = ?)")
+        params.extend([gpu_id, gpu_id])
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    rows = db.conn.execute(f"""
+        SELECT migration_id, task_id, from_gpu_id, to_gpu_id, cluster_name,
+               task_utilization, task_memory_gb, source_utilization, created_at
+        FROM task_migrations
+        {where}
+        ORDER BY migration_id DESC
+        LIMIT ?
+    """, params + [limit]).fetchall()
+    return {"migrations": [
+        {"migration_id": r[0], "task_id": r[1], "from_gpu_id": r[2], "to_gpu_id": r[3], "cluster": r[4],
+         "task_utilization": r[5], "task_memory_gb": r[6], "source_utilization": r[7], "created_at": r[8]}
+        for r in rows
+    ]}
+
+class GPUState(BaseModel):
+    gpu_id: str
+    utilization: float
+    memory_used_gb: float
+
+class PredictRequest(BaseModel):
+    gpus: Optional[List[GPUState]] = None
+    gpu_ids: Optional[List[str]] = None
+    k: int = Field(5, ge=1, le=1000)
+
+@app.post("/predict")
+def predict(body: PredictRequest):
+    """
+    Ranks GPUs by NNP suitability (higher is better) and returns the best k.
+    Send explicit states in `gpus`, or `gpu_ids` to score their latest metrics.
+    """
+    if body.gpus:
+        gpu_ids = [gpu.gpu_id for gpu in body.gpus]
+        features = [[gpu.utilization, gpu.memory_used_gb] for gpu in body.gpus]
+    elif body.gpu_ids:
+        placeholders = ", ".join(["?"] * len(body.gpu_ids))
+        # Borrowed only for the lookup: scoring can wait on the batcher, and the pool is shared.
+        with db_pool.connection() as db:
+            rows = db.conn.execute(f"""
+                SELECT gpu_id, utilization, memory_used_gb FROM gpu_latest_metrics WHERE gpu_id IN ({placeholders})
+            """, body.gpu_ids).fetchall()
+        if not rows:
+            raise HTTPException(status_code=404, detail="No metrics found for the requested GPUs")
+        gpu_ids = [row[0] for row in rows]
+        features = [[row[1], row[2]] for row in rows]
+    else:
+        raise HTTPException(status_code=400, detail="Provide gpus or gpu_ids")
+    try:
+        ranked = get_predictor_service().top_gpus(gpu_ids, features, k=body.k, timeout=30)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Predictor unavailable: {e}")
+    return {"candidates": [{"gpu_id": gpu_id, "score": score} for gpu_id, score in ranked]}
+
+@app.get("/predict_stats")
+def predict_stats():
+    """Request and batch counters of the micro-batching predictor."""
+    if predictor_service is None:
+        return {"running": False}
+    return {"running": True, **predictor_service.stats()}
+
+def choose_resolution(start, end, max_points, allow_raw):
+    """
+    Picks the finest resolution whose bucket count over [start, end) stays within
+    max_points, i.e. the coarsest level needed to fit the point budget.
+    Falls back to daily buckets for very long windows.
+    """
+    window_seconds = max((end - start).total_seconds(), 1)
+    levels = ([("raw", MONITOR_INTERVAL)] if allow_raw else []) + list(RESOLUTION_SECONDS.items())
+    for name, seconds in levels:
+        if math.ceil(window_seconds / seconds) <= max_points:
+            return name
+    return levels[-1][0]
+
+def read_history(cur, scope, scope_id, start, end, max_points):
+    resolution = choose_resolution(start, end, max_points, allow_raw=(scope == "gpu"))
+    bounds = (start.strftime(TIMESTAMP_FORMAT), end.strftime(TIMESTAMP_FORMAT))
+    points = []
+    if resolution == "raw":
+        rows = cur.execute(f"""
+            SELECT timestamp, {", ".join(ROLLUP_METRICS)}
+            FROM gpu_metrics
+            WHERE gpu_id = ? AND timestamp >= ? AND timestamp < ?
+            ORDER BY timestamp
+        """, (scope_id,) + bounds).fetchall()
+        for row in rows:
+            point = {"timestamp": row[0], "sample_count": 1}
+            for metric, value in zip(ROLLUP_METRICS, row[1:]):
+                point[metric] = {stat: value for stat in ROLLUP_STATS}
+            points.append(point)
+    else:
+        stat_columns = [f"{metric}_{stat}" for metric in ROLLUP_METRICS for stat in ROLLUP_STATS]
+        rows = cur.execute(f"""
+            SELECT bucket_start, sample_count, {", ".join(stat_columns)}
+            FROM metric_rollups
+            WHERE resolution = ? AND scope = ? AND scope_id = ? AND bucket_start >= ? AND bucket_start < ?
+            ORDER BY bucket_start
+        """, (resolution, scope, scope_id) + bounds).fetchall()
+        for row in rows:
+            point = {"timestamp": row[0], "sample_count": row[1]}
+            values = iter(row[2:])
+            for metric in ROLLUP_METRICS:
+                point[metric] = {stat: next(values) for stat in ROLLUP_STATS}
+            points.append(point)
+    return {"resolution": resolution, "start": bounds[0], "end": bounds[1], "points": points}
+
+def naive_local(moment):
+    """Stored timestamps are naive local time; aware query bounds are converted to match."""
+    if moment is not None and moment.tzinfo is not None:
+        return moment.astimezone().replace(tzinfo=None)
+    return moment
+
+def history_window(start, end):
+    start, end = naive_local(start), naive_local(end)
+    end = end or datetime.datetime.now()
+    start = start or end - datetime.timedelta(days=1)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    return start, end
+
+@app.get("/gpus/{gpu_id}/history")
+def get_gpu_history(gpu_id: str,
+                    start: Optional[datetime.datetime] = None,
+                    end: Optional[datetime.datetime] = None,
+                    max_points: int = Query(500, ge=1, le=10000),
+                    db: DatabaseManager = Depends(get_db)):
+    """
+    Metric history for one GPU between start and end (default: the last 24 hours).
+    Served from raw samples or the 1m/1h/1d rollups, whichever is the finest
+    resolution that fits within max_points.
+    """
+    cur = db.conn.cursor()
+    if cur.execute("SELECT 1 FROM gpus WHERE gpu_id = ?", (gpu_id,)).fetchone() is None:
+        raise HTTPException(status_code=404, detail="GPU not found")
+    start, end = history_window(start, end)
+    return {"gpu_id": gpu_id, **read_history(cur, "gpu", gpu_id, start, end, max_points)}
+
+@app.get("/clusters/{cluster_name}/history")
+def get_cluster_history(cluster_name: str,
+                        start: Optional[datetime.datetime] = None,
+                        end: Optional[datetime.datetime] = None,
+                        max_points: int = Query(500, ge=1, le=10000),
+                        db: DatabaseManager = Depends(get_db)):
+    """
+    Metric history aggregated over every GPU in a cluster, from the 1m/1h/1d rollups.
+    """
+    cur = db.conn.cursor()
+    if cur.execute("SELECT 1 FROM clusters WHERE cluster_name = ?", (cluster_name,)).fetchone() is None:
+        raise HTTPException(status_code=404, detail="Cluster not found")
+    start, end = history_window(start, end)
+    return {"cluster_name": cluster_name, **read_history(cur, "cluster", cluster_name, start, end, max_points)}
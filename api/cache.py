@@ -0,0 +1,89 @@
+import threading
+import time
+
+
+class _Pending:
+    def __init__(self, generation):
+        self.generation = generation
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResponseCache:
+    """
+    In-process cache for expensive endpoint payloads.
+
+    An entry is served while it is younger than `ttl` seconds and was computed for
+    the current ingest generation, so a new metrics commit invalidates it at once.
+    Concurrent misses on the same key are coalesced: the first caller computes the
+    value and every other caller waits for that result instead of recomputing.
+    """
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._entries = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+
+    def get_or_compute(self, key, generation, compute):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry_generation, expires_at, value = entry
+                if entry_generation == generation and expires_at > now:
+                    self.hits += 1
+                    return value
+                if entry_generation != generation:
+                    self.invalidations += 1
+                del self._entries[key]
+            pending = self._pending.get(key)
+            if pending is not None and pending.generation == generation:
+                self.coalesced += 1
+                is_leader = False
+            else:
+                pending = _Pending(generation)
+                self._pending[key] = pending
+                self.misses += 1
+                is_leader = True
+
+        if not is_leader:
+            pending.event.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value
+
+        try:
+            pending.value = compute()
+        except Exception as e:
+            pending.error = e
+            raise
+        finally:
+            with self._lock:
+                if pending.error is None:
+                    self._entries[key] = (generation, time.monotonic() + self.ttl, pending.value)
+                if self._pending.get(key) is pending:
+                    del self._pending[key]
+            pending.event.set()
+        return pending.value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "ttl_seconds": self.ttl,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "invalidations": self.invalidations,
+                "hit_ratio": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+            }
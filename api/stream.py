@@ -0,0 +1,218 @@
+import asyncio
+import json
+import threading
+import time
+
+LATEST_QUERY = """
+    SELECT g.gpu_id, g.rack_id, r.cluster_name,
+           gm.utilization, gm.memory_used_gb, gm.temperature, gm.power_watts, gm.timestamp
+    FROM gpu_latest_metrics gm
+    JOIN gpus g ON g.gpu_id = gm.gpu_id
+    JOIN racks r ON r.rack_id = g.rack_id
+"""
+# Per-subscriber backlog; a client that falls further behind is resynced with a snapshot.
+SUBSCRIBER_QUEUE_SIZE = 8
+
+
+def _summary(acc):
+    count, util, temp, power, alerts = acc
+    return {
+        "gpus": count,
+        "avg_utilization": round(util / count, 2),
+        "avg_temperature": round(temp / count, 2),
+        "avg_power_watts": round(power / count, 2),
+        "alerts": alerts,
+    }
+
+
+def _fragment(key, value):
+    """Pre-encodes one `"key": value` member so fan-out only joins strings."""
+    return f"{json.dumps(key)}: {json.dumps(value)}"
+
+
+class Subscription:
+    def __init__(self, loop, clusters=None, racks=None):
+        self.loop = loop
+        self.clusters = set(clusters) if clusters else None
+        self.racks = set(racks) if racks else None
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        # Newest generation already delivered (touched only on the event loop).
+        self.generation = -1
+
+
+class TickState:
+    """Encoded aggregates for one ingest generation, plus what changed since the previous one."""
+    def __init__(self, generation):
+        self.generation = generation
+        self.fleet = "{}"
+        self.clusters = {}          # cluster -> fragment
+        self.racks = {}             # rack -> fragment
+        self.gpus = {}              # gpu_id -> fragment
+        self.cluster_racks = {}     # cluster -> [rack]
+        self.rack_gpus = {}         # rack -> [gpu_id]
+        self.summaries = {}         # ("cluster"|"rack", id) -> summary dict
+        self.gpu_timestamps = {}    # gpu_id -> timestamp
+        self.changed_clusters = set()
+        self.changed_racks = set()
+        self.changed_gpus = set()
+
+
+class TickBroadcaster:
+    """
+    Pushes fleet, cluster, rack and GPU deltas to streaming clients.
+
+    One background thread watches the ingest generation. When a new tick is
+    committed it reads gpu_latest_metrics once, computes every aggregate once and
+    pre-encodes each cluster, rack and GPU as a JSON fragment. Each subscriber then
+    only gets the fragments it asked for joined into a message, so the cost of a
+    tick barely grows with the number of open dashboards.
+
+    Subscribers filter by clusters and/or racks. Unfiltered subscribers get fleet,
+    cluster and rack summaries; GPU-level deltas are only sent for the clusters or
+    racks a subscriber selected.
+    """
+    def __init__(self, pool, poll_interval=0.5):
+        self.pool = pool
+        self.poll_interval = poll_interval
+        self.state = None
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopping = threading.Event()
+        self.ticks_computed = 0
+        self.last_compute_seconds = 0.0
+
+    def subscribe(self, loop, clusters=None, racks=None):
+        subscription = Subscription(loop, clusters, racks)
+        with self._lock:
+            self._subscribers.add(subscription)
+            if self._thread is None:
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name="tick-broadcaster", daemon=True)
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def stop(self):
+        self._stopping.set()
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join()
+
+    def stats(self):
+        with self._lock:
+            subscribers = len(self._subscribers)
+        return {
+            "subscribers": subscribers,
+            "generation": self.state.generation if self.state else None,
+            "ticks_computed": self.ticks_computed,
+            "last_compute_ms": round(self.last_compute_seconds * 1000, 2),
+        }
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                with self.pool.connection() as db:
+                    generation = db.get_ingest_generation()
+                    if self.state is None or generation != self.state.generation:
+                        start = time.perf_counter()
+                        state = self._compute(db.conn.cursor(), generation)
+                        self.last_compute_seconds = time.perf_counter() - start
+                        self.ticks_computed += 1
+                        self._publish(state)
+            except Exception as e:
+                print(f"Error computing stream tick: {e}")
+            self._stopping.wait(self.poll_interval)
+
+    def _compute(self, cur, generation):
+        previous = self.state
+        state = TickState(generation)
+        fleet = [0, 0.0, 0.0, 0.0, 0]
+        accumulators = {}
+        for gpu_id, rack_id, cluster, util, mem, temp, power, ts in cur.execute(LATEST_QUERY):
+            alert = 1 if util >= 95 else 0
+            for acc in (fleet,
+                        accumulators.setdefault(("cluster", cluster), [0, 0.0, 0.0, 0.0, 0]),
+                        accumulators.setdefault(("rack", rack_id), [0, 0.0, 0.0, 0.0, 0])):
+                acc[0] += 1
+                acc[1] += util
+                acc[2] += temp
+                acc[3] += power
+                acc[4] += alert
+            if rack_id not in state.rack_gpus:
+                state.rack_gpus[rack_id] = []
+                state.cluster_racks.setdefault(cluster, []).append(rack_id)
+            state.rack_gpus[rack_id].append(gpu_id)
+            state.gpu_timestamps[gpu_id] = ts
+            if previous is not None and previous.gpu_timestamps.get(gpu_id) == ts:
+                state.gpus[gpu_id] = previous.gpus[gpu_id]
+            else:
+                state.gpus[gpu_id] = _fragment(gpu_id, {
+                    "utilization": util, "memory_used_gb": mem, "temperature": temp,
+                    "power_watts": power, "timestamp": ts,
+                })
+                state.changed_gpus.add(gpu_id)
+
+        state.fleet = json.dumps(_summary(fleet)) if fleet[0] else "{}"
+        for (kind, key), acc in accumulators.items():
+            summary = _summary(acc)
+            state.summaries[(kind, key)] = summary
+            target, changed = (state.clusters, state.changed_clusters) if kind == "cluster" else (state.racks, state.changed_racks)
+            target[key] = _fragment(key, summary)
+            if previous is None or previous.summaries.get((kind, key)) != summary:
+                changed.add(key)
+        return state
+
+    def _publish(self, state):
+        self.state = state
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            message = self.render(state, subscription, snapshot=False)
+            subscription.loop.call_soon_threadsafe(self._offer, subscription, message, state.generation)
+
+    def _offer(self, subscription, message, generation):
+        # A client whose initial snapshot already covers this tick skips it.
+        if generation <= subscription.generation:
+            return
+        subscription.generation = generation
+        try:
+            subscription.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # The client is too slow for deltas; replace its backlog with one snapshot.
+            while not subscription.queue.empty():
+                subscription.queue.get_nowait()
+            subscription.queue.put_nowait(self.render(self.state, subscription, snapshot=True))
+
+    def render(self, state, subscription, snapshot):
+        """Builds one SSE event from pre-encoded fragments. Snapshots carry everything, ticks only changes."""
+        if state is None:
+            return "event: snapshot\ndata: {}\n\n"
+        if snapshot:
+            subscription.generation = max(subscription.generation, state.generation)
+        clusters = subscription.clusters
+        racks = subscription.racks
+        if racks is not None:
+            rack_ids = racks
+        elif clusters is not None:
+            rack_ids = [rack for cluster in clusters for rack in state.cluster_racks.get(cluster, [])]
+        else:
+            rack_ids = state.racks.keys()
+        cluster_ids = clusters if clusters is not None else state.clusters.keys()
+        gpu_ids = [gpu for rack in rack_ids for gpu in state.rack_gpus.get(rack, [])] if (clusters or racks) else []
+
+        if not snapshot:
+            cluster_ids = [c for c in cluster_ids if c in state.changed_clusters]
+            rack_ids = [r for r in rack_ids if r in state.changed_racks]
+            gpu_ids = [g for g in gpu_ids if g in state.changed_gpus]
+        data = (
+            f'{{"generation": {state.generation}, "fleet": {state.fleet}, '
+            f'"clusters": {{{", ".join(state.clusters[c] for c in cluster_ids if c in state.clusters)}}}, '
+            f'"racks": {{{", ".join(state.racks[r] for r in rack_ids if r in state.racks)}}}, '
+            f'"gpus": {{{", ".join(state.gpus[g] for g in gpu_ids)}}}}}'
+        )
+        return f"event: {'snapshot' if snapshot else 'tick'}\ndata: {data}\n\n"
@@ -0,0 +1,148 @@
+"""
+Query latency on gpu_metrics before and after the index migration.
+
+Seeds a database with NUM_ROWS metric rows (10M by default) without secondary
+indexes, times the dashboard's typical lookups, upgrades the database in place
+with apply_migrations and times the same lookups again.
+
+    python -m benchmarks.bench_db_indexes --rows 10000000 --gpus 50000
+"""
+import argparse
+import datetime
+import os
+import random
+import statistics
+import tempfile
+import time
+from db.database import DatabaseManager
+from db.migrations import MIGRATIONS, drop_gpu_metrics_indexes, get_schema_version, apply_migrations
+
+START_DATE = datetime.datetime(2024, 1, 1)
+INTERVAL_SECONDS = 20
+SEED_BATCH = 100000
+
+
+def seed_database(db, num_rows, num_gpus, num_clusters=50, racks_per_cluster=10):
+    cur = db.conn.cursor()
+    cur.execute("PRAGMA synchronous=OFF")
+    clusters = [f"Cluster-{c}" for c in range(num_clusters)]
+    racks = [(f"{cluster}-R{r}", cluster) for cluster in clusters for r in range(racks_per_cluster)]
+    gpu_ids = [f"gpu-{i:06d}" for i in range(num_gpus)]
+    cur.executemany("INSERT OR IGNORE INTO clusters (cluster_name) VALUES (?)", [(c,) for c in clusters])
+    cur.executemany("INSERT OR IGNORE INTO racks (rack_id, cluster_name) VALUES (?, ?)", racks)
+    cur.executemany("""
+        INSERT OR REPLACE INTO gpus (gpu_id, rack_id, vendor, model, memory_total_gb, compute_tflops, bandwidth_gbps)
+        VALUES (?, ?, 'Nvidia', 'H100', 80, 60, 2000)
+    """, [(gpu_id, racks[i % len(racks)][0]) for i, gpu_id in enumerate(gpu_ids)])
+    db.conn.commit()
+
+    # Rows arrive tick by tick, one sample per GPU per interval, like the monitors write them.
+    def rows(start, stop):
+        for n in range(start, stop):
+            tick, gpu_index = divmod(n, num_gpus)
+            ts = (START_DATE + datetime.timedelta(seconds=INTERVAL_SECONDS * tick)).strftime("%Y-%m-%d %H:%M:%S")
+            yield (gpu_ids[gpu_index], random.uniform(0, 100), random.uniform(0, 80),
+                   random.uniform(30, 95), random.uniform(50, 500), ts)
+
+    for start in range(0, num_rows, SEED_BATCH):
+        cur.executemany("""
+            INSERT INTO gpu_metrics (gpu_id, utilization, memory_used_gb, temperature, power_watts, timestamp)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, rows(start, min(start + SEED_BATCH, num_rows)))
+        db.conn.commit()
+        print(f"Seeded {min(start + SEED_BATCH, num_rows)}/{num_rows} rows.", end="\r", flush=True)
+    print()
+    cur.execute("PRAGMA synchronous=NORMAL")
+    return gpu_ids, (num_rows - 1) // num_gpus
+
+
+def reset_to_unindexed(db):
+    """Puts the database back into its pre-migration state, as an old install would be."""
+    cur = db.conn.cursor()
+    drop_gpu_metrics_indexes(cur)
+    cur.execute("DROP INDEX IF EXISTS idx_racks_cluster_name")
+    cur.execute("DROP INDEX IF EXISTS idx_gpus_rack_id")
+    cur.execute("DELETE FROM schema_version")
+    db.conn.commit()
+
+
+def build_queries(gpu_ids, last_tick):
+    def ts(tick):
+        return (START_DATE + datetime.timedelta(seconds=INTERVAL_SECONDS * tick)).strftime("%Y-%m-%d %H:%M:%S")
+
+    window_start = ts(max(0, last_tick - 180))  # last hour
+    minute_start = ts(max(0, last_tick - 3))  # last minute
+    end = ts(last_tick)
+    return {
+        "latest sample for one GPU": lambda: (
+            "SELECT utilization, memory_used_gb, temperature, power_watts, timestamp FROM gpu_metrics "
+            "WHERE gpu_id = ? ORDER BY timestamp DESC LIMIT 1",
+            (random.choice(gpu_ids),)),
+        "one GPU, last hour": lambda: (
+            "SELECT timestamp, utilization, temperature FROM gpu_metrics "
+            "WHERE gpu_id = ? AND timestamp BETWEEN ? AND ?",
+            (random.choice(gpu_ids), window_start, end)),
+        "fleet average, last minute": lambda: (
+            "SELECT COUNT(*), AVG(utilization) FROM gpu_metrics WHERE timestamp BETWEEN ? AND ?",
+            (minute_start, end)),
+        "racks in one cluster": lambda: (
+            "SELECT * FROM racks WHERE cluster_name = ?",
+            (f"Cluster-{random.randrange(50)}",)),
+        "GPUs in one rack": lambda: (
+            "SELECT * FROM gpus WHERE rack_id = ?",
+            (f"Cluster-{random.randrange(50)}-R{random.randrange(10)}",)),
+    }
+
+
+def time_queries(db, queries, repeat):
+    results = {}
+    cur = db.conn.cursor()
+    for name, make_query in queries.items():
+        samples = []
+        for _ in range(repeat):
+            sql, params = make_query()
+            start = time.perf_counter()
+            cur.execute(sql, params).fetchall()
+            samples.append((time.perf_counter() - start) * 1000)
+        results[name] = statistics.median(samples)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark gpu_metrics indexes")
+    parser.add_argument("--rows", type=int, default=10000000, help="Number of gpu_metrics rows to seed")
+    parser.add_argument("--gpus", type=int, default=50000, help="Number of GPUs in the fleet")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per query (median is reported)")
+    parser.add_argument("--db", default=None, help="Database path (default: a temporary file)")
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix="bench_db_"), "bench.db")
+    db = DatabaseManager(db_path=db_path)
+    db.connect()
+    db.create_tables()
+    reset_to_unindexed(db)
+
+    print(f"Seeding {args.rows} rows for {args.gpus} GPUs into {db_path} ...")
+    start = time.perf_counter()
+    gpu_ids, last_tick = seed_database(db, args.rows, args.gpus)
+    print(f"Seeded in {time.perf_counter() - start:.1f} s.")
+
+    queries = build_queries(gpu_ids, last_tick)
+    before = time_queries(db, queries, args.repeat)
+
+    start = time.perf_counter()
+    apply_migrations(db.conn)
+    migrate_seconds = time.perf_counter() - start
+    print(f"Migrated to version {get_schema_version(db.conn)} (latest {MIGRATIONS[-1][0]}) in {migrate_seconds:.1f} s.")
+
+    after = time_queries(db, queries, args.repeat)
+
+    print(f"\n{'query':<30}{'before (ms)':>14}{'after (ms)':>14}{'speedup':>10}")
+    for name in queries:
+        speedup = before[name] / after[name] if after[name] > 0 else float("inf")
+        print(f"{name:<30}{before[name]:>14.2f}{after[name]:>14.2f}{speedup:>9.1f}x")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Steady-state write throughput for gpu_metrics.
+
+Producers generate one sample per GPU every --interval seconds for --duration
+seconds. "service" feeds the single-writer IngestionService; "legacy" reproduces
+the old pattern of one connection, per-row INSERTs and a commit per producer
+thread. Reports committed rows/sec and whether the writer kept up with the tick rate.
+
+    python -m benchmarks.bench_ingestion --gpus 50000 --interval 1 --duration 30
+
+Use --interval 0 to measure peak throughput instead of a paced fleet.
+"""
+import argparse
+import datetime
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from db.database import DatabaseManager
+from db.ingestion import IngestionService
+from benchmarks.bench_db_indexes import seed_database
+
+
+def make_rows(gpu_ids, timestamp):
+    return [(gpu_id, random.uniform(0, 100), random.uniform(0, 80), random.uniform(30, 95),
+             random.uniform(50, 500), timestamp) for gpu_id in gpu_ids]
+
+
+def chunkify(lst, num_chunks):
+    size = -(-len(lst) // num_chunks)
+    return [lst[i:i + size] for i in range(0, len(lst), size)]
+
+
+def service_write(ingestion, gpu_ids, timestamp):
+    ingestion.submit(make_rows(gpu_ids, timestamp))
+
+
+def legacy_write(db_path, gpu_ids, timestamp):
+    db = DatabaseManager(db_path=db_path)
+    db.connect()
+    cur = db.conn.cursor()
+    for row in make_rows(gpu_ids, timestamp):
+        cur.execute("""
+            INSERT INTO gpu_metrics (gpu_id, utilization, memory_used_gb, temperature, power_watts, timestamp)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, row)
+    db.conn.commit()
+    db.close()
+
+
+def run(mode, db_path, gpu_ids, interval, duration, producers):
+    chunks = chunkify(gpu_ids, producers)
+    ingestion = IngestionService(db_path=db_path).start() if mode == "service" else None
+    max_pending = 0
+    late_ticks = 0
+    ticks = 0
+    start = time.perf_counter()
+    next_tick = start
+    with ThreadPoolExecutor(max_workers=producers) as executor:
+        while time.perf_counter() - start < duration:
+            timestamp = (datetime.datetime(2024, 1, 1) + datetime.timedelta(seconds=ticks)).strftime("%Y-%m-%d %H:%M:%S")
+            if ingestion is not None:
+                futures = [executor.submit(service_write, ingestion, chunk, timestamp) for chunk in chunks]
+            else:
+                futures = [executor.submit(legacy_write, db_path, chunk, timestamp) for chunk in chunks]
+            for future in futures:
+                future.result()
+            ticks += 1
+            if ingestion is not None:
+                max_pending = max(max_pending, ingestion.pending_rows)
+            next_tick += interval
+            sleep_for = next_tick - time.perf_counter()
+            if sleep_for > 0:
+                time.sleep(sleep_for)
+            else:
+                late_ticks += 1
+    if ingestion is not None:
+        ingestion.flush()
+        ingestion.stop()
+    elapsed = time.perf_counter() - start
+    rows = ticks * len(gpu_ids)
+    result = {
+        "mode": mode,
+        "ticks": ticks,
+        "rows": rows,
+        "seconds": round(elapsed, 2),
+        "rows_per_sec": round(rows / elapsed),
+        "target_rows_per_sec": round(len(gpu_ids) / interval) if interval > 0 else None,
+        "late_ticks": late_ticks,
+    }
+    if ingestion is not None:
+        result["max_pending_rows"] = max_pending
+        result["batches_written"] = ingestion.batches_written
+        result["writer_busy_fraction"] = round(ingestion.write_seconds / elapsed, 3)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark gpu_metrics ingestion throughput")
+    parser.add_argument("--gpus", type=int, default=50000)
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between ticks")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run each mode")
+    parser.add_argument("--producers", type=int, default=4, help="Producer threads")
+    parser.add_argument("--mode", choices=["service", "legacy", "both"], default="both")
+    args = parser.parse_args()
+
+    modes = ["service", "legacy"] if args.mode == "both" else [args.mode]
+    for mode in modes:
+        db_path = os.path.join(tempfile.mkdtemp(prefix="bench_ingest_"), "bench.db")
+        db = DatabaseManager(db_path=db_path)
+        db.connect()
+        db.create_tables()
+        gpu_ids, _ = seed_database(db, 0, args.gpus)
+        db.close()
+        result = run(mode, db_path, gpu_ids, args.interval, args.duration, args.producers)
+        print(" ".join(f"{key}={value}" for key, value in result.items()))
+
+
+if __name__ == "__main__":
+    main()
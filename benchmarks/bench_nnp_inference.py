@@ -0,0 +1,84 @@
+"""
+GPU scoring latency for the NNP predictor.
+
+"loop" reproduces the old predict_best_gpu: one tensor and one forward pass per
+GPU. "batched" stacks every candidate into one matrix and scores it with
+scheduling.nnp_predictor.predict_top_gpus (chunked inference-mode passes plus
+topk). "int8 ts" runs the batched path on the frozen, dynamically quantized
+TorchScript export that nnp_train --quantize serves once it passes the quality
+gates. All modes use the same randomly initialised model and fleet, and the
+benchmark checks the loop and the batched path pick the same GPU.
+
+    python -m benchmarks.bench_nnp_inference --fleet-sizes 1000 10000 50000
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import numpy as np
+import torch
+from scheduling.nnp_predictor import INFERENCE_THREADS, NNPredictor, SCORE_CHUNK_SIZE, export_predictor, predict_top_gpus
+
+
+def make_fleet(num_gpus, rng):
+    gpu_ids = [f"GPU_{i}" for i in range(num_gpus)]
+    features = np.column_stack([rng.uniform(0, 100, num_gpus), rng.uniform(0, 80, num_gpus)]).astype(np.float32)
+    return gpu_ids, features
+
+
+def loop_best_gpu(model, gpu_ids, features):
+    best_score = float("-inf")
+    best_gpu = None
+    for gpu_id, row in zip(gpu_ids, features.tolist()):
+        x = torch.tensor(row, dtype=torch.float32).unsqueeze(0)
+        score = model(x).item()
+        if score > best_score:
+            best_score = score
+            best_gpu = gpu_id
+    return best_gpu
+
+
+def timed(fn, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return result, statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark looped vs batched NNP scoring")
+    parser.add_argument("--fleet-sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--k", type=int, default=8, help="Candidates returned by the batched path")
+    parser.add_argument("--chunk-size", type=int, default=SCORE_CHUNK_SIZE)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per mode (median is reported)")
+    parser.add_argument("--skip-loop-above", type=int, default=100000, help="Skip the slow loop for larger fleets")
+    parser.add_argument("--threads", type=int, default=INFERENCE_THREADS, help="torch intra-op threads")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    torch.manual_seed(args.seed)
+    torch.set_num_threads(args.threads)
+    rng = np.random.default_rng(args.seed)
+    model = NNPredictor().eval()
+    scripted = torch.jit.load(export_predictor(model, os.path.join(tempfile.mkdtemp(prefix="bench_nnp_"), "nnp.ts"), quantize=True))
+
+    print(f"{'gpus':>8} {'loop ms':>10} {'batched ms':>11} {'int8 ts ms':>11} {'speedup':>8}  same_best")
+    for num_gpus in args.fleet_sizes:
+        gpu_ids, features = make_fleet(num_gpus, rng)
+        top, batched = timed(lambda: predict_top_gpus(gpu_ids, features, k=args.k, model=model,
+                                                      chunk_size=args.chunk_size), args.repeat)
+        _, quantized = timed(lambda: predict_top_gpus(gpu_ids, features, k=args.k, model=scripted,
+                                                      chunk_size=args.chunk_size), args.repeat)
+        if num_gpus > args.skip_loop_above:
+            print(f"{num_gpus:>8} {'-':>10} {batched * 1000:>11.2f} {quantized * 1000:>11.2f} {'-':>8}  -")
+            continue
+        best, looped = timed(lambda: loop_best_gpu(model, gpu_ids, features), 1)
+        print(f"{num_gpus:>8} {looped * 1000:>10.2f} {batched * 1000:>11.2f} {quantized * 1000:>11.2f} "
+              f"{looped / min(batched, quantized):>7.1f}x  {best == top[0][0]}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Scheduler throughput and placement latency on synthetic fleets.
+
+For every fleet size a fresh database is seeded with GPUs drawn from
+gpu.simulation.gpu_specs and one latest metrics sample per GPU. The benchmark
+then times the fleet snapshot query and the CapacityIndex load, places --tasks
+tasks with the batch matcher, and streams the same number of tasks through an
+EventDrivenScheduler ("burst": all at once, "poisson": --rate tasks/sec).
+
+Reports placements/sec, p50/p99 submit-to-placement latency, the index's
+memory footprint and DB time as JSON, so runs can be diffed for regressions.
+
+    python -m benchmarks.bench_scheduler --fleet-sizes 1000 10000 50000 100000 --output bench_scheduler.json
+
+--scorer headroom isolates the scheduler from model cost; --scorer model scores
+with the NNP (randomly initialised unless --model-path is given).
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import random
+import tempfile
+import threading
+import time
+import tracemalloc
+import numpy as np
+from db.database import DatabaseManager
+from gpu.simulation import get_vendor, gpu_specs
+from scheduling.assignment import assign_tasks_indexed, headroom_scores
+from scheduling.capacity_index import CapacityIndex
+from scheduling.scheduler import EventDrivenScheduler
+
+TASK_MEMORY_GB = (1, 2, 4, 8, 16)
+TASK_UTILIZATION = (5, 10, 20, 30)
+# Share of tasks pinned to one cluster.
+CONSTRAINED_FRACTION = 0.2
+GPUS_PER_RACK = 100
+RACKS_PER_CLUSTER = 10
+
+
+def seed_fleet(db, num_gpus, rng):
+    cur = db.conn.cursor()
+    models = list(gpu_specs)
+    num_racks = -(-num_gpus // GPUS_PER_RACK)
+    racks = [(f"Rack-{r:05d}", f"Cluster-{r // RACKS_PER_CLUSTER:04d}") for r in range(num_racks)]
+    clusters = sorted({cluster for _, cluster in racks})
+    cur.executemany("INSERT OR IGNORE INTO clusters (cluster_name) VALUES (?)", [(c,) for c in clusters])
+    cur.executemany("INSERT OR IGNORE INTO racks (rack_id, cluster_name) VALUES (?, ?)", racks)
+    gpus = []
+    for i in range(num_gpus):
+        model = models[rng.randrange(len(models))]
+        specs = gpu_specs[model]
+        gpus.append((f"gpu-{i:06d}", racks[i // GPUS_PER_RACK][0], get_vendor(model), model,
+                     specs["memory_total_gb"], specs["compute_tflops"], specs["bandwidth_gbps"]))
+    cur.executemany("""
+        INSERT INTO gpus (gpu_id, rack_id, vendor, model, memory_total_gb, compute_tflops, bandwidth_gbps)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, gpus)
+    db.conn.commit()
+    timestamp = datetime.datetime(2024, 1, 1).strftime("%Y-%m-%d %H:%M:%S")
+    db.insert_gpu_metrics_batch([
+        (gpu[0], rng.uniform(0, 70), rng.uniform(0, 0.6) * gpu[4], rng.uniform(30, 85), rng.uniform(50, 400), timestamp)
+        for gpu in gpus
+    ])
+    return clusters
+
+
+def make_tasks(num_tasks, clusters, rng):
+    tasks = []
+    for i in range(num_tasks):
+        task = {"task_id": f"task-{i}", "memory_gb": rng.choice(TASK_MEMORY_GB),
+                "utilization": rng.choice(TASK_UTILIZATION)}
+        if rng.random() < CONSTRAINED_FRACTION:
+            task["cluster"] = rng.choice(clusters)
+        tasks.append(task)
+    return tasks
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else None
+
+
+def make_scorer(name, model_path):
+    if name == "headroom":
+        return headroom_scores
+    import torch
+    from scheduling.nnp_predictor import NNPredictor, score_gpus
+    model = NNPredictor()
+    if model_path:
+        model.load_state_dict(torch.load(model_path, map_location=torch.device("cpu")))
+    model.eval()
+    return lambda features: score_gpus(features, model=model).numpy()
+
+
+def run_batch(db_path, tasks, score_fn):
+    db = DatabaseManager(db_path=db_path)
+    db.connect()
+    start = time.perf_counter()
+    snapshot = db.get_fleet_snapshot()
+    snapshot_seconds = time.perf_counter() - start
+    db.close()
+
+    index = CapacityIndex()
+    tracemalloc.start()
+    start = time.perf_counter()
+    index.load_snapshot(snapshot)
+    index_seconds = time.perf_counter() - start
+    index_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    assignments, unassigned = assign_tasks_indexed(tasks, index, score_fn=score_fn)
+    elapsed = time.perf_counter() - start
+    return {
+        "snapshot_query_ms": round(snapshot_seconds * 1000, 2),
+        "index_load_ms": round(index_seconds * 1000, 2),
+        "index_memory_mb": round(index_bytes / 2**20, 2),
+        "batch_placed": len(assignments),
+        "batch_unplaced": len(unassigned),
+        "batch_seconds": round(elapsed, 4),
+        "batch_placements_per_sec": round(len(assignments) / elapsed) if elapsed else None,
+    }
+
+
+def run_stream(db_path, tasks, score_fn, arrival, rate, timeout):
+    scheduler = EventDrivenScheduler(db_path=db_path, rebalance=False, score_fn=score_fn).start()
+    # Warm-up: the first pass loads the snapshot into the index.
+    start = time.perf_counter()
+    scheduler.submit({"task_id": "warmup", "memory_gb": 0, "utilization": 0}).result(timeout)
+    startup_seconds = time.perf_counter() - start
+
+    latencies = []
+    lock = threading.Lock()
+
+    def record(submitted_at):
+        def done(future):
+            if not future.cancelled() and future.exception() is None:
+                with lock:
+                    latencies.append(time.perf_counter() - submitted_at)
+        return done
+
+    rng = random.Random(0)
+    futures = []
+    start = time.perf_counter()
+    next_arrival = start
+    for task in tasks:
+        if arrival == "poisson":
+            next_arrival += rng.expovariate(rate)
+            sleep_for = next_arrival - time.perf_counter()
+            if sleep_for > 0:
+                time.sleep(sleep_for)
+        future = scheduler.submit(task)
+        future.add_done_callback(record(time.perf_counter()))
+        futures.append(future)
+    deadline = time.perf_counter() + timeout
+    for future in futures:
+        try:
+            future.result(max(deadline - time.perf_counter(), 0))
+        except Exception:
+            pass
+    elapsed = time.perf_counter() - start
+    stats = scheduler.stats()
+    scheduler.stop()
+    return {
+        "arrival": arrival,
+        "startup_ms": round(startup_seconds * 1000, 2),
+        "stream_placed": len(latencies),
+        "stream_seconds": round(elapsed, 4),
+        "stream_placements_per_sec": round(len(latencies) / elapsed) if elapsed else None,
+        "latency_p50_ms": round(percentile(latencies, 50) * 1000, 3) if latencies else None,
+        "latency_p99_ms": round(percentile(latencies, 99) * 1000, 3) if latencies else None,
+        "scheduler_passes": stats["passes"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark scheduler throughput and placement latency")
+    parser.add_argument("--fleet-sizes", type=int, nargs="+", default=[1000, 10000, 50000, 100000])
+    parser.add_argument("--tasks", type=int, default=5000, help="Tasks placed per fleet size and mode")
+    parser.add_argument("--arrival", choices=["burst", "poisson"], default="burst")
+    parser.add_argument("--rate", type=float, default=2000.0, help="Tasks/sec for --arrival poisson")
+    parser.add_argument("--scorer", choices=["headroom", "model"], default="headroom")
+    parser.add_argument("--model-path", default=None, help="state_dict for --scorer model")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Seconds to wait for the stream to drain")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    score_fn = make_scorer(args.scorer, args.model_path)
+    results = []
+    for num_gpus in args.fleet_sizes:
+        rng = random.Random(args.seed)
+        db_path = os.path.join(tempfile.mkdtemp(prefix="bench_scheduler_"), "bench.db")
+        db = DatabaseManager(db_path=db_path)
+        db.connect()
+        db.create_tables()
+        clusters = seed_fleet(db, num_gpus, rng)
+        db.close()
+        tasks = make_tasks(args.tasks, clusters, rng)
+        result = {"gpus": num_gpus, "tasks": args.tasks}
+        # The scheduler logs every placement; keep that out of the timings and the report.
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            result.update(run_batch(db_path, tasks, score_fn))
+            result.update(run_stream(db_path, tasks, score_fn, args.arrival, args.rate, args.timeout))
+        results.append(result)
+        print(" ".join(f"{key}={value}" for key, value in result.items()), flush=True)
+
+    report = {
+        "benchmark": "scheduler",
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": vars(args),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import time
+from config import DB_PATH
+from db.database import DatabaseManager
+from db.migrations import create_gpu_metrics_indexes, drop_gpu_metrics_indexes
+
+# Rows per transaction while bulk loading.
+BULK_COMMIT_ROWS = 500000
+
+
+class BulkLoader:
+    """
+    Fast path for large historical imports into gpu_metrics.
+
+    While the loader is open it owns the database: durability pragmas are relaxed
+    (journal_mode=MEMORY or OFF, synchronous=OFF) and gpu_metrics' secondary
+    indexes are dropped. On exit the indexes and gpu_latest_metrics are rebuilt
+    once, the normal pragmas are restored and a throughput report is printed.
+    Stop the monitors and the API before loading: a crash mid-load can leave the
+    database inconsistent, and leaving WAL mode needs exclusive access.
+
+        with BulkLoader() as loader:
+            loader.load(rows)
+    """
+    def __init__(self, db_path=DB_PATH, journal_mode="MEMORY", commit_rows=BULK_COMMIT_ROWS):
+        if journal_mode.upper() not in ("MEMORY", "OFF"):
+            raise ValueError("journal_mode must be MEMORY or OFF")
+        self.db_path = db_path
+        self.journal_mode = journal_mode.upper()
+        self.commit_rows = commit_rows
+        self.db = None
+        self.rows_loaded = 0
+        self._uncommitted = 0
+        self._started = None
+
+    def __enter__(self):
+        self.db = DatabaseManager(db_path=self.db_path)
+        self.db.connect()
+        self.db.create_tables()
+        cur = self.db.conn.cursor()
+        cur.execute(f"PRAGMA journal_mode={self.journal_mode}")
+        cur.execute("PRAGMA synchronous=OFF")
+        drop_gpu_metrics_indexes(cur)
+        self.db.conn.commit()
+        self._started = time.perf_counter()
+        return self
+
+    def load(self, records):
+        """Inserts an iterable of gpu_metrics rows; generators are streamed, not materialized."""
+        cur = self.db.conn.cursor()
+        cur.executemany("""
+            INSERT INTO gpu_metrics (gpu_id, utilization, memory_used_gb, temperature, power_watts, timestamp)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, records)
+        self.rows_loaded += cur.rowcount
+        self._uncommitted += cur.rowcount
+        if self._uncommitted >= self.commit_rows:
+            self.db.conn.commit()
+            self._uncommitted = 0
+        return cur.rowcount
+
+    def rows_per_second(self):
+        elapsed = time.perf_counter() - self._started
+        return self.rows_loaded / elapsed if elapsed > 0 else 0.0
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.db.conn.commit()
+            load_seconds = time.perf_counter() - self._started
+            start = time.perf_counter()
+            cur = self.db.conn.cursor()
+            create_gpu_metrics_indexes(cur)
+            self.db.conn.commit()
+            index_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            self.db.rebuild_latest_metrics()
+            latest_seconds = time.perf_counter() - start
+            cur.execute("PRAGMA journal_mode=WAL")
+            cur.execute("PRAGMA synchronous=NORMAL")
+            rate = self.rows_loaded / load_seconds if load_seconds > 0 else 0.0
+            print(f"Bulk loaded {self.rows_loaded} rows in {load_seconds:.1f} s ({rate:,.0f} rows/s); "
+                  f"indexes rebuilt in {index_seconds:.1f} s, latest metrics in {latest_seconds:.1f} s.")
+        finally:
+            self.db.close()
+        return False
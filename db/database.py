@@ -1,17 +1,59 @@
+import pathlib
+import queue
 import sqlite3
+import threading
+from contextlib import contextmanager
+import numpy as np
 from sqlite3 import Error
 from config import DB_PATH
+from db.migrations import apply_migrations
+
+# Per-connection tuning, applied once when a connection is opened.
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL;",    # Safe with WAL; skips an fsync per commit.
+    "PRAGMA cache_size=-65536;",     # 64 MiB page cache.
+    "PRAGMA mmap_size=268435456;",   # 256 MiB of memory-mapped reads.
+    "PRAGMA temp_store=MEMORY;",
+)
+# Compiled statements kept per connection, keyed by SQL text.
+STATEMENT_CACHE_SIZE = 256
+DEFAULT_POOL_SIZE = 8
+# (column, dtype) of DatabaseManager.get_fleet_snapshot().
+FLEET_SNAPSHOT_COLUMNS = (
+    ("g.gpu_id", object),
+    ("g.rack_id", object),
+    ("r.cluster_name", object),
+    ("g.vendor", object),
+    ("g.model", object),
+    ("g.memory_total_gb", np.float64),
+    ("g.compute_tflops", np.float64),
+    ("gm.utilization", np.float64),
+    ("gm.memory_used_gb", np.float64),
+    ("gm.temperature", np.float64),
+    ("gm.power_watts", np.float64),
+    ("gm.timestamp", object),
+)
+
 
 class DatabaseManager:
-    def __init__(self, db_path=DB_PATH):
+    def __init__(self, db_path=DB_PATH, read_only=False):
         self.db_path = db_path
+        self.read_only = read_only
         self.conn = None
 
     def connect(self):
         try:
             # Enable multi-threaded access and WAL mode for better concurrency.
-            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
-            self.conn.execute("PRAGMA journal_mode=WAL;")
+            if self.read_only:
+                uri = pathlib.Path(self.db_path).resolve().as_uri() + "?mode=ro"
+                self.conn = sqlite3.connect(uri, uri=True, check_same_thread=False,
+                                            cached_statements=STATEMENT_CACHE_SIZE)
+            else:
+                self.conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                                            cached_statements=STATEMENT_CACHE_SIZE)
+                self.conn.execute("PRAGMA journal_mode=WAL;")
+            for pragma in CONNECTION_PRAGMAS:
+                self.conn.execute(pragma)
             print("Database connection established.")
         except Error as e:
             print(f"Error connecting to database: {e}")
@@ -19,6 +61,9 @@ class DatabaseManager:
     def create_tables(self):
         try:
             cursor = self.conn.cursor()
+            # Lets the retention manager return freed pages to the OS. Only takes
+            # effect on a brand-new database; existing ones are converted by a migration.
+            cursor.execute("PRAGMA auto_vacuum=INCREMENTAL;")
             # Vendors table
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS vendors (
@@ -72,6 +117,19 @@ class DatabaseManager:
                     FOREIGN KEY(gpu_id) REFERENCES gpus(gpu_id)
                 );
             """)
+
+            # Latest metrics table: One row per GPU holding its newest sample, kept in sync on ingest.
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS gpu_latest_metrics (
+                    gpu_id TEXT PRIMARY KEY,
+                    utilization REAL,
+                    memory_used_gb REAL,
+                    temperature REAL,
+                    power_watts REAL,
+                    timestamp DATETIME,
+                    FOREIGN KEY(gpu_id) REFERENCES gpus(gpu_id)
+                );
+            """)
             
             # RL performance table: Logs performance metrics from Federated PPO simulation.
             cursor.execute("""
@@ -83,10 +141,19 @@ class DatabaseManager:
                 );
             """)
             self.conn.commit()
+            self.migrate()
+
+            # Databases created before gpu_latest_metrics existed need a one-time backfill.
+            if cursor.execute("SELECT 1 FROM gpu_latest_metrics LIMIT 1").fetchone() is None:
+                self.rebuild_latest_metrics()
             print("All tables created or already exist.")
         except Error as e:
             print(f"Error creating tables: {e}")
 
+    def migrate(self):
+        """Brings the schema (indexes and later changes) up to the newest version."""
+        return apply_migrations(self.conn)
+
     def insert_cluster(self, cluster_name):
         try:
             cursor = self.conn.cursor()
@@ -121,9 +188,66 @@ class DatabaseManager:
                 INSERT INTO gpu_metrics (gpu_id, utilization, memory_used_gb, temperature, power_watts, timestamp)
                 VALUES (?, ?, ?, ?, ?, ?)
             """, records)
+            # Upsert in the same transaction so the latest table never lags gpu_metrics.
+            # Older samples (e.g. from a backfill) never overwrite a newer one.
+            cursor.executemany("""
+                INSERT INTO gpu_latest_metrics (gpu_id, utilization, memory_used_gb, temperature, power_watts, timestamp)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(gpu_id) DO UPDATE SET
+                    utilization = excluded.utilization,
+                    memory_used_gb = excluded.memory_used_gb,
+                    temperature = excluded.temperature,
+                    power_watts = excluded.power_watts,
+                    timestamp = excluded.timestamp
+                WHERE excluded.timestamp >= gpu_latest_metrics.timestamp
+            """, records)
+            self.bump_ingest_generation(cursor)
             self.conn.commit()
+            return True
         except Error as e:
+            self.conn.rollback()
             print(f"Error inserting metrics batch: {e}")
+            return False
+
+    def bump_ingest_generation(self, cursor):
+        cursor.execute("""
+            UPDATE ingest_state SET generation = generation + 1, last_commit = datetime('now', 'localtime')
+            WHERE id = 1
+        """)
+
+    def get_ingest_generation(self):
+        """Changes every time metrics are committed or pruned; cheap enough to read per request."""
+        try:
+            row = self.conn.execute("SELECT generation FROM ingest_state WHERE id = 1").fetchone()
+        except sqlite3.OperationalError:
+            # ingest_state arrives with migration 4; an older database has never counted.
+            return 0
+        return row[0] if row else 0
+
+    def rebuild_latest_metrics(self):
+        """
+        Recomputes gpu_latest_metrics from the full gpu_metrics history.
+        This is a full scan, so it is only meant for upgrades and bulk loads.
+        """
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute("DELETE FROM gpu_latest_metrics")
+            cursor.execute("""
+                INSERT OR REPLACE INTO gpu_latest_metrics (gpu_id, utilization, memory_used_gb, temperature, power_watts, timestamp)
+                SELECT gpu_id, utilization, memory_used_gb, temperature, power_watts, timestamp
+                FROM gpu_metrics
+                WHERE (gpu_id, timestamp) IN (
+                    SELECT gpu_id, MAX(timestamp)
+                    FROM gpu_metrics
+                    GROUP BY gpu_id
+                )
+                ORDER BY metric_id
+            """)
+            self.bump_ingest_generation(cursor)
+            self.conn.commit()
+        except Error as e:
+            self.conn.rollback()
+            print(f"Error rebuilding latest metrics: {e}")
 
     def insert_rl_performance(self, day, average_reward, timestamp):
         try:
@@ -136,6 +260,26 @@ class DatabaseManager:
         except Error as e:
             print(f"Error inserting RL performance: {e}")
 
+    def get_fleet_snapshot(self):
+        """
+        Static specs joined with the latest metrics for every GPU, in one scan.
+        Returns a dict of column name -> NumPy array, all in the same GPU order.
+        GPUs that have not reported any metrics yet are left out.
+        """
+        cursor = self.conn.cursor()
+        rows = cursor.execute(f"""
+            SELECT {", ".join(column for column, _ in FLEET_SNAPSHOT_COLUMNS)}
+            FROM gpus g
+            JOIN racks r ON r.rack_id = g.rack_id
+            JOIN gpu_latest_metrics gm ON gm.gpu_id = g.gpu_id
+            ORDER BY g.gpu_id
+        """).fetchall()
+        columns = list(zip(*rows)) or [()] * len(FLEET_SNAPSHOT_COLUMNS)
+        return {
+            column.split(".")[-1]: np.array(values, dtype=dtype)
+            for (column, dtype), values in zip(FLEET_SNAPSHOT_COLUMNS, columns)
+        }
+
     def get_all_gpus(self):
         cursor = self.conn.cursor()
         cursor.execute("SELECT gpu_id, model, memory_total_gb FROM gpus")
@@ -145,3 +289,66 @@ class DatabaseManager:
         if self.conn:
             self.conn.close()
             print("Database connection closed.")
+
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of connected DatabaseManager instances.
+    Connections are opened lazily up to `size` and then reused, so pragmas and the
+    statement cache are paid for once per connection instead of once per request.
+    When every connection is borrowed, callers wait up to `timeout` seconds.
+    """
+    def __init__(self, db_path=DB_PATH, size=DEFAULT_POOL_SIZE, read_only=True, timeout=30):
+        self.db_path = db_path
+        self.size = size
+        self.read_only = read_only
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_open = self._opened < self.size
+            if can_open:
+                self._opened += 1
+        if can_open:
+            db_manager = DatabaseManager(db_path=self.db_path, read_only=self.read_only)
+            db_manager.connect()
+            if db_manager.conn is None:
+                with self._lock:
+                    self._opened -= 1
+                raise Error(f"Could not open a pooled connection to {self.db_path}")
+            return db_manager
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise Error(f"Timed out after {self.timeout}s waiting for a database connection")
+
+    def release(self, db_manager):
+        # Never hand the next borrower a connection in the middle of a transaction.
+        if db_manager.conn.in_transaction:
+            db_manager.conn.rollback()
+        self._idle.put(db_manager)
+
+    @contextmanager
+    def connection(self):
+        db_manager = self.acquire()
+        try:
+            yield db_manager
+        finally:
+            self.release(db_manager)
+
+    def close(self):
+        while True:
+            try:
+                db_manager = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            db_manager.close()
+            with self._lock:
+                self._opened -= 1
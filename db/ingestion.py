@@ -0,0 +1,183 @@
+import collections
+import threading
+import time
+from config import DB_PATH
+from db.database import DatabaseManager
+
+# A 50k-GPU tick fits in one transaction.
+DEFAULT_BATCH_SIZE = 50000
+# Buffered rows are committed at least this often (seconds), even if the batch is not full.
+DEFAULT_FLUSH_INTERVAL = 0.5
+# Producers block in submit() once this many rows are waiting for the writer.
+DEFAULT_MAX_PENDING_ROWS = 500000
+
+
+class IngestionService:
+    """
+    Single writer for gpu_metrics.
+
+    Producers call submit() from any thread with a list of
+    (gpu_id, utilization, memory_used_gb, temperature, power_watts, timestamp) rows.
+    One writer thread owns the only write connection and commits the rows through
+    DatabaseManager.insert_gpu_metrics_batch in large executemany transactions,
+    flushing when batch_size rows are buffered or flush_interval seconds after the
+    oldest buffered row arrived. submit() blocks while max_pending_rows are queued,
+    so producers slow down instead of growing memory when the writer falls behind.
+    Commit listeners are called on the writer thread with every committed batch.
+    """
+    def __init__(self, db_path=DB_PATH, batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, max_pending_rows=DEFAULT_MAX_PENDING_ROWS):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending_rows = max_pending_rows
+        self._pending = collections.deque()
+        self._pending_rows = 0
+        self._oldest_pending = None
+        self._cond = threading.Condition()
+        self._flush_requested = False
+        self._stopping = False
+        self._thread = None
+        self._listeners = []
+        self.submitted_rows = 0
+        self.committed_rows = 0
+        self.failed_rows = 0
+        self.batches_written = 0
+        self.write_seconds = 0.0
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        self._stopping = False
+        self._thread = threading.Thread(target=self._writer_loop, name="ingestion-writer", daemon=True)
+        self._thread.start()
+        return self
+
+    def add_commit_listener(self, callback):
+        """Calls callback(rows) after each successful commit. Keep it fast: it runs on the writer thread."""
+        self._listeners.append(callback)
+        return callback
+
+    def remove_commit_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def submit(self, records, timeout=None):
+        """
+        Queues rows for the writer. Blocks while the queue is full; returns False if
+        `timeout` seconds pass first. A single submission larger than the whole queue
+        is still accepted once the queue has drained, so it cannot deadlock.
+        """
+        if not records:
+            return True
+        records = list(records)
+        with self._cond:
+            if self._stopping:
+                raise RuntimeError("IngestionService is stopped")
+            has_room = lambda: (self._stopping or self._pending_rows == 0
+                                or self._pending_rows + len(records) <= self.max_pending_rows)
+            if not self._cond.wait_for(has_room, timeout=timeout):
+                return False
+            # The writer may have stopped (or failed to start) while we waited for room.
+            if self._stopping:
+                raise RuntimeError("IngestionService is stopped")
+            if self._oldest_pending is None:
+                self._oldest_pending = time.monotonic()
+            self._pending.append(records)
+            self._pending_rows += len(records)
+            self.submitted_rows += len(records)
+            self._cond.notify_all()
+        return True
+
+    def flush(self, timeout=None):
+        """Blocks until every row submitted before this call has been written."""
+        with self._cond:
+            target = self.submitted_rows
+            self._flush_requested = True
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: self.committed_rows + self.failed_rows >= target, timeout=timeout)
+
+    def stop(self, timeout=None):
+        """Writes whatever is still queued, then stops the writer thread."""
+        if self._thread is None:
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        self._thread = None
+
+    @property
+    def pending_rows(self):
+        return self._pending_rows
+
+    def stats(self):
+        return {
+            "submitted_rows": self.submitted_rows,
+            "committed_rows": self.committed_rows,
+            "failed_rows": self.failed_rows,
+            "pending_rows": self._pending_rows,
+            "batches_written": self.batches_written,
+            "write_seconds": round(self.write_seconds, 3),
+        }
+
+    def _next_batch(self):
+        """Waits for a full batch, the flush deadline, a flush request or stop; returns the rows to write."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._pending or self._stopping)
+            if not self._pending:
+                return None
+            while self._pending_rows < self.batch_size and not (self._stopping or self._flush_requested):
+                remaining = self._oldest_pending + self.flush_interval - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = []
+            while self._pending and len(batch) < self.batch_size:
+                batch.extend(self._pending.popleft())
+            self._pending_rows -= len(batch)
+            self._oldest_pending = time.monotonic() if self._pending else None
+            if not self._pending:
+                self._flush_requested = False
+            # Wake producers blocked on a full queue.
+            self._cond.notify_all()
+            return batch
+
+    def _writer_loop(self):
+        db = DatabaseManager(db_path=self.db_path)
+        db.connect()
+        if db.conn is None:
+            # Fail producers loudly rather than letting them block on a queue nobody drains.
+            with self._cond:
+                self._stopping = True
+                self._cond.notify_all()
+            print("Ingestion writer could not open the database; stopping.")
+            return
+        try:
+            while True:
+                batch = self._next_batch()
+                if batch is None:
+                    break
+                start = time.perf_counter()
+                ok = db.insert_gpu_metrics_batch(batch)
+                elapsed = time.perf_counter() - start
+                if ok:
+                    # Before the counters move, so flush() returns only once listeners have seen the rows.
+                    self._notify_listeners(batch)
+                with self._cond:
+                    if ok:
+                        self.committed_rows += len(batch)
+                    else:
+                        self.failed_rows += len(batch)
+                    self.batches_written += 1
+                    self.write_seconds += elapsed
+                    self._cond.notify_all()
+        finally:
+            db.close()
+
+    def _notify_listeners(self, batch):
+        for callback in list(self._listeners):
+            try:
+                callback(batch)
+            except Exception as e:
+                print(f"Error in ingestion commit listener: {e}")
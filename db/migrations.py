@@ -0,0 +1,193 @@
+import datetime
+from sqlite3 import Error
+
+# Secondary indexes on gpu_metrics. They live in one place so that bulk loaders
+# can drop them before a large import and rebuild them afterwards.
+# idx_gpu_metrics_gpu_ts covers the metric columns, so per-GPU lookups and
+# per-GPU time ranges are answered from the index alone.
+GPU_METRICS_INDEXES = {
+    "idx_gpu_metrics_gpu_ts": """
+        CREATE INDEX IF NOT EXISTS idx_gpu_metrics_gpu_ts
+        ON gpu_metrics (gpu_id, timestamp, utilization, memory_used_gb, temperature, power_watts)
+    """,
+    "idx_gpu_metrics_ts": """
+        CREATE INDEX IF NOT EXISTS idx_gpu_metrics_ts
+        ON gpu_metrics (timestamp)
+    """,
+}
+
+
+def create_gpu_metrics_indexes(cursor):
+    for ddl in GPU_METRICS_INDEXES.values():
+        cursor.execute(ddl)
+
+
+def drop_gpu_metrics_indexes(cursor):
+    for name in GPU_METRICS_INDEXES:
+        cursor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def _add_lookup_indexes(cursor):
+    create_gpu_metrics_indexes(cursor)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_racks_cluster_name ON racks (cluster_name)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_gpus_rack_id ON gpus (rack_id)")
+    cursor.execute("ANALYZE")
+
+
+ROLLUP_METRICS = ("utilization", "memory_used_gb", "temperature", "power_watts")
+ROLLUP_STATS = ("avg", "min", "max", "p95")
+
+
+def _add_rollup_tables(cursor):
+    stat_columns = ",\n".join(
+        f"            {metric}_{stat} REAL" for metric in ROLLUP_METRICS for stat in ROLLUP_STATS
+    )
+    # resolution is '1m', '1h' or '1d'; scope is 'gpu', 'rack' or 'cluster'.
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS metric_rollups (
+            resolution TEXT NOT NULL,
+            scope TEXT NOT NULL,
+            scope_id TEXT NOT NULL,
+            bucket_start DATETIME NOT NULL,
+            sample_count INTEGER,
+{stat_columns},
+            PRIMARY KEY (resolution, scope, scope_id, bucket_start)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_metric_rollups_bucket ON metric_rollups (resolution, bucket_start)")
+    # Everything before completed_until has been rolled up at that resolution.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS rollup_watermarks (
+            resolution TEXT PRIMARY KEY,
+            completed_until DATETIME
+        )
+    """)
+
+
+def non_transactional(step):
+    """Marks a migration step that must run outside a transaction (e.g. VACUUM)."""
+    step.transactional = False
+    return step
+
+
+@non_transactional
+def _enable_incremental_vacuum(cursor):
+    # auto_vacuum can only change on an empty database or through a full VACUUM.
+    # New databases get it from create_tables; existing ones are rewritten once here.
+    if cursor.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        cursor.execute("VACUUM")
+
+
+def _add_ingest_state(cursor):
+    # Single row bumped by every metrics commit; readers compare generations to
+    # notice new data without scanning gpu_metrics (e.g. to invalidate caches).
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            generation INTEGER NOT NULL,
+            last_commit DATETIME
+        )
+    """)
+    cursor.execute("INSERT OR IGNORE INTO ingest_state (id, generation, last_commit) VALUES (1, 0, NULL)")
+
+
+def _add_task_migrations(cursor):
+    # One row per task the rebalancer moved off a GPU that stayed overloaded.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS task_migrations (
+            migration_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task_id TEXT NOT NULL,
+            from_gpu_id TEXT NOT NULL,
+            to_gpu_id TEXT NOT NULL,
+            cluster_name TEXT,
+            task_utilization REAL,
+            task_memory_gb REAL,
+            source_utilization REAL,
+            created_at DATETIME DEFAULT (datetime('now', 'localtime'))
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_task_migrations_created ON task_migrations (created_at)")
+
+
+def _add_rollup_row_mark(cursor):
+    # Highest gpu_metrics.metric_id the compactor has seen (kept on the '1m' row).
+    # Rows above it with a timestamp below completed_until arrived late and are
+    # merged into the existing rollups on the next compaction.
+    cursor.execute("ALTER TABLE rollup_watermarks ADD COLUMN last_metric_id INTEGER")
+
+
+# Ordered list of (version, description, step). A step receives a cursor and runs
+# inside the migration's transaction. Never edit an applied step: append a new one.
+MIGRATIONS = [
+    (1, "Indexes on gpu_metrics, racks and gpus", _add_lookup_indexes),
+    (2, "Time-bucketed metric rollups", _add_rollup_tables),
+    (3, "Incremental auto-vacuum for retention pruning", _enable_incremental_vacuum),
+    (4, "Ingest generation counter", _add_ingest_state),
+    (5, "Task migrations recorded by the rebalancer", _add_task_migrations),
+    (6, "Late-row mark for metric rollups", _add_rollup_row_mark),
+]
+
+
+def ensure_version_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at DATETIME
+        );
+    """)
+    conn.commit()
+
+
+def get_schema_version(conn):
+    ensure_version_table(conn)
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] if row[0] is not None else 0
+
+
+def apply_migrations(conn, target_version=None):
+    """
+    Applies every migration newer than the database's schema_version, in order.
+    Each migration runs in its own transaction together with its version row, so
+    an interrupted upgrade resumes from the last completed step. Steps marked
+    non_transactional run in autocommit mode and must be safe to repeat.
+    Returns the schema version the database ends up at.
+    """
+    current = get_schema_version(conn)
+    for version, description, step in MIGRATIONS:
+        if version <= current:
+            continue
+        if target_version is not None and version > target_version:
+            break
+        try:
+            cursor = conn.cursor()
+            if getattr(step, "transactional", True):
+                conn.execute("BEGIN")
+                step(cursor)
+            else:
+                step(cursor)
+                conn.execute("BEGIN")
+            cursor.execute(
+                "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                (version, description, datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            )
+            conn.commit()
+            current = version
+            print(f"Applied migration {version}: {description}")
+        except Error as e:
+            conn.rollback()
+            print(f"Error applying migration {version} ({description}): {e}")
+            break
+    return current
+
+
+if __name__ == "__main__":
+    # Upgrade an existing database in place: python -m db.migrations
+    from db.database import DatabaseManager
+
+    db = DatabaseManager()
+    db.connect()
+    db.create_tables()
+    print(f"Database is at schema version {get_schema_version(db.conn)}.")
+    db.close()
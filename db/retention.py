@@ -0,0 +1,181 @@
+import csv
+import datetime
+import gzip
+import os
+import time
+from sqlite3 import Error
+from config import DB_PATH
+from db.database import DatabaseManager
+from db.rollups import RESOLUTIONS
+
+DEFAULT_RETENTION_DAYS = 7
+# Days kept per rollup resolution; a resolution missing here (1d) is kept forever.
+DEFAULT_ROLLUP_RETENTION_DAYS = {"1m": 30, "1h": 365}
+# Rows deleted per transaction; small enough that the ingestion writer never waits long.
+DEFAULT_BATCH_SIZE = 5000
+# Pause between batches so other writers can take the lock.
+DEFAULT_PAUSE_SECONDS = 0.05
+# Free pages handed back to the filesystem per incremental_vacuum call.
+VACUUM_PAGES_PER_STEP = 2000
+# Rollup rows are only dropped once the next coarser resolution has rolled them up.
+PARENT_RESOLUTION = {child: resolution for resolution, _, child in RESOLUTIONS if child is not None}
+ARCHIVE_COLUMNS = ["metric_id", "gpu_id", "utilization", "memory_used_gb", "temperature", "power_watts", "timestamp"]
+
+
+class RetentionManager:
+    """
+    Prunes raw gpu_metrics rows older than retention_days and metric_rollups
+    rows older than rollup_retention_days for their resolution.
+
+    Rows are removed oldest first in small batches, each in its own short
+    transaction, with a pause in between so the ingestion writer is never blocked
+    for long. When archive_dir is set, each raw batch is first appended to a gzip
+    CSV per day (gpu_metrics_YYYY-MM-DD.csv.gz). A raw row is only removed once
+    the compactor has rolled it up: its minute is below the 1m watermark and its
+    metric_id is not above the compactor's last_metric_id (rows committed late
+    are merged into the rollups by the next compaction first). A rollup row is
+    only removed once the next coarser resolution covers it. After pruning,
+    freed pages are returned with incremental vacuum and the WAL is checkpointed
+    and truncated.
+    """
+    def __init__(self, db_path=DB_PATH, retention_days=DEFAULT_RETENTION_DAYS, archive_dir=None,
+                 batch_size=DEFAULT_BATCH_SIZE, pause_seconds=DEFAULT_PAUSE_SECONDS, rollup_retention_days=None):
+        self.db_path = db_path
+        self.retention_days = retention_days
+        self.rollup_retention_days = dict(DEFAULT_ROLLUP_RETENTION_DAYS if rollup_retention_days is None
+                                          else rollup_retention_days)
+        self.archive_dir = archive_dir
+        self.batch_size = batch_size
+        self.pause_seconds = pause_seconds
+
+    def _cutoff(self, db, now):
+        """
+        (timestamp, metric_id): raw rows older than the timestamp and not above the
+        metric_id may go. None while the 1m rollups have not started yet.
+        """
+        cutoff = (now - datetime.timedelta(days=self.retention_days)).strftime("%Y-%m-%d %H:%M:%S")
+        row = db.conn.execute(
+            "SELECT completed_until, last_metric_id FROM rollup_watermarks WHERE resolution = '1m'"
+        ).fetchone()
+        if not row or not row[0] or row[1] is None:
+            return None
+        return min(cutoff, row[0]), row[1]
+
+    def _archive(self, rows):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        by_day = {}
+        for row in rows:
+            by_day.setdefault(row[6][:10], []).append(row)
+        for day, day_rows in by_day.items():
+            path = os.path.join(self.archive_dir, f"gpu_metrics_{day}.csv.gz")
+            is_new = not os.path.exists(path)
+            # Appending writes a new gzip member; readers see one continuous CSV.
+            with gzip.open(path, "at", newline="") as f:
+                writer = csv.writer(f)
+                if is_new:
+                    writer.writerow(ARCHIVE_COLUMNS)
+                writer.writerows(day_rows)
+
+    def prune(self, now=None):
+        """
+        Removes (and optionally archives) every expired raw row, then every expired
+        rollup row. Returns the number of rows removed from both tables.
+        """
+        now = now or datetime.datetime.now()
+        db = DatabaseManager(db_path=self.db_path)
+        db.connect()
+        removed = 0
+        try:
+            cutoff = self._cutoff(db, now)
+            if cutoff is None:
+                print("Retention: no 1m rollup watermark yet; skipping prune until the compactor has run.")
+                return 0
+            cutoff, last_metric_id = cutoff
+            cur = db.conn.cursor()
+            while True:
+                rows = cur.execute("""
+                    SELECT metric_id, gpu_id, utilization, memory_used_gb, temperature, power_watts, timestamp
+                    FROM gpu_metrics
+                    WHERE timestamp < ? AND metric_id <= ?
+                    ORDER BY timestamp
+                    LIMIT ?
+                """, (cutoff, last_metric_id, self.batch_size)).fetchall()
+                if not rows:
+                    break
+                if self.archive_dir:
+                    self._archive(rows)
+                cur.executemany("DELETE FROM gpu_metrics WHERE metric_id = ?", [(row[0],) for row in rows])
+                # Cached and streamed aggregates must not keep counting the deleted rows.
+                db.bump_ingest_generation(cur)
+                db.conn.commit()
+                removed += len(rows)
+                time.sleep(self.pause_seconds)
+            if removed:
+                print(f"Retention: removed {removed} gpu_metrics rows older than {cutoff}.")
+            removed_rollups = self._prune_rollups(db, now)
+            if removed or removed_rollups:
+                self._reclaim(db)
+            removed += removed_rollups
+        except Error as e:
+            db.conn.rollback()
+            print(f"Error pruning metrics: {e}")
+        finally:
+            db.close()
+        return removed
+
+    def _prune_rollups(self, db, now):
+        removed = 0
+        cur = db.conn.cursor()
+        for resolution, days in self.rollup_retention_days.items():
+            parent = PARENT_RESOLUTION.get(resolution)
+            if days is None or parent is None:
+                continue
+            row = cur.execute("SELECT completed_until FROM rollup_watermarks WHERE resolution = ?", (parent,)).fetchone()
+            if not row or not row[0]:
+                continue
+            cutoff = min((now - datetime.timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S"), row[0])
+            resolution_removed = 0
+            while True:
+                keys = cur.execute("""
+                    SELECT scope, scope_id, bucket_start
+                    FROM metric_rollups
+                    WHERE resolution = ? AND bucket_start < ?
+                    ORDER BY bucket_start
+                    LIMIT ?
+                """, (resolution, cutoff, self.batch_size)).fetchall()
+                if not keys:
+                    break
+                cur.executemany("""
+                    DELETE FROM metric_rollups WHERE resolution = ? AND scope = ? AND scope_id = ? AND bucket_start = ?
+                """, [(resolution,) + key for key in keys])
+                db.bump_ingest_generation(cur)
+                db.conn.commit()
+                resolution_removed += len(keys)
+                time.sleep(self.pause_seconds)
+            if resolution_removed:
+                print(f"Retention: removed {resolution_removed} {resolution} rollup rows older than {cutoff}.")
+            removed += resolution_removed
+        return removed
+
+    def _reclaim(self, db):
+        cur = db.conn.cursor()
+        if cur.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            free_pages = cur.execute("PRAGMA freelist_count").fetchone()[0]
+            while free_pages > 0:
+                cur.execute(f"PRAGMA incremental_vacuum({VACUUM_PAGES_PER_STEP})").fetchall()
+                remaining = cur.execute("PRAGMA freelist_count").fetchone()[0]
+                if remaining >= free_pages:
+                    break
+                free_pages = remaining
+                time.sleep(self.pause_seconds)
+        # Shrinks the WAL back to zero once every reader has moved past it.
+        cur.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+
+    def run_forever(self, interval=3600):
+        while True:
+            self.prune()
+            time.sleep(interval)
+
+
+if __name__ == "__main__":
+    RetentionManager().run_forever()
@@ -0,0 +1,361 @@
+import datetime
+import time
+import numpy as np
+from sqlite3 import Error
+from config import DB_PATH
+from db.database import DatabaseManager
+from db.migrations import ROLLUP_METRICS, ROLLUP_STATS
+
+# (resolution, bucket seconds, child resolution). 1m is built from raw samples,
+# each coarser level from the level below it.
+RESOLUTIONS = (
+    ("1m", 60, None),
+    ("1h", 3600, "1m"),
+    ("1d", 86400, "1h"),
+)
+RESOLUTION_SECONDS = {name: seconds for name, seconds, _ in RESOLUTIONS}
+SCOPES = ("gpu", "rack", "cluster")
+# Raw samples are read in windows of at most this many seconds...
+RAW_WINDOW_SECONDS = 600
+# ...and at most this many rows (whole minutes, so a bucket is never split; a single minute is always read).
+RAW_WINDOW_MAX_ROWS = 1000000
+# A bucket is only rolled up once it closed this many seconds ago, so late writes still land.
+DEFAULT_LATENESS_SECONDS = 30
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+STAT_COLUMNS = [f"{metric}_{stat}" for metric in ROLLUP_METRICS for stat in ROLLUP_STATS]
+
+
+def floor_time(moment, seconds):
+    epoch = datetime.datetime(1970, 1, 1)
+    return epoch + datetime.timedelta(seconds=(int((moment - epoch).total_seconds()) // seconds) * seconds)
+
+
+def parse_timestamp(value):
+    return datetime.datetime.strptime(value[:19], TIMESTAMP_FORMAT)
+
+
+def _weighted_p95(codes, values, weights, num_groups):
+    """
+    Per-group 95th percentile (inverted CDF) of `values` weighted by `weights`.
+    With unit weights this is the exact sample percentile; on child rollups it
+    approximates the percentile from the children's p95 values and sample counts.
+    """
+    order = np.lexsort((values, codes))
+    codes, values, weights = codes[order], values[order], weights[order]
+    totals = np.bincount(codes, weights=weights, minlength=num_groups)
+    group_offsets = np.concatenate(([0.0], np.cumsum(totals)[:-1]))
+    within = np.cumsum(weights) - group_offsets[codes]
+    hits = np.flatnonzero(within >= 0.95 * totals[codes] - 1e-9)
+    _, first = np.unique(codes[hits], return_index=True)
+    result = np.empty(num_groups)
+    result[codes[hits[first]]] = values[hits[first]]
+    return result
+
+
+def coarser_bucket(bucket, seconds):
+    """bucket_start string of the 1h or 1d bucket holding `bucket`."""
+    return bucket[:13] + ":00:00" if seconds == 3600 else bucket[:10] + " 00:00:00"
+
+
+def aggregate(buckets, scope_ids, counts, stats):
+    """
+    Groups rows by (bucket, scope_id) and merges their statistics.
+    `stats` maps every STAT_COLUMNS name to an array; for raw samples pass the
+    sample value for all four stats of a metric and a count of 1.
+    Returns rows ready for metric_rollups (without resolution and scope).
+    """
+    keys = np.char.add(np.char.add(buckets.astype(str), "|"), scope_ids.astype(str))
+    unique_keys, codes = np.unique(keys, return_inverse=True)
+    num_groups = len(unique_keys)
+    counts = counts.astype(np.float64)
+    total_counts = np.bincount(codes, weights=counts, minlength=num_groups)
+    columns = []
+    for metric in ROLLUP_METRICS:
+        avg = np.bincount(codes, weights=stats[f"{metric}_avg"] * counts, minlength=num_groups) / total_counts
+        low = np.full(num_groups, np.inf)
+        np.minimum.at(low, codes, stats[f"{metric}_min"])
+        high = np.full(num_groups, -np.inf)
+        np.maximum.at(high, codes, stats[f"{metric}_max"])
+        p95 = _weighted_p95(codes, stats[f"{metric}_p95"], counts, num_groups)
+        columns.extend([avg, low, high, p95])
+    rows = []
+    for index, key in enumerate(unique_keys.tolist()):
+        bucket, scope_id = key.split("|", 1)
+        rows.append((scope_id, bucket, int(total_counts[index])) + tuple(float(c[index]) for c in columns))
+    return rows
+
+
+def merge_rollup_rows(rows, seconds=None):
+    """
+    Merges rows shaped like aggregate()'s output that share (bucket, scope_id),
+    optionally moving them to the coarser `seconds` buckets first. p95 of a merged
+    row is the count-weighted approximation also used between resolutions.
+    """
+    scope_ids, buckets, counts, *values = (np.array(column) for column in zip(*rows))
+    if seconds is not None:
+        buckets = np.array([coarser_bucket(bucket, seconds) for bucket in buckets.tolist()])
+    stats = {name: column.astype(np.float64) for name, column in zip(STAT_COLUMNS, values)}
+    return aggregate(buckets, scope_ids, counts, stats)
+
+
+class RollupCompactor:
+    """
+    Incrementally downsamples gpu_metrics into metric_rollups at 1-minute, 1-hour
+    and 1-day resolution for every GPU, rack and cluster (avg, min, max, p95 of
+    utilization, memory, temperature and power). Each resolution keeps a watermark
+    in rollup_watermarks, so every compact() only processes buckets that closed
+    since the previous run.
+
+    Raw rows committed after their minute was rolled up (backfills, bulk imports,
+    writers later than lateness_seconds) are found through last_metric_id, the
+    highest metric_id seen by the previous run, and merged into the existing
+    rollups at every resolution that already covers them. Each run only rolls up
+    rows up to the metric_id it started from, so every row is counted once.
+    """
+    def __init__(self, db_path=DB_PATH, lateness_seconds=DEFAULT_LATENESS_SECONDS):
+        self.db_path = db_path
+        self.lateness_seconds = lateness_seconds
+        self.db = None
+        self._max_metric_id = 0
+
+    def _watermark(self, resolution):
+        row = self.db.conn.execute(
+            "SELECT completed_until FROM rollup_watermarks WHERE resolution = ?", (resolution,)
+        ).fetchone()
+        return parse_timestamp(row[0]) if row and row[0] else None
+
+    def _write(self, resolution, rows_by_scope):
+        placeholders = ", ".join(["?"] * (5 + len(STAT_COLUMNS)))
+        cur = self.db.conn.cursor()
+        for scope, rows in rows_by_scope.items():
+            cur.executemany(f"""
+                INSERT OR REPLACE INTO metric_rollups
+                    (resolution, scope, scope_id, bucket_start, sample_count, {", ".join(STAT_COLUMNS)})
+                VALUES ({placeholders})
+            """, [(resolution, scope) + row for row in rows])
+        return cur
+
+    def _save(self, resolution, rows_by_scope, completed_until):
+        cur = self._write(resolution, rows_by_scope)
+        cur.execute("""
+            INSERT INTO rollup_watermarks (resolution, completed_until) VALUES (?, ?)
+            ON CONFLICT(resolution) DO UPDATE SET completed_until = excluded.completed_until
+        """, (resolution, completed_until.strftime(TIMESTAMP_FORMAT)))
+        self.db.conn.commit()
+
+    def _merge(self, resolution, rows_by_scope):
+        """Adds partial rollup rows to the rows already stored for their buckets."""
+        merged = {}
+        for scope, rows in rows_by_scope.items():
+            existing = []
+            for row in rows:
+                stored = self.db.conn.execute(f"""
+                    SELECT scope_id, bucket_start, sample_count, {", ".join(STAT_COLUMNS)}
+                    FROM metric_rollups
+                    WHERE resolution = ? AND scope = ? AND scope_id = ? AND bucket_start = ?
+                """, (resolution, scope, row[0], row[1])).fetchone()
+                if stored is not None:
+                    existing.append(stored)
+            merged[scope] = merge_rollup_rows(list(rows) + existing)
+        self._write(resolution, merged)
+
+    def _merge_late_rows(self):
+        """
+        Merges raw rows committed since the last run whose minute is already below
+        the 1m watermark, then moves last_metric_id up to the current maximum.
+        """
+        row = self.db.conn.execute(
+            "SELECT completed_until, last_metric_id FROM rollup_watermarks WHERE resolution = '1m'"
+        ).fetchone()
+        last_seen = row[1] if row else None
+        self._max_metric_id = self.db.conn.execute("SELECT COALESCE(MAX(metric_id), 0) FROM gpu_metrics").fetchone()[0]
+        watermarks = {resolution: self._watermark(resolution) for resolution in RESOLUTION_SECONDS}
+        merged = 0
+        if last_seen is not None and watermarks["1m"] is not None:
+            while last_seen < self._max_metric_id:
+                upper = min(last_seen + RAW_WINDOW_MAX_ROWS, self._max_metric_id)
+                rows = self.db.conn.execute("""
+                    SELECT substr(m.timestamp, 1, 16) || ':00', m.gpu_id, g.rack_id, r.cluster_name,
+                           m.utilization, m.memory_used_gb, m.temperature, m.power_watts
+                    FROM gpu_metrics m
+                    JOIN gpus g ON g.gpu_id = m.gpu_id
+                    JOIN racks r ON r.rack_id = g.rack_id
+                    WHERE m.metric_id > ? AND m.metric_id <= ? AND m.timestamp < ?
+                """, (last_seen, upper, watermarks["1m"].strftime(TIMESTAMP_FORMAT))).fetchall()
+                if rows:
+                    partial = self._aggregate_raw(rows)
+                    for resolution, seconds, child in RESOLUTIONS:
+                        if child is not None:
+                            partial = {scope: merge_rollup_rows(scope_rows, seconds)
+                                       for scope, scope_rows in partial.items()}
+                        if watermarks[resolution] is None:
+                            break
+                        # Buckets at or past a level's watermark are built from the level below later on.
+                        covered = watermarks[resolution].strftime(TIMESTAMP_FORMAT)
+                        due = {scope: [late for late in scope_rows if late[1] < covered]
+                               for scope, scope_rows in partial.items()}
+                        self._merge(resolution, {scope: due_rows for scope, due_rows in due.items() if due_rows})
+                    merged += len(rows)
+                self._save_row_mark(upper)
+                last_seen = upper
+        if last_seen is None or last_seen < self._max_metric_id:
+            self._save_row_mark(self._max_metric_id)
+        return merged
+
+    def _save_row_mark(self, metric_id):
+        self.db.conn.execute("""
+            INSERT INTO rollup_watermarks (resolution, completed_until, last_metric_id) VALUES ('1m', NULL, ?)
+            ON CONFLICT(resolution) DO UPDATE SET last_metric_id = excluded.last_metric_id
+        """, (metric_id,))
+        self.db.conn.commit()
+
+    def _raw_window_end(self, start, end):
+        """Shrinks [start, end) to the whole minutes whose samples fit in RAW_WINDOW_MAX_ROWS."""
+        counts = self.db.conn.execute("""
+            SELECT substr(timestamp, 1, 16) || ':00', COUNT(*)
+            FROM gpu_metrics
+            WHERE timestamp >= ? AND timestamp < ? AND metric_id <= ?
+            GROUP BY 1
+            ORDER BY 1
+        """, (start.strftime(TIMESTAMP_FORMAT), end.strftime(TIMESTAMP_FORMAT), self._max_metric_id)).fetchall()
+        total = 0
+        for index, (minute, count) in enumerate(counts):
+            total += count
+            if total > RAW_WINDOW_MAX_ROWS and index > 0:
+                return parse_timestamp(minute)
+        return end
+
+    def _raw_window(self, start, end):
+        rows = self.db.conn.execute("""
+            SELECT substr(m.timestamp, 1, 16) || ':00', m.gpu_id, g.rack_id, r.cluster_name,
+                   m.utilization, m.memory_used_gb, m.temperature, m.power_watts
+            FROM gpu_metrics m
+            JOIN gpus g ON g.gpu_id = m.gpu_id
+            JOIN racks r ON r.rack_id = g.rack_id
+            WHERE m.timestamp >= ? AND m.timestamp < ? AND m.metric_id <= ?
+        """, (start.strftime(TIMESTAMP_FORMAT), end.strftime(TIMESTAMP_FORMAT), self._max_metric_id)).fetchall()
+        if not rows:
+            return {}
+        return self._aggregate_raw(rows)
+
+    def _aggregate_raw(self, rows):
+        """(minute, gpu_id, rack_id, cluster, utilization, memory, temperature, power) rows -> 1m rows per scope."""
+        buckets, gpu_ids, rack_ids, clusters, *values = (np.array(column) for column in zip(*rows))
+        stats = {}
+        for metric, column in zip(ROLLUP_METRICS, values):
+            column = column.astype(np.float64)
+            for stat in ROLLUP_STATS:
+                stats[f"{metric}_{stat}"] = column
+        counts = np.ones(len(rows))
+        return {
+            scope: aggregate(buckets, ids, counts, stats)
+            for scope, ids in (("gpu", gpu_ids), ("rack", rack_ids), ("cluster", clusters))
+        }
+
+    def _child_window(self, child, seconds, start, end):
+        prefix = 13 if seconds == 3600 else 10
+        suffix = ":00:00" if seconds == 3600 else " 00:00:00"
+        rows_by_scope = {}
+        for scope in SCOPES:
+            rows = self.db.conn.execute(f"""
+                SELECT substr(bucket_start, 1, {prefix}) || '{suffix}', scope_id, sample_count, {", ".join(STAT_COLUMNS)}
+                FROM metric_rollups
+                WHERE resolution = ? AND scope = ? AND bucket_start >= ? AND bucket_start < ?
+            """, (child, scope, start.strftime(TIMESTAMP_FORMAT), end.strftime(TIMESTAMP_FORMAT))).fetchall()
+            if not rows:
+                continue
+            buckets, scope_ids, counts, *values = (np.array(column) for column in zip(*rows))
+            stats = {name: column.astype(np.float64) for name, column in zip(STAT_COLUMNS, values)}
+            rows_by_scope[scope] = aggregate(buckets, scope_ids, counts, stats)
+        return rows_by_scope
+
+    def _first_source_time(self, child):
+        if child is None:
+            row = self.db.conn.execute(
+                "SELECT MIN(timestamp) FROM gpu_metrics WHERE metric_id <= ?", (self._max_metric_id,)
+            ).fetchone()
+        else:
+            row = self.db.conn.execute(
+                "SELECT MIN(bucket_start) FROM metric_rollups WHERE resolution = ?", (child,)
+            ).fetchone()
+        return parse_timestamp(row[0]) if row and row[0] else None
+
+    def _next_source_time(self, child, after):
+        """Skips empty stretches instead of scanning them window by window."""
+        after = after.strftime(TIMESTAMP_FORMAT)
+        if child is None:
+            row = self.db.conn.execute(
+                "SELECT MIN(timestamp) FROM gpu_metrics WHERE timestamp >= ? AND metric_id <= ?",
+                (after, self._max_metric_id)
+            ).fetchone()
+        else:
+            row = self.db.conn.execute(
+                "SELECT MIN(bucket_start) FROM metric_rollups WHERE resolution = ? AND bucket_start >= ?", (child, after)
+            ).fetchone()
+        return parse_timestamp(row[0]) if row and row[0] else None
+
+    def _compact_resolution(self, resolution, seconds, child, now):
+        if child is None:
+            limit = floor_time(now - datetime.timedelta(seconds=self.lateness_seconds), seconds)
+        else:
+            # A coarse bucket is complete once its child level has moved past it.
+            child_watermark = self._watermark(child)
+            if child_watermark is None:
+                return 0
+            limit = floor_time(child_watermark, seconds)
+        start = self._watermark(resolution)
+        if start is None:
+            first = self._first_source_time(child)
+            if first is None:
+                return 0
+            start = floor_time(first, seconds)
+        step = datetime.timedelta(seconds=RAW_WINDOW_SECONDS if child is None else seconds)
+        buckets_written = 0
+        while start < limit:
+            end = min(start + step, limit)
+            if child is None:
+                end = self._raw_window_end(start, end)
+                rows_by_scope = self._raw_window(start, end)
+            else:
+                rows_by_scope = self._child_window(child, seconds, start, end)
+            self._save(resolution, rows_by_scope, end)
+            buckets_written += sum(len(rows) for rows in rows_by_scope.values())
+            if not rows_by_scope:
+                upcoming = self._next_source_time(child, end)
+                if upcoming is None or upcoming >= limit:
+                    self._save(resolution, {}, limit)
+                    break
+                end = max(end, floor_time(upcoming, seconds))
+            start = end
+        return buckets_written
+
+    def compact(self, now=None):
+        """Rolls up every bucket that has closed since the last run. Returns rows written per resolution."""
+        now = now or datetime.datetime.now()
+        written = {}
+        self.db = DatabaseManager(db_path=self.db_path)
+        self.db.connect()
+        try:
+            late = self._merge_late_rows()
+            if late:
+                print(f"Rollups: merged {late} late gpu_metrics rows into existing buckets.")
+            for resolution, seconds, child in RESOLUTIONS:
+                written[resolution] = self._compact_resolution(resolution, seconds, child, now)
+        except Error as e:
+            self.db.conn.rollback()
+            print(f"Error compacting rollups: {e}")
+        finally:
+            self.db.close()
+        return written
+
+    def run_forever(self, interval=60):
+        while True:
+            written = self.compact()
+            if any(written.values()):
+                print(f"Rollups compacted: {written}")
+            time.sleep(interval)
+
+
+if __name__ == "__main__":
+    RollupCompactor().run_forever()
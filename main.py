@@ -2,6 +2,8 @@ import threading
 import time
 from gpu.simulation import generate_static_data
 from monitoring.simulate_metrics import simulate_gpu_metrics
+from db.rollups import RollupCompactor
+from db.retention import RetentionManager
 from rl.federated_ppo import simulate_federated_training
 import time
 
@@ -16,6 +18,15 @@ def main():
     metrics_thread = threading.Thread(target=simulate_gpu_metrics, daemon=True)
     metrics_thread.start()
 
+    # Downsample raw metrics into 1m/1h/1d rollups for the history endpoints.
+    rollup_thread = threading.Thread(target=RollupCompactor().run_forever, daemon=True)
+    rollup_thread.start()
+
+    # Keep a week of raw samples; older rows are archived to per-day gzip files.
+    retention = RetentionManager(archive_dir="data/archive/gpu_metrics")
+    retention_thread = threading.Thread(target=retention.run_forever, daemon=True)
+    retention_thread.start()
+
     # time.sleep(40)
     # rl_thread = threading.Thread(target=run_rl_training, daemon=True)
     # rl_thread.start()
@@ -1,9 +1,16 @@
+import argparse
+import collections
 import datetime
-import random
+import itertools
+import os
 import time
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+from db.bulk_load import BulkLoader
 from db.database import DatabaseManager
-from config import MONITOR_INTERVAL, NUM_WORKERS
+from db.ingestion import IngestionService
+from monitoring.metric_generator import cluster_baselines, generate_window, spawn_rngs, to_records, window_timestamps
+from config import NUM_WORKERS
 
 # TOTAL_INTERVALS for 2 days with 20 sec difference:
 # 2 days * 24 * 60 * 60 / 20 = 8640 intervals per GPU
@@ -12,6 +19,9 @@ TOTAL_INTERVALS = 8640
 # Batch size for each GPU simulation
 BATCH_SIZE = 1000
 
+# GPUs generated per worker task in bulk mode (~28 MB of float64 per task).
+BULK_GPUS_PER_TASK = 100
+
 # Automatically set the start date (for simulation) to 2 days back from now.
 START_DATE = datetime.datetime.now() - datetime.timedelta(days=2)
 
@@ -41,77 +51,39 @@ def load_gpu_list():
     db.close()
     return fixed_rows
 
-def simulate_metrics_for_gpu(gpu):
+def simulate_metrics_for_gpu(gpu, ingestion, rng, timestamps):
     """
     Given a GPU record (gpu_id, model, memory_total_gb, cluster_name),
     simulate its metrics over 2 days (each interval is 20 seconds)
-    and insert the records into the gpu_metrics table in batches.
+    and hand the records to the ingestion writer in batches.
+    The whole window is generated in one vectorized call; `timestamps`
+    holds the interval timestamps shared by every GPU.
     """
     # Unpack the GPU tuple (expected length: 4)
     gpu_id, model, mem_total, cluster_name = gpu
-    db = DatabaseManager()
-    db.connect()
     
     # Compute a baseline utilization based on the cluster name to create variation.
-    baseline = (abs(hash(cluster_name)) % 71) + 20  # baseline in [20, 90]
+    baseline = cluster_baselines([cluster_name], low=20)[0]  # baseline in [20, 90]
+    metrics = generate_window(baseline, mem_total, TOTAL_INTERVALS, rng)
+    records = to_records(gpu_id, metrics, timestamps)
     
     for i in range(0, TOTAL_INTERVALS, BATCH_SIZE):
-        batch = []
-        for j in range(i, min(i + BATCH_SIZE, TOTAL_INTERVALS)):
-            # Calculate the timestamp for this interval.
-            timestamp = START_DATE + datetime.timedelta(seconds=20 * j)
-            # Generate a utilization value using Gaussian noise around the baseline.
-            utilization = random.gauss(baseline, 10)
-            utilization = max(0, min(utilization, 100))
-            
-            # Determine temperature based on utilization.
-            if utilization < 40:
-                temperature = random.uniform(30, 50)
-            elif utilization < 70:
-                temperature = random.uniform(50, 70)
-            else:
-                temperature = random.uniform(70, 95)
-            
-            # Calculate memory used roughly proportional to utilization (with noise).
-            memory_used = (utilization / 100) * mem_total * random.uniform(0.9, 1.1)
-            
-            # Determine power consumption based on utilization.
-            if utilization < 40:
-                power = random.uniform(50, 150)
-            elif utilization < 70:
-                power = random.uniform(150, 300)
-            else:
-                power = random.uniform(300, 500)
-                
-            batch.append((
-                gpu_id,
-                utilization,
-                memory_used,
-                temperature,
-                power,
-                timestamp.strftime("%Y-%m-%d %H:%M:%S")
-            ))
-        try:
-            db.insert_gpu_metrics_batch(batch)
-        except Exception as e:
-            print(f"Error inserting batch for GPU {gpu_id}: {e}")
-        inserted = i + len(batch)
-        print(f"GPU {gpu_id}: inserted {inserted} out of {TOTAL_INTERVALS} intervals.", flush=True)
-    db.close()
+        ingestion.submit(records[i:i + BATCH_SIZE])
+    print(f"GPU {gpu_id}: queued {TOTAL_INTERVALS} intervals.", flush=True)
 
-def simulate_metrics_for_gpu_chunk(chunk):
+def simulate_metrics_for_gpu_chunk(chunk, ingestion, rng, timestamps):
     """
     Process a chunk of GPU records sequentially.
     Each GPU in the chunk will have its 2-day metrics simulated.
     """
     for gpu in chunk:
-        simulate_metrics_for_gpu(gpu)
+        simulate_metrics_for_gpu(gpu, ingestion, rng, timestamps)
 
 def chunkify(lst, chunk_size):
     for i in range(0, len(lst), chunk_size):
         yield lst[i:i + chunk_size]
 
-def simulate_gpu_metrics():
+def simulate_gpu_metrics(seed=None):
     """
     Simulate GPU metrics for all GPUs for a fixed number of intervals (2 days worth) and then exit.
     """
@@ -123,12 +95,81 @@ def simulate_gpu_metrics():
     if len(gpu_list) % num_workers != 0:
         chunk_size += 1
         
+    # Generator threads only produce rows; one writer thread owns the SQLite write lock.
+    ingestion = IngestionService().start()
+    timestamps = window_timestamps(START_DATE, TOTAL_INTERVALS, 20).tolist()
     with ThreadPoolExecutor(max_workers=num_workers) as executor:
         chunks = list(chunkify(gpu_list, chunk_size))
-        futures = [executor.submit(simulate_metrics_for_gpu_chunk, chunk) for chunk in chunks]
+        # One generator per thread: numpy Generators are not thread-safe.
+        rngs = spawn_rngs(seed, len(chunks))
+        futures = [executor.submit(simulate_metrics_for_gpu_chunk, chunk, ingestion, rng, timestamps)
+                   for chunk, rng in zip(chunks, rngs)]
         for future in futures:
             future.result()
+    ingestion.stop()
     print(f"Completed inserting metrics for {len(gpu_list)} GPUs.")
 
+def generate_backfill_chunk(gpu_ids, mem_totals, cluster_names, seed_sequence):
+    """
+    Worker-process side of the bulk backfill. Generates the full window for a
+    chunk of GPUs and returns plain arrays (cheap to pickle) shaped (4, gpus, intervals):
+    utilization, memory used, temperature and power.
+    """
+    rng = np.random.default_rng(seed_sequence)
+    baselines = cluster_baselines(cluster_names, low=20)
+    metrics = generate_window(baselines[:, None], np.asarray(mem_totals)[:, None],
+                              (len(gpu_ids), TOTAL_INTERVALS), rng)
+    return gpu_ids, np.stack(metrics)
+
+def backfill_rows(gpu_ids, metrics, timestamps):
+    """Streams rows for one generated chunk without building them all up front."""
+    for index, gpu_id in enumerate(gpu_ids):
+        utilization, memory_used, temperature, power = (m[index].tolist() for m in metrics)
+        yield from zip(itertools.repeat(gpu_id), utilization, memory_used, temperature, power, timestamps)
+
+def simulate_gpu_metrics_bulk(processes=None, seed=None, journal_mode="MEMORY"):
+    """
+    Bulk backfill: worker processes generate whole per-GPU windows in parallel and a
+    single BulkLoader streams them into SQLite with relaxed pragmas and deferred
+    index builds. Run it with the monitors and API stopped.
+    """
+    gpu_list = load_gpu_list()
+    processes = processes or os.cpu_count()
+    total_rows = len(gpu_list) * TOTAL_INTERVALS
+    print(f"Bulk loading {TOTAL_INTERVALS} intervals for {len(gpu_list)} GPUs ({total_rows} rows) "
+          f"with {processes} generator processes.")
+
+    chunks = []
+    for start in range(0, len(gpu_list), BULK_GPUS_PER_TASK):
+        chunk = gpu_list[start:start + BULK_GPUS_PER_TASK]
+        chunks.append(([gpu[0] for gpu in chunk], [gpu[2] for gpu in chunk], [gpu[3] for gpu in chunk]))
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(chunks))
+    timestamps = window_timestamps(START_DATE, TOTAL_INTERVALS, 20).tolist()
+
+    with BulkLoader(journal_mode=journal_mode) as loader, ProcessPoolExecutor(max_workers=processes) as executor:
+        # Keep a bounded number of chunks in flight so memory stays flat.
+        pending = collections.deque()
+        next_chunk = 0
+        last_report = time.perf_counter()
+        while next_chunk < len(chunks) or pending:
+            while next_chunk < len(chunks) and len(pending) < 2 * processes:
+                pending.append(executor.submit(generate_backfill_chunk, *chunks[next_chunk], seed_sequences[next_chunk]))
+                next_chunk += 1
+            gpu_ids, metrics = pending.popleft().result()
+            loader.load(backfill_rows(gpu_ids, metrics, timestamps))
+            if time.perf_counter() - last_report >= 10:
+                last_report = time.perf_counter()
+                print(f"Loaded {loader.rows_loaded}/{total_rows} rows ({loader.rows_per_second():,.0f} rows/s).", flush=True)
+    print(f"Completed bulk loading metrics for {len(gpu_list)} GPUs.")
+
 if __name__ == "__main__":
-    simulate_gpu_metrics()
+    parser = argparse.ArgumentParser(description="Backfill simulated GPU metrics")
+    parser.add_argument("--bulk", action="store_true",
+                        help="Generate in a process pool and load through the fast-path bulk loader")
+    parser.add_argument("--processes", type=int, default=None, help="Generator processes for --bulk")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    if args.bulk:
+        simulate_gpu_metrics_bulk(processes=args.processes, seed=args.seed)
+    else:
+        simulate_gpu_metrics(seed=args.seed)
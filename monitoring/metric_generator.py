@@ -0,0 +1,108 @@
+import datetime
+import zlib
+import numpy as np
+
+# Utilization bands shared by the simulators: [0, 40), [40, 70), [70, 100].
+BAND_EDGES = [40, 70]
+BAND_TEMPERATURE_LOW = np.array([30.0, 50.0, 70.0])
+BAND_TEMPERATURE_HIGH = np.array([50.0, 70.0, 95.0])
+BAND_POWER_LOW = np.array([50.0, 150.0, 300.0])
+BAND_POWER_HIGH = np.array([150.0, 300.0, 500.0])
+
+# Load categories used by monitoring/monitor.py: low, medium, high.
+CATEGORY_WEIGHTS = [0.4, 0.4, 0.2]
+CATEGORY_UTILIZATION_LOW = np.array([0.0, 30.0, 70.0])
+CATEGORY_UTILIZATION_HIGH = np.array([30.0, 70.0, 100.0])
+CATEGORY_MEMORY_LOW = np.array([0.0, 0.3, 0.7])
+CATEGORY_MEMORY_HIGH = np.array([0.3, 0.7, 1.0])
+
+UTILIZATION_STDDEV = 10
+
+
+def make_rng(seed=None):
+    return np.random.default_rng(seed)
+
+
+def spawn_rngs(seed, count):
+    """Independent generators for worker threads or processes (a Generator is not thread-safe)."""
+    return [np.random.default_rng(child) for child in np.random.SeedSequence(seed).spawn(count)]
+
+
+def cluster_baselines(cluster_names, low):
+    """
+    Per-row baseline utilization in [low, low + 70], derived from the cluster name
+    so different clusters run at different average loads.
+    """
+    cache = {}
+    for name in cluster_names:
+        if name not in cache:
+            # crc32, not hash(): str hashes are salted per process, which would break seeded runs.
+            cache[name] = (zlib.crc32(name.encode()) % 71) + low
+    return np.array([cache[name] for name in cluster_names], dtype=np.float64)
+
+
+def banded_metrics(baseline, mem_total, rng, size=None):
+    """
+    Gaussian utilization around `baseline`, memory proportional to utilization
+    (+/-10% noise), and temperature and power drawn from the utilization band.
+    `baseline` and `mem_total` broadcast against each other, or against `size`.
+    Returns (utilization, memory_used_gb, temperature, power_watts) arrays.
+    """
+    baseline = np.asarray(baseline, dtype=np.float64)
+    mem_total = np.asarray(mem_total, dtype=np.float64)
+    shape = np.broadcast_shapes(baseline.shape, mem_total.shape) if size is None else size
+    utilization = np.clip(rng.normal(baseline, UTILIZATION_STDDEV, shape), 0, 100)
+    band = np.digitize(utilization, BAND_EDGES)
+    temperature = rng.uniform(BAND_TEMPERATURE_LOW[band], BAND_TEMPERATURE_HIGH[band])
+    memory_used = (utilization / 100) * mem_total * rng.uniform(0.9, 1.1, shape)
+    power = rng.uniform(BAND_POWER_LOW[band], BAND_POWER_HIGH[band])
+    return utilization, memory_used, temperature, power
+
+
+def generate_tick(baselines, mem_total, rng):
+    """One sample for every GPU in the fleet (arrays indexed by GPU)."""
+    return banded_metrics(baselines, mem_total, rng)
+
+
+def generate_window(baseline, mem_total, num_intervals, rng):
+    """`num_intervals` consecutive samples for a single GPU."""
+    return banded_metrics(baseline, mem_total, rng, size=num_intervals)
+
+
+def generate_category_tick(mem_total, rng):
+    """
+    One sample per GPU using the low/medium/high category rules: each GPU picks a
+    category, then utilization, temperature, memory share and power are uniform
+    within that category's range.
+    """
+    mem_total = np.asarray(mem_total, dtype=np.float64)
+    category = rng.choice(3, size=mem_total.shape, p=CATEGORY_WEIGHTS)
+    utilization = rng.uniform(CATEGORY_UTILIZATION_LOW[category], CATEGORY_UTILIZATION_HIGH[category])
+    # Category bands match the utilization bands for temperature and power.
+    temperature = rng.uniform(BAND_TEMPERATURE_LOW[category], BAND_TEMPERATURE_HIGH[category])
+    memory_used = rng.uniform(CATEGORY_MEMORY_LOW[category] * mem_total, CATEGORY_MEMORY_HIGH[category] * mem_total)
+    power = rng.uniform(BAND_POWER_LOW[category], BAND_POWER_HIGH[category])
+    return utilization, memory_used, temperature, power
+
+
+def window_timestamps(start, num_intervals, interval_seconds):
+    """'YYYY-MM-DD HH:MM:SS' strings for start, start + interval, ... without per-row strftime."""
+    start = np.datetime64(start.replace(microsecond=0) if isinstance(start, datetime.datetime) else start, "s")
+    stamps = start + np.arange(num_intervals) * np.timedelta64(interval_seconds, "s")
+    return np.char.replace(np.datetime_as_string(stamps, unit="s"), "T", " ")
+
+
+def to_records(gpu_ids, metrics, timestamps):
+    """
+    Zips generated arrays into gpu_metrics rows. `gpu_ids` and `timestamps` may each
+    be a single value (repeated) or a sequence matching the metric arrays.
+    """
+    utilization, memory_used, temperature, power = (m.tolist() for m in metrics)
+    count = len(utilization)
+    if isinstance(gpu_ids, str):
+        gpu_ids = [gpu_ids] * count
+    if isinstance(timestamps, str):
+        timestamps = [timestamps] * count
+    elif isinstance(timestamps, np.ndarray):
+        timestamps = timestamps.tolist()
+    return list(zip(gpu_ids, utilization, memory_used, temperature, power, timestamps))
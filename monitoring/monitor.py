@@ -1,9 +1,10 @@
-import random
 import datetime
 import time
-from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from db.database import DatabaseManager
-from config import MONITOR_INTERVAL, NUM_WORKERS
+from db.ingestion import IngestionService
+from monitoring.metric_generator import generate_category_tick, make_rng, to_records
+from config import MONITOR_INTERVAL
 
 def load_gpu_list():
     db = DatabaseManager()
@@ -12,53 +13,26 @@ def load_gpu_list():
     db.close()
     return gpu_list
 
-def chunkify(lst, chunk_size):
-    for i in range(0, len(lst), chunk_size):
-        yield lst[i:i + chunk_size]
-
-def process_gpu_chunk(chunk):
-    db = DatabaseManager()
-    db.connect()
-    cur = db.conn.cursor()
+def submit_fleet_tick(gpu_ids, mem_total, ingestion, rng):
+    """
+    Simulates one metrics sample for every GPU using the low/medium/high
+    load categories, in a single vectorized pass, and queues the rows.
+    """
     now = datetime.datetime.now()
-    for gpu in chunk:
-        gpu_id, model, mem_total = gpu
-        category = random.choices(['low', 'medium', 'high'], weights=[0.4, 0.4, 0.2])[0]
-        if category == 'low':
-            utilization = random.uniform(0, 30)
-            temperature = random.uniform(30, 50)
-            memory_used = random.uniform(0, 0.3 * mem_total)
-            power = random.uniform(50, 150)
-        elif category == 'medium':
-            utilization = random.uniform(30, 70)
-            temperature = random.uniform(50, 70)
-            memory_used = random.uniform(0.3 * mem_total, 0.7 * mem_total)
-            power = random.uniform(150, 300)
-        else:
-            utilization = random.uniform(70, 100)
-            temperature = random.uniform(70, 95)
-            memory_used = random.uniform(0.7 * mem_total, mem_total)
-            power = random.uniform(300, 500)
-        cur.execute("""
-            INSERT INTO gpu_metrics (gpu_id, utilization, memory_used_gb, temperature, power_watts, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (gpu_id, utilization, memory_used, temperature, power, now))
-    db.conn.commit()
-    db.close()
+    metrics = generate_category_tick(mem_total, rng)
+    # The single ingestion writer commits these; blocks here if it is falling behind.
+    ingestion.submit(to_records(gpu_ids, metrics, now.isoformat(" ")))
 
-def simulate_gpu_metrics():
+def simulate_gpu_metrics(ingestion=None, seed=None):
+    if ingestion is None:
+        ingestion = IngestionService().start()
     gpu_list = load_gpu_list()
-    num_workers = NUM_WORKERS
-    chunk_size = len(gpu_list) // num_workers
-    if len(gpu_list) % num_workers != 0:
-        chunk_size += 1
+    gpu_ids = [gpu[0] for gpu in gpu_list]
+    mem_total = np.array([gpu[2] for gpu in gpu_list], dtype=np.float64)
+    rng = make_rng(seed)
     while True:
-        with ThreadPoolExecutor(max_workers=num_workers) as executor:
-            chunks = list(chunkify(gpu_list, chunk_size))
-            futures = [executor.submit(process_gpu_chunk, chunk) for chunk in chunks]
-            for future in futures:
-                future.result()
-        print(f"Inserted metrics for {len(gpu_list)} GPUs at {datetime.datetime.now()}")
+        submit_fleet_tick(gpu_ids, mem_total, ingestion, rng)
+        print(f"Queued metrics for {len(gpu_list)} GPUs at {datetime.datetime.now()}")
         time.sleep(MONITOR_INTERVAL)
 
 if __name__ == "__main__":
@@ -1,9 +1,10 @@
-import random
 import datetime
 import time
-from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from db.database import DatabaseManager
-from config import MONITOR_INTERVAL, NUM_WORKERS
+from db.ingestion import IngestionService
+from monitoring.metric_generator import cluster_baselines, generate_tick, make_rng, to_records
+from config import MONITOR_INTERVAL
 
 def load_gpu_list():
     """
@@ -23,64 +24,38 @@ def load_gpu_list():
     db.close()
     return gpu_list
 
-def chunkify(lst, chunk_size):
-    for i in range(0, len(lst), chunk_size):
-        yield lst[i:i + chunk_size]
+def prepare_fleet(gpu_list):
+    """
+    Converts GPU records into the arrays the batched generator works on:
+    (gpu_ids, memory_total_gb array, baseline utilization array).
+    The baseline is computed from the cluster name so average
+    utilization differs across clusters; it lies in [30, 100].
+    """
+    gpu_ids = [gpu[0] for gpu in gpu_list]
+    mem_total = np.array([gpu[2] for gpu in gpu_list], dtype=np.float64)
+    baselines = cluster_baselines([gpu[3] for gpu in gpu_list], low=30)
+    return gpu_ids, mem_total, baselines
 
-def process_gpu_chunk(chunk):
+def submit_fleet_tick(fleet, ingestion, rng):
     """
-    For each GPU record, simulate one metrics insertion.
-    The simulation uses a baseline computed from the cluster name
-    to yield different average utilizations across clusters.
+    Simulates one metrics sample for every GPU in `fleet` (see prepare_fleet)
+    in a single vectorized pass and queues the rows for the ingestion writer.
     """
-    db = DatabaseManager()
-    db.connect()
-    cur = db.conn.cursor()
+    gpu_ids, mem_total, baselines = fleet
     now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    for gpu in chunk:
-        gpu_id, model, mem_total, cluster_name = gpu
-        # Compute a baseline utilization for this GPU's cluster.
-        # This yields a baseline in the range [30, 100]
-        baseline = (abs(hash(cluster_name)) % 71) + 30  
-        # Generate a utilization with Gaussian noise around the baseline.
-        utilization = random.gauss(baseline, 10)
-        utilization = max(0, min(utilization, 100))
-        # Determine temperature based on utilization.
-        if utilization < 40:
-            temperature = random.uniform(30, 50)
-        elif utilization < 70:
-            temperature = random.uniform(50, 70)
-        else:
-            temperature = random.uniform(70, 95)
-        # Simulate memory used proportional to utilization, with some noise.
-        memory_used = (utilization / 100) * mem_total * random.uniform(0.9, 1.1)
-        # Determine power based on utilization.
-        if utilization < 40:
-            power = random.uniform(50, 150)
-        elif utilization < 70:
-            power = random.uniform(150, 300)
-        else:
-            power = random.uniform(300, 500)
-        cur.execute("""
-            INSERT INTO gpu_metrics (gpu_id, utilization, memory_used_gb, temperature, power_watts, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (gpu_id, utilization, memory_used, temperature, power, now))
-    db.conn.commit()
-    db.close()
+    metrics = generate_tick(baselines, mem_total, rng)
+    # The single ingestion writer commits these; blocks here if it is falling behind.
+    ingestion.submit(to_records(gpu_ids, metrics, now))
 
-def simulate_gpu_metrics():
+def simulate_gpu_metrics(ingestion=None, seed=None):
+    if ingestion is None:
+        ingestion = IngestionService().start()
     gpu_list = load_gpu_list()
-    num_workers = NUM_WORKERS
-    chunk_size = len(gpu_list) // num_workers
-    if len(gpu_list) % num_workers != 0:
-        chunk_size += 1
+    fleet = prepare_fleet(gpu_list)
+    rng = make_rng(seed)
     while True:
-        with ThreadPoolExecutor(max_workers=num_workers) as executor:
-            chunks = list(chunkify(gpu_list, chunk_size))
-            futures = [executor.submit(process_gpu_chunk, chunk) for chunk in chunks]
-            for future in futures:
-                future.result()  # Wait for all threads to finish.
-        print(f"Inserted metrics for {len(gpu_list)} GPUs at {datetime.datetime.now()}")
+        submit_fleet_tick(fleet, ingestion, rng)
+        print(f"Queued metrics for {len(gpu_list)} GPUs at {datetime.datetime.now()}")
         time.sleep(MONITOR_INTERVAL)
 
 if __name__ == "__main__":
@@ -0,0 +1,138 @@
+"""
+Out-of-core training data for the NNP.
+
+convert_csv() turns data/simulation/task_gpu_pairs.csv into two memory-mapped
+.npy files (features.npy, float32 [N, 2]; targets.npy, float32 [N, 1]) in a
+single streaming pass. PairChunkDataset then reads those files a chunk at a
+time: chunk order and rows within a chunk are shuffled per epoch, DataLoader
+workers split the chunks between them, and batches are sliced straight out of
+each chunk, so memory stays at a few chunks however large the dataset gets.
+"""
+import os
+import numpy as np
+import pandas as pd
+import torch
+from torch.utils.data import DataLoader, IterableDataset, get_worker_info
+
+CSV_PATH = "data/simulation/task_gpu_pairs.csv"
+DATA_DIR = "data/simulation/task_gpu_pairs_npy"
+FEATURE_COLUMNS = ["utilization", "memory_used_gb"]
+# CSV rows parsed per pass while converting.
+CONVERT_CHUNK_ROWS = 1000000
+# Rows a worker holds (and shuffles) at a time.
+DEFAULT_CHUNK_ROWS = 262144
+DEFAULT_BATCH_SIZE = 4096
+DEFAULT_WORKERS = 2
+
+
+def count_rows(csv_path):
+    """Data rows in a CSV (lines minus the header), counted without parsing."""
+    lines = 0
+    last = b"\n"
+    with open(csv_path, "rb") as f:
+        while True:
+            block = f.read(1 << 24)
+            if not block:
+                break
+            lines += block.count(b"\n")
+            last = block[-1:]
+    if last != b"\n":
+        lines += 1
+    return max(lines - 1, 0)
+
+
+def convert_csv(csv_path=CSV_PATH, data_dir=DATA_DIR, chunk_rows=CONVERT_CHUNK_ROWS):
+    """
+    Writes features.npy and targets.npy (target = 100 - utilization, the
+    suitability the NNP learns). Skipped when the .npy files are newer than the
+    CSV. Returns the number of rows.
+    """
+    features_path = os.path.join(data_dir, "features.npy")
+    targets_path = os.path.join(data_dir, "targets.npy")
+    if (os.path.exists(features_path) and os.path.exists(targets_path)
+            and os.path.getmtime(features_path) >= os.path.getmtime(csv_path)):
+        return len(np.load(targets_path, mmap_mode="r"))
+    os.makedirs(data_dir, exist_ok=True)
+    total = count_rows(csv_path)
+    features = np.lib.format.open_memmap(features_path + ".tmp", mode="w+", dtype=np.float32, shape=(total, len(FEATURE_COLUMNS)))
+    targets = np.lib.format.open_memmap(targets_path + ".tmp", mode="w+", dtype=np.float32, shape=(total, 1))
+    offset = 0
+    for chunk in pd.read_csv(csv_path, usecols=FEATURE_COLUMNS, dtype=np.float32, chunksize=chunk_rows):
+        values = chunk[FEATURE_COLUMNS].to_numpy()
+        features[offset:offset + len(values)] = values
+        targets[offset:offset + len(values), 0] = 100 - values[:, 0]
+        offset += len(values)
+        print(f"Converted {offset}/{total} rows.", end="\r", flush=True)
+    print()
+    features.flush()
+    targets.flush()
+    del features, targets
+    # Renamed last, so an interrupted conversion is never mistaken for a finished one.
+    os.replace(targets_path + ".tmp", targets_path)
+    os.replace(features_path + ".tmp", features_path)
+    return offset
+
+
+class PairChunkDataset(IterableDataset):
+    """
+    Yields ready-made (features, targets) batches from the memory-mapped files,
+    over rows [start, stop). Use it with DataLoader(batch_size=None).
+    """
+    def __init__(self, data_dir=DATA_DIR, batch_size=DEFAULT_BATCH_SIZE, start=0, stop=None,
+                 chunk_rows=DEFAULT_CHUNK_ROWS, shuffle=True, seed=0):
+        super().__init__()
+        self.data_dir = data_dir
+        self.batch_size = batch_size
+        total = len(np.load(os.path.join(data_dir, "targets.npy"), mmap_mode="r"))
+        self.start = start
+        self.stop = total if stop is None else min(stop, total)
+        # Whole batches per chunk, so only the final chunk can end in a short batch.
+        self.chunk_rows = max(1, -(-chunk_rows // batch_size)) * batch_size
+        self.shuffle = shuffle
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch):
+        """Changes the shuffle order; call before each epoch (workers get a fresh copy every epoch)."""
+        self.epoch = epoch
+
+    def chunks(self):
+        return [(begin, min(begin + self.chunk_rows, self.stop)) for begin in range(self.start, self.stop, self.chunk_rows)]
+
+    def __len__(self):
+        return sum(-(-(end - begin) // self.batch_size) for begin, end in self.chunks())
+
+    def __iter__(self):
+        # Opened per worker, so only file handles (not arrays) cross process boundaries.
+        features = np.load(os.path.join(self.data_dir, "features.npy"), mmap_mode="r")
+        targets = np.load(os.path.join(self.data_dir, "targets.npy"), mmap_mode="r")
+        rng = np.random.default_rng([self.seed, self.epoch])
+        chunks = self.chunks()
+        if self.shuffle:
+            chunks = [chunks[i] for i in rng.permutation(len(chunks))]
+        worker = get_worker_info()
+        if worker is not None:
+            chunks = chunks[worker.id::worker.num_workers]
+            rng = np.random.default_rng([self.seed, self.epoch, worker.id])
+        for begin, end in chunks:
+            x = np.array(features[begin:end])
+            y = np.array(targets[begin:end])
+            if self.shuffle:
+                order = rng.permutation(len(x))
+                x, y = x[order], y[order]
+            x, y = torch.from_numpy(x), torch.from_numpy(y)
+            for offset in range(0, len(x), self.batch_size):
+                yield x[offset:offset + self.batch_size], y[offset:offset + self.batch_size]
+
+
+def make_loader(data_dir=DATA_DIR, batch_size=DEFAULT_BATCH_SIZE, start=0, stop=None, shuffle=True,
+                workers=DEFAULT_WORKERS, chunk_rows=DEFAULT_CHUNK_ROWS, seed=0):
+    dataset = PairChunkDataset(data_dir, batch_size, start, stop, chunk_rows, shuffle, seed)
+    return DataLoader(dataset, batch_size=None, num_workers=workers)
+
+
+def load_rows(data_dir=DATA_DIR, start=0, stop=None):
+    """Copies rows [start, stop) into tensors; meant for evaluation-sized slices."""
+    features = np.load(os.path.join(data_dir, "features.npy"), mmap_mode="r")
+    targets = np.load(os.path.join(data_dir, "targets.npy"), mmap_mode="r")
+    return torch.from_numpy(np.array(features[start:stop])), torch.from_numpy(np.array(targets[start:stop]))
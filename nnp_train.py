@@ -1,11 +1,41 @@
+import argparse
 import time
 import torch
 import torch.nn as nn
 import torch.optim as optim
-import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split
 import os
+import sys
+from nnp_data import CSV_PATH, DATA_DIR, DEFAULT_WORKERS, convert_csv, load_rows, make_loader
+from scheduling.nnp_predictor import MODEL_PATH, SCRIPTED_MODEL_PATH, export_predictor, load_weights
+
+TEST_FRACTION = 0.10
+# Taken from the end of the training range for early stopping.
+VAL_FRACTION = 0.05
+# Held-out rows actually evaluated (the tail of the dataset can be far larger).
+MAX_TEST_ROWS = 100000
+TRAIN_BATCH_SIZE = 4096
+EVAL_BATCH_SIZE = 65536
+TRAIN_EPOCHS = 50
+# Peak learning rate of the one-cycle schedule; higher than the old 1e-3 because batches are 64x larger.
+TRAIN_LR = 0.005
+WARMUP_FRACTION = 0.1
+DEFAULT_PATIENCE = 5
+DEFAULT_MIN_DELTA = 1e-3
+TRAIN_THREADS = int(os.environ.get("NNP_TRAIN_THREADS", os.cpu_count() or 1))
+CHECKPOINT_PATH = "ai_model/nnp_checkpoint.pt"
+# Latency profile: batch 1 is a single placement, the larger ones are fleet-wide scoring.
+PROFILE_BATCH_SIZES = (1, 1024, 65536)
+PROFILE_WARMUP = 20
+PROFILE_ITERATIONS = 200
+# Quality gates a retrained model must pass before it replaces the saved one (with --gate).
+# The target (100 - utilization) is a deterministic function of the inputs, so these are strict.
+MAX_TEST_MAE = 1.0
+MIN_TEST_R2 = 0.99
+# A retrained model is written here first and promoted to MODEL_PATH once accepted.
+CANDIDATE_MODEL_PATH = "ai_model/nnp_model.candidate.pth"
+# An int8 export (--quantize) is validated here before it replaces SCRIPTED_MODEL_PATH.
+CANDIDATE_SCRIPTED_MODEL_PATH = "ai_model/nnp_model.candidate.ts"
 
 cuda_available=torch.cuda.is_available()
 print(f"CUDA Available: {cuda_available}")
@@ -28,20 +58,105 @@ class NNP(nn.Module):
         return self.model(x)
     
 
-def train_model(model,data_loader, epochs=10,lr=0.001):
+def upgrade_saved_model(path=MODEL_PATH):
+    """
+    Older runs saved the whole pickled NNP, which only unpickles where __main__.NNP
+    exists, i.e. in this script. Rewrites such a file as a plain state_dict so the
+    scheduler and API can load it. Returns True if the file was converted.
+    """
+    state = torch.load(path, map_location=torch.device('cpu'), weights_only=False)
+    if not isinstance(state, nn.Module):
+        return False
+    torch.save(state.state_dict(), path + ".tmp")
+    os.replace(path + ".tmp", path)
+    print(f"Converted the pickled model in {path} to a state_dict.")
+    return True
+
+def evaluate_loss(model, data_loader):
+    """Mean squared error over a loader, accumulated on-tensor (one sync at the end)."""
+    model.eval()
+    total = torch.zeros(())
+    count = 0
+    with torch.inference_mode():
+        for inputs, targets in data_loader:
+            total += nn.functional.mse_loss(model(inputs), targets, reduction="sum")
+            count += len(targets)
+    model.train()
+    return total.item() / max(count, 1)
+
+def save_checkpoint(path, **state):
+    # Written next to the target and renamed, so a crash never leaves a torn checkpoint.
+    torch.save(state, path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+def train_model(model,data_loader, epochs=10,lr=0.001, val_loader=None, patience=DEFAULT_PATIENCE,
+                min_delta=DEFAULT_MIN_DELTA, warmup_fraction=WARMUP_FRACTION, threads=TRAIN_THREADS,
+                checkpoint_path=None, checkpoint_every=1, resume=False):
+    """
+    Trains with Adam under a one-cycle schedule (linear warm-up to `lr`, then
+    cosine decay), which keeps large batches stable. After every epoch the
+    validation loss is checked; training stops once it has not improved by
+    min_delta for `patience` epochs and the best weights are restored. The
+    training loss is summed on-tensor and only read once per epoch. With
+    checkpoint_path set, the full state is saved every checkpoint_every epochs
+    and resume=True continues from it.
+    """
+    torch.set_num_threads(threads)
     criterion = nn.MSELoss()
     optimizer = optim.Adam(model.parameters(),lr=lr)
+    steps_per_epoch = max(len(data_loader), 1)
+    scheduler = optim.lr_scheduler.OneCycleLR(optimizer, max_lr=lr, epochs=epochs, steps_per_epoch=steps_per_epoch,
+                                              pct_start=warmup_fraction, anneal_strategy="cos")
+    start_epoch, best_val, best_state, bad_epochs = 0, float("inf"), None, 0
+    if resume and checkpoint_path and os.path.exists(checkpoint_path):
+        checkpoint = torch.load(checkpoint_path, map_location=torch.device('cpu'), weights_only=False)
+        model.load_state_dict(checkpoint["model"])
+        optimizer.load_state_dict(checkpoint["optimizer"])
+        scheduler.load_state_dict(checkpoint["scheduler"])
+        start_epoch, best_val = checkpoint["epoch"] + 1, checkpoint["best_val"]
+        best_state, bad_epochs = checkpoint["best_state"], checkpoint["bad_epochs"]
+        print(f"Resuming from {checkpoint_path} at epoch {start_epoch+1}.")
     model.train()
-    for epoch in range(epochs):
-        epoch_loss = 0.0
+    for epoch in range(start_epoch, epochs):
+        epoch_loss = torch.zeros(())
+        samples = 0
+        start = time.perf_counter()
+        if hasattr(data_loader.dataset, "set_epoch"):
+            data_loader.dataset.set_epoch(epoch)
         for inputs, targets in data_loader:
-            optimizer.zero_grad()
+            optimizer.zero_grad(set_to_none=True)
             outputs = model(inputs)
             loss = criterion(outputs, targets)
             loss.backward()
             optimizer.step()
-            epoch_loss+=loss.item()
-        print(f"Epoch {epoch+1}/{epochs}, Loss: {epoch_loss/len(data_loader): .4f}")
+            if scheduler.last_epoch < scheduler.total_steps - 1:
+                scheduler.step()
+            epoch_loss += loss.detach() * len(targets)
+            samples += len(targets)
+        elapsed = time.perf_counter() - start
+        message = (f"Epoch {epoch+1}/{epochs}, Loss: {epoch_loss.item()/max(samples, 1): .4f}, "
+                   f"{samples/elapsed:,.0f} samples/s, lr {scheduler.get_last_lr()[0]:.2e}")
+        stop = False
+        if val_loader is not None:
+            val_loss = evaluate_loss(model, val_loader)
+            message += f", Val loss: {val_loss: .4f}"
+            if val_loss < best_val - min_delta:
+                best_val, bad_epochs = val_loss, 0
+                best_state = {k: v.detach().clone() for k, v in model.state_dict().items()}
+            else:
+                bad_epochs += 1
+                stop = bad_epochs >= patience
+        print(message)
+        if checkpoint_path and ((epoch + 1) % checkpoint_every == 0 or stop or epoch + 1 == epochs):
+            save_checkpoint(checkpoint_path, epoch=epoch, model=model.state_dict(), optimizer=optimizer.state_dict(),
+                            scheduler=scheduler.state_dict(), best_val=best_val, best_state=best_state,
+                            bad_epochs=bad_epochs)
+        if stop:
+            print(f"Validation loss has not improved for {patience} epochs; stopping early.")
+            break
+    if best_state is not None:
+        model.load_state_dict(best_state)
+        print(f"Restored best weights (val loss {best_val:.4f}).")
     return model
 
 def falback_heuristic(gpu_states):
@@ -54,63 +169,146 @@ def r2_score(y_true, y_pred):
     return 1 - (ss_res / ss_tot)
 
 
-def test_inference(model, X_test, y_test):
+def evaluate_accuracy(model, X_test, y_test, batch_size=EVAL_BATCH_SIZE):
+    """MAE and R^2 over the test set in a few large inference passes."""
+    model.eval()
+    with torch.inference_mode():
+        predictions = torch.cat([model(X_test[i:i + batch_size]) for i in range(0, len(X_test), batch_size)])
+    predictions = predictions.numpy().astype(np.float64).ravel()
+    ground_truth = y_test.numpy().astype(np.float64).ravel()
+    mae = float(np.mean(np.abs(predictions - ground_truth)))
+    return mae, float(r2_score(ground_truth, predictions))
+
+def profile_latency(model, X, batch_sizes=PROFILE_BATCH_SIZES, warmup=PROFILE_WARMUP, iterations=PROFILE_ITERATIONS):
+    """
+    Forward-pass latency per batch size, timed with perf_counter after `warmup`
+    untimed calls. Returns {batch_size: {p50_ms, p95_ms, p99_ms, mean_ms, rows_per_sec}}.
+    """
     model.eval()
+    results = {}
+    with torch.inference_mode():
+        for batch_size in batch_sizes:
+            batch = X[:batch_size]
+            if len(batch) < batch_size:
+                batch = batch.repeat(-(-batch_size // max(len(batch), 1)), 1)[:batch_size]
+            for _ in range(warmup):
+                model(batch)
+            timings = np.empty(iterations)
+            for i in range(iterations):
+                start = time.perf_counter()
+                model(batch)
+                timings[i] = time.perf_counter() - start
+            timings *= 1000
+            results[batch_size] = {
+                "p50_ms": float(np.percentile(timings, 50)),
+                "p95_ms": float(np.percentile(timings, 95)),
+                "p99_ms": float(np.percentile(timings, 99)),
+                "mean_ms": float(timings.mean()),
+                "rows_per_sec": float(batch_size / (timings.mean() / 1000)),
+            }
+    return results
+
+def check_quality(mae, r2, max_mae=MAX_TEST_MAE, min_r2=MIN_TEST_R2):
+    """Returns the failed quality gates (empty when the model may ship)."""
+    failures = []
+    if mae > max_mae:
+        failures.append(f"MAE {mae:.3f} > {max_mae}")
+    if r2 < min_r2:
+        failures.append(f"R^2 {r2:.4f} < {min_r2}")
+    return failures
+
+def export_served_model(model, X_test, y_test, quantize=False, max_mae=MAX_TEST_MAE, min_r2=MIN_TEST_R2):
+    """
+    Writes the TorchScript artifact load_predictor serves. With quantize, the
+    int8 export is checked against the quality gates on the test set and only
+    replaces the float32 export if it passes them itself.
+    """
+    if quantize:
+        export_predictor(model, CANDIDATE_SCRIPTED_MODEL_PATH, quantize=True)
+        mae, r2 = evaluate_accuracy(torch.jit.load(CANDIDATE_SCRIPTED_MODEL_PATH), X_test, y_test)
+        failures = check_quality(mae, r2, max_mae, min_r2)
+        if not failures:
+            os.replace(CANDIDATE_SCRIPTED_MODEL_PATH, SCRIPTED_MODEL_PATH)
+            print(f"int8 export passed the quality gates (MAE {mae:.3f}, R^2 {r2:.4f}); serving it.")
+            return SCRIPTED_MODEL_PATH
+        os.remove(CANDIDATE_SCRIPTED_MODEL_PATH)
+        print(f"int8 export failed the quality gates ({'; '.join(failures)}); exporting float32 instead.")
+    return export_predictor(model, SCRIPTED_MODEL_PATH)
+
+def test_inference(model, X_test, y_test):
     num_samples = X_test.shape[0]
-    total_time = 0.0
-    predictions = []
-    with torch.no_grad():
-        for i in range(num_samples):
-            input_sample=X_test[i].unsqueeze(0)
-            start = time.time()
-            pred = model(input_sample)
-            total_time += (time.time()-start)
-            predictions.append(pred.item())
-    avg_inference_time_ms = (total_time/num_samples)*1000
-    predictions = np.array(predictions)
-    ground_truth = y_test.numpy().flatten()
-    mae =np.mean(np.abs(predictions-ground_truth))
-    r2 = r2_score(ground_truth, predictions)
+    mae, r2 = evaluate_accuracy(model, X_test, y_test)
+    latency = profile_latency(model, X_test)
+    avg_inference_time_ms = latency[1]["mean_ms"] if 1 in latency else None
 
     print(f"Tested {num_samples} samples.")
-    print(f"Average inference time: {avg_inference_time_ms:.2f} ms per task.")
+    for batch_size, stats in latency.items():
+        print(f"Batch {batch_size}: p50 {stats['p50_ms']:.3f} ms, p95 {stats['p95_ms']:.3f} ms, "
+              f"p99 {stats['p99_ms']:.3f} ms, {stats['rows_per_sec']:,.0f} rows/s")
     print(f"Mean Absolute Error (MAE): {mae:.2f}")
     print(f"R^2 Score: {r2:.2f}")
     return avg_inference_time_ms, mae, r2
 
 def main():
-    MODEL_PATH = "ai_model/nnp_model.pth"
-    df_train = pd.read_csv("data/simulation/task_gpu_pairs.csv")
-    # df_train = df.sample(n=500000, random_state=42)
-
-    X = df_train[["utilization","memory_used_gb"]].values
-    y = (100-df_train["utilization"]).values.reshape(-1,1)
+    parser = argparse.ArgumentParser(description="Train the NNP GPU-suitability model")
+    parser.add_argument("--epochs", type=int, default=TRAIN_EPOCHS)
+    parser.add_argument("--batch-size", type=int, default=TRAIN_BATCH_SIZE)
+    parser.add_argument("--lr", type=float, default=TRAIN_LR, help="Peak learning rate")
+    parser.add_argument("--patience", type=int, default=DEFAULT_PATIENCE, help="Epochs without improvement before stopping")
+    parser.add_argument("--threads", type=int, default=TRAIN_THREADS)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="DataLoader worker processes")
+    parser.add_argument("--retrain", action="store_true", help="Train even if a saved model exists")
+    parser.add_argument("--resume", action="store_true", help=f"Continue from {CHECKPOINT_PATH}")
+    parser.add_argument("--gate", action="store_true",
+                        help="Keep the previous model unless the retrained one passes the quality gates")
+    parser.add_argument("--max-mae", type=float, default=MAX_TEST_MAE, help="Quality gate on test MAE")
+    parser.add_argument("--min-r2", type=float, default=MIN_TEST_R2, help="Quality gate on test R^2")
+    parser.add_argument("--quantize", action="store_true",
+                        help="Serve an int8 TorchScript export if it passes the quality gates too")
+    args = parser.parse_args()
 
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.10, random_state=42
-    )
-    
-    # Convert data to PyTorch tensors
-    X_train_tensor = torch.tensor(X_train, dtype=torch.float32)
-    y_train_tensor = torch.tensor(y_train, dtype=torch.float32)
-    X_test_tensor = torch.tensor(X_test, dtype=torch.float32)
-    y_test_tensor = torch.tensor(y_test, dtype=torch.float32)
-    
-    # Create DataLoader for training
-    train_dataset = torch.utils.data.TensorDataset(X_train_tensor, y_train_tensor)
-    train_loader = torch.utils.data.DataLoader(train_dataset, batch_size=64, shuffle=True)
+    # One-off CSV -> memory-mapped .npy conversion; training then streams chunks from disk.
+    total_rows = convert_csv(CSV_PATH, DATA_DIR)
+    # The pairs are generated independently, so contiguous ranges make unbiased splits:
+    # [train | validation | test].
+    split = int(total_rows * (1 - TEST_FRACTION))
+    val_start = int(split * (1 - VAL_FRACTION))
+    train_loader = make_loader(DATA_DIR, batch_size=args.batch_size, stop=val_start, shuffle=True, workers=args.workers)
+    val_loader = make_loader(DATA_DIR, batch_size=EVAL_BATCH_SIZE, start=val_start, stop=split, shuffle=False, workers=0)
+    X_test_tensor, y_test_tensor = load_rows(DATA_DIR, split, min(total_rows, split + MAX_TEST_ROWS))
 
-    if os.path.exists(MODEL_PATH):
+    if os.path.exists(MODEL_PATH) and not (args.retrain or args.resume):
         print("Loadking existing model......")
-        model = torch.load(MODEL_PATH,weights_only=False)
+        upgraded = upgrade_saved_model(MODEL_PATH)
+        model = load_weights(NNP(), MODEL_PATH)
+        if upgraded or args.quantize or not os.path.exists(SCRIPTED_MODEL_PATH):
+            export_served_model(model, X_test_tensor, y_test_tensor, args.quantize, args.max_mae, args.min_r2)
     else:
         os.makedirs("ai_model",exist_ok=True)
         model= NNP()
         print("Training the NNP model.....")
-        model = train_model(model,train_loader,epochs=50,lr=0.001)
+        model = train_model(model, train_loader, epochs=args.epochs, lr=args.lr, val_loader=val_loader,
+                            patience=args.patience, threads=args.threads,
+                            checkpoint_path=CHECKPOINT_PATH, resume=args.resume)
+        # Weights only: loading doesn't depend on this script's class being importable.
+        torch.save(model.state_dict(), CANDIDATE_MODEL_PATH)
+        mae, r2 = evaluate_accuracy(model, X_test_tensor, y_test_tensor)
+        failures = check_quality(mae, r2, args.max_mae, args.min_r2)
+        if failures and args.gate:
+            # Keep the previous model (and the checkpoint, to resume from) rather than ship a worse one.
+            print(f"Quality gates failed: {'; '.join(failures)}. Candidate left at {CANDIDATE_MODEL_PATH}; "
+                  f"{MODEL_PATH} unchanged.")
+            sys.exit(1)
+        if failures:
+            print(f"Warning: quality gates failed ({'; '.join(failures)}); saving anyway (pass --gate to enforce).")
+        else:
+            print(f"Quality gates passed (MAE {mae:.3f}, R^2 {r2:.4f}).")
 
-        torch.save(model,MODEL_PATH)
+        os.replace(CANDIDATE_MODEL_PATH, MODEL_PATH)
         print(f"Model saved to {MODEL_PATH}")
+        export_served_model(model, X_test_tensor, y_test_tensor, args.quantize, args.max_mae, args.min_r2)
+        if os.path.exists(CHECKPOINT_PATH):
+            os.remove(CHECKPOINT_PATH)
 
     print("\nTesting inference speed and accuracy on the test set...")
     avg_time, mae, r2 = test_inference(model, X_test_tensor, y_test_tensor)
@@ -1,10 +1,18 @@
-import gym
+import gymnasium as gym
 import numpy as np
 import random
 import torch
 import datetime
 from stable_baselines3 import PPO
+from stable_baselines3.common.vec_env import DummyVecEnv
 from db.database import DatabaseManager
+from rl.trace_env import TraceGPUSchedulingEnv
+from rl.vec_env import VecGPUSchedulingEnv
+
+# Environments each agent steps together through VecGPUSchedulingEnv (1 keeps the plain env).
+NUM_ENVS = 8
+# Samples per PPO rollout, split across the environments (stable-baselines3's default n_steps).
+ROLLOUT_STEPS = 2048
 
 class GPUSchedulingEnv(gym.Env):
     def __init__(self):
@@ -31,6 +39,24 @@ class GPUSchedulingEnv(gym.Env):
         done = self.step_count >= self.max_steps
         return self.state, reward, done, False, {}
 
+def make_env(trace_dir=None, cluster=None, seed=None):
+    """The simulated env, or with trace_dir one replaying recorded metrics (see rl.trace_env)."""
+    if trace_dir is None:
+        return GPUSchedulingEnv()
+    return TraceGPUSchedulingEnv(trace_dir, cluster=cluster, seed=seed)
+
+def make_agent(num_envs=NUM_ENVS, seed=None, device="auto", trace_dir=None, cluster=None):
+    """PPO agent collecting ROLLOUT_STEPS samples per update from num_envs environments at once."""
+    if num_envs <= 1:
+        return PPO("MlpPolicy", make_env(trace_dir, cluster, seed), verbose=0, seed=seed, device=device)
+    if trace_dir is None:
+        env = VecGPUSchedulingEnv(num_envs, seed=seed)
+    else:
+        env = DummyVecEnv([
+            lambda i=i: make_env(trace_dir, cluster, None if seed is None else seed + i) for i in range(num_envs)
+        ])
+    return PPO("MlpPolicy", env, n_steps=max(1, ROLLOUT_STEPS // num_envs), verbose=0, seed=seed, device=device)
+
 def federated_aggregate(models):
     global_state_dict = {}
     num_models = len(models)
@@ -48,16 +74,33 @@ def update_local_models(models, global_state_dict):
     for model in models:
         model.policy.load_state_dict(global_state_dict)
 
-def simulate_federated_training():
+def evaluate_agent(agent, num_test_episodes=10, trace_dir=None):
+    test_env = make_env(trace_dir)
+    rewards = []
+    for _ in range(num_test_episodes):
+        obs, _ = test_env.reset()
+        ep_reward = 0
+        done = False
+        while not done:
+            action, _ = agent.predict(obs, deterministic=True)
+            obs, reward, done, _, _ = test_env.step(action)
+            ep_reward += reward
+        rewards.append(ep_reward)
+    return np.mean(rewards)
+
+def simulate_federated_training(parallel=False, trace_dir=None):
+    if parallel:
+        # Same rounds, but local training runs in worker processes. Only the policy and each
+        # cluster's optimizer state persist between rounds there; see ParallelFederatedTrainer.
+        from rl.parallel_federated import simulate_parallel_federated_training
+        return simulate_parallel_federated_training(trace_dir=trace_dir)
     num_clusters = 20
     local_training_steps = 4000
     num_rounds = 7  # Each round represents a day
 
     agents = []
-    for _ in range(num_clusters):
-        env = GPUSchedulingEnv()
-        model = PPO("MlpPolicy", env, verbose=0)
-        agents.append(model)
+    for idx in range(num_clusters):
+        agents.append(make_agent(trace_dir=trace_dir, cluster=idx))
 
     performance = []
     db = DatabaseManager()
@@ -72,19 +115,7 @@ def simulate_federated_training():
         print("Global model aggregated and local models updated.")
         
         # Evaluate using agent 0.
-        test_env = GPUSchedulingEnv()
-        num_test_episodes = 10
-        rewards = []
-        for _ in range(num_test_episodes):
-            obs, _ = test_env.reset()
-            ep_reward = 0
-            done = False
-            while not done:
-                action, _ = agents[0].predict(obs, deterministic=True)
-                obs, reward, done, _, _ = test_env.step(action)
-                ep_reward += reward
-            rewards.append(ep_reward)
-        avg_reward = np.mean(rewards)
+        avg_reward = evaluate_agent(agents[0], trace_dir=trace_dir)
         performance.append(avg_reward)
         
         # Save RL performance data for this round into the database.
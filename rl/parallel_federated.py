@@ -0,0 +1,266 @@
+import argparse
+import datetime
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+import numpy as np
+import torch
+from stable_baselines3.common.callbacks import BaseCallback
+from db.database import DatabaseManager
+from rl.federated_ppo import NUM_ENVS, evaluate_agent, make_agent
+
+NUM_CLUSTERS = 20
+LOCAL_TRAINING_STEPS = 4000
+NUM_ROUNDS = 7  # Each round represents a day
+# Fraction of clusters sampled to train in each round (at least one always participates).
+DEFAULT_PARTICIPATION = 1.0
+# Seconds a round waits for local updates; None waits for every participant.
+DEFAULT_ROUND_DEADLINE = None
+# Extra seconds the coordinator waits past the deadline for workers to notice it and return.
+DEADLINE_GRACE_SECONDS = 1.0
+# One single-threaded worker process per core; PPO on this MLP gains nothing from intra-op threads.
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+
+class _DeadlineCallback(BaseCallback):
+    """Stops learn() once the round deadline (wall clock, shared across processes) has passed."""
+    def __init__(self, deadline_at):
+        super().__init__()
+        self.deadline_at = deadline_at
+
+    def _on_step(self):
+        return time.time() < self.deadline_at
+
+
+def _init_worker():
+    torch.set_num_threads(1)
+
+
+def _to_numpy(value):
+    """Tensors (also inside nested dicts/lists, e.g. an optimizer state_dict) as numpy arrays for pickling."""
+    if isinstance(value, torch.Tensor):
+        return value.detach().cpu().numpy()
+    if isinstance(value, dict):
+        return {key: _to_numpy(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_to_numpy(item) for item in value]
+    return value
+
+
+def _to_torch(value):
+    if isinstance(value, np.ndarray):
+        return torch.from_numpy(value)
+    if isinstance(value, dict):
+        return {key: _to_torch(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_to_torch(item) for item in value]
+    return value
+
+
+def _train_cluster(cluster_id, global_state, local_steps, seed, deadline_at=None, num_envs=NUM_ENVS, trace_dir=None,
+                   optimizer_state=None):
+    """
+    Runs one cluster's local training in a worker process. Starts from the global
+    policy and the cluster's own optimizer state from its previous round, and
+    returns (cluster_id, policy state_dict, optimizer state_dict, samples) as
+    numpy arrays, or None if the round deadline passed before local_steps were collected.
+    """
+    if deadline_at is not None and time.time() >= deadline_at:
+        return None
+    agent = make_agent(num_envs, seed=seed, device="cpu", trace_dir=trace_dir, cluster=cluster_id)
+    agent.policy.load_state_dict(_to_torch(global_state))
+    if optimizer_state is not None:
+        agent.policy.optimizer.load_state_dict(_to_torch(optimizer_state))
+    callback = _DeadlineCallback(deadline_at) if deadline_at is not None else None
+    agent.learn(total_timesteps=local_steps, callback=callback)
+    if agent.num_timesteps < local_steps:
+        return None
+    return (cluster_id, _to_numpy(agent.policy.state_dict()), _to_numpy(agent.policy.optimizer.state_dict()),
+            agent.num_timesteps)
+
+
+def average_state_dicts(state_dicts, weights):
+    """FedAvg: per-parameter mean of the local state dicts, weighted by samples trained."""
+    weights = np.asarray(weights, dtype=np.float64)
+    weights = weights / weights.sum()
+    averaged = {}
+    for key, reference in state_dicts[0].items():
+        total = np.zeros(reference.shape, dtype=np.float64)
+        for state, weight in zip(state_dicts, weights):
+            total += weight * state[key]
+        averaged[key] = total.astype(reference.dtype)
+    return averaged
+
+
+class ParallelFederatedTrainer:
+    """
+    Federated PPO with local training spread over a process pool.
+
+    The coordinator keeps the only long-lived PPO model (the global policy). Each
+    round it samples `participation` of the clusters, sends every participant the
+    global policy weights, and the workers build a fresh agent for that cluster,
+    train it for local_steps and send back the policy and optimizer state dicts.
+    Policies are averaged weighted by samples, so round wall-clock time is about
+    ceil(participants / workers) local trainings instead of one per cluster.
+
+    Each cluster's Adam state is kept here and sent back with its next round, as
+    the sequential trainer's persistent agents keep theirs. What is not carried
+    over is the rest of an agent: its env is reset and its timestep counter and
+    rollout buffer start empty every round.
+
+    With round_deadline set, workers stop training once it passes and their update
+    is dropped; the round aggregates whatever arrived in time, and if nothing did
+    the global policy is left unchanged.
+    """
+    def __init__(self, num_clusters=NUM_CLUSTERS, local_steps=LOCAL_TRAINING_STEPS,
+                 participation=DEFAULT_PARTICIPATION, round_deadline=DEFAULT_ROUND_DEADLINE,
+                 workers=DEFAULT_WORKERS, seed=0, num_envs=NUM_ENVS, trace_dir=None):
+        self.num_clusters = num_clusters
+        self.local_steps = local_steps
+        self.participation = participation
+        self.round_deadline = round_deadline
+        self.workers = max(1, min(workers, num_clusters))
+        self.seed = seed
+        self.num_envs = num_envs
+        # Workers open the trace files themselves; only the path is sent to them.
+        self.trace_dir = trace_dir
+        self.rng = np.random.default_rng(seed)
+        self._optimizer_states = {}     # cluster_id -> optimizer state_dict from its last accepted round
+        self.global_model = make_agent(num_envs, seed=seed, device="cpu", trace_dir=trace_dir)
+        self._pool = None
+        self.rounds = 0
+        self.updates_received = 0
+        self.stragglers_dropped = 0
+        self.failures = 0
+        self.last_round_seconds = 0.0
+
+    def start(self):
+        if self._pool is not None:
+            return self
+        # Spawn, not fork: the coordinator already holds torch threads.
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                         initializer=_init_worker)
+        return self
+
+    def stop(self):
+        if self._pool is None:
+            return
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        self._pool = None
+
+    def global_state(self):
+        return _to_numpy(self.global_model.policy.state_dict())
+
+    def sample_participants(self):
+        count = min(self.num_clusters, max(1, int(round(self.participation * self.num_clusters))))
+        return sorted(self.rng.choice(self.num_clusters, size=count, replace=False).tolist())
+
+    def run_round(self):
+        """Trains one federated round; returns the ids of the clusters whose updates were aggregated."""
+        if self._pool is None:
+            raise RuntimeError("ParallelFederatedTrainer is not started")
+        start = time.perf_counter()
+        participants = self.sample_participants()
+        global_state = self.global_state()
+        deadline_at = time.time() + self.round_deadline if self.round_deadline is not None else None
+        futures = [
+            self._pool.submit(_train_cluster, cluster_id, global_state, self.local_steps,
+                              self.seed + self.rounds * self.num_clusters + cluster_id, deadline_at, self.num_envs,
+                              self.trace_dir, self._optimizer_states.get(cluster_id))
+            for cluster_id in participants
+        ]
+        timeout = self.round_deadline + DEADLINE_GRACE_SECONDS if self.round_deadline is not None else None
+        done, not_done = wait(futures, timeout=timeout)
+        for future in not_done:
+            # Not started yet: never runs. Already running: it stops at the deadline and is ignored.
+            future.cancel()
+
+        updates = []
+        failures = 0
+        for future in done:
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Error in local training: {e}")
+                failures += 1
+                continue
+            if result is not None:
+                updates.append(result)
+        self.failures += failures
+        self.stragglers_dropped += len(participants) - len(updates) - failures
+
+        for cluster_id, _, optimizer_state, _ in updates:
+            self._optimizer_states[cluster_id] = optimizer_state
+        if updates:
+            averaged = average_state_dicts([update[1] for update in updates], [update[3] for update in updates])
+            self.global_model.policy.load_state_dict(_to_torch(averaged))
+        else:
+            print("No local updates arrived before the round deadline; global model unchanged.")
+        self.rounds += 1
+        self.updates_received += len(updates)
+        self.last_round_seconds = time.perf_counter() - start
+        return sorted(update[0] for update in updates)
+
+    def stats(self):
+        return {
+            "rounds": self.rounds,
+            "workers": self.workers,
+            "updates_received": self.updates_received,
+            "stragglers_dropped": self.stragglers_dropped,
+            "failures": self.failures,
+            "last_round_seconds": round(self.last_round_seconds, 3),
+        }
+
+
+def simulate_parallel_federated_training(num_clusters=NUM_CLUSTERS, local_steps=LOCAL_TRAINING_STEPS,
+                                         num_rounds=NUM_ROUNDS, participation=DEFAULT_PARTICIPATION,
+                                         round_deadline=DEFAULT_ROUND_DEADLINE, workers=DEFAULT_WORKERS, seed=0,
+                                         num_envs=NUM_ENVS, trace_dir=None):
+    trainer = ParallelFederatedTrainer(num_clusters, local_steps, participation, round_deadline, workers, seed,
+                                       num_envs, trace_dir).start()
+    performance = []
+    db = DatabaseManager()
+    db.connect()
+    try:
+        for round in range(num_rounds):
+            print(f"\nFederated Round {round+1}/{num_rounds} -----")
+            aggregated = trainer.run_round()
+            print(f"Aggregated {len(aggregated)} local updates in {trainer.last_round_seconds:.1f}s.")
+
+            avg_reward = evaluate_agent(trainer.global_model, trace_dir=trace_dir)
+            performance.append(avg_reward)
+
+            day_label = f"Day {round+1}"
+            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            db.insert_rl_performance(day_label, avg_reward, timestamp)
+            print(f"Round {round+1} average reward: {avg_reward:.2f} saved to DB.")
+    finally:
+        trainer.stop()
+        db.close()
+    print(f"Trainer stats: {trainer.stats()}")
+    days = [f"Day {i+1}" for i in range(num_rounds)]
+    return {"days": days, "average_rewards": performance}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Federated PPO with local training in worker processes.")
+    parser.add_argument("--clusters", type=int, default=NUM_CLUSTERS)
+    parser.add_argument("--local-steps", type=int, default=LOCAL_TRAINING_STEPS)
+    parser.add_argument("--rounds", type=int, default=NUM_ROUNDS)
+    parser.add_argument("--participation", type=float, default=DEFAULT_PARTICIPATION,
+                        help="Fraction of clusters trained per round.")
+    parser.add_argument("--round-deadline", type=float, default=DEFAULT_ROUND_DEADLINE,
+                        help="Seconds per round before late updates are dropped.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--num-envs", type=int, default=NUM_ENVS, help="Environments stepped together per agent.")
+    parser.add_argument("--trace-dir", default=None,
+                        help="Replay recorded metrics exported by rl/trace_env.py instead of the simulated env.")
+    args = parser.parse_args()
+    results = simulate_parallel_federated_training(args.clusters, args.local_steps, args.rounds, args.participation,
+                                                   args.round_deadline, args.workers, args.seed, args.num_envs,
+                                                   args.trace_dir)
+    print("Federated PPO Training Performance:")
+    for day, reward in zip(results["days"], results["average_rewards"]):
+        print(f"{day}: {reward:.2f}")
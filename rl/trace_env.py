@@ -0,0 +1,202 @@
+"""
+Trace-driven GPUSchedulingEnv.
+
+build_traces() reads per-cluster utilization, power and temperature once, from
+the cluster-level metric_rollups when the compactor has produced them and from
+raw gpu_metrics (averaged per cluster and minute) otherwise. It writes them to
+trace_dir as one contiguous float32 array (traces.npy, [T, 3], each column
+scaled to [0, 1]). A cluster's samples are split into segments wherever the
+recording has a gap longer than one resolution step; offsets.npy marks where
+every segment starts, segment_clusters.npy which cluster (a line of
+clusters.txt) it belongs to. TraceGPUSchedulingEnv memory-maps those files and
+every episode replays a random window of one segment, so training never touches
+the database and no window spans a gap.
+"""
+import argparse
+import os
+import numpy as np
+import gymnasium as gym
+from gymnasium import spaces
+from sqlite3 import Error
+from config import DB_PATH
+from db.database import DatabaseManager
+from db.rollups import RESOLUTION_SECONDS
+
+TRACE_DIR = "data/simulation/cluster_traces"
+TRACE_RESOLUTION = "1m"
+# Scale of each trace column; simulated GPUs stay within these.
+MAX_UTILIZATION = 100.0
+MAX_POWER_WATTS = 500.0
+MAX_TEMPERATURE = 100.0
+MAX_STEPS = 50
+# Utilization the action adds (+) or sheds (-) on top of the recorded trace, and the power that follows it.
+ACTION_EFFECT = 0.1
+POWER_PER_UTILIZATION = 0.5
+
+ROLLUP_TRACE_QUERY = """
+    SELECT scope_id, bucket_start, utilization_avg, power_watts_avg, temperature_avg
+    FROM metric_rollups
+    WHERE resolution = ? AND scope = 'cluster'
+    ORDER BY scope_id, bucket_start
+"""
+RAW_TRACE_QUERY = """
+    SELECT r.cluster_name, substr(m.timestamp, 1, 16) || ':00', AVG(m.utilization), AVG(m.power_watts), AVG(m.temperature)
+    FROM gpu_metrics m
+    JOIN gpus g ON g.gpu_id = m.gpu_id
+    JOIN racks r ON r.rack_id = g.rack_id
+    GROUP BY r.cluster_name, substr(m.timestamp, 1, 16)
+    ORDER BY r.cluster_name, substr(m.timestamp, 1, 16)
+"""
+
+# Sample spacing of the raw trace, which is averaged per minute.
+RAW_STEP_SECONDS = 60
+
+# trace_dir -> (traces memmap, segment offsets, segment clusters, cluster names), shared by every env in the process.
+_loaded = {}
+
+
+def _read_rows(db, resolution):
+    """(rows, step seconds): (cluster, bucket time, utilization, power, temperature) ordered by cluster and time."""
+    try:
+        rows = db.conn.execute(ROLLUP_TRACE_QUERY, (resolution,)).fetchall()
+    except Error:
+        rows = []
+    if rows:
+        print(f"Building traces from {resolution} cluster rollups.")
+        return rows, RESOLUTION_SECONDS[resolution]
+    print("No cluster rollups found; building traces from raw gpu_metrics.")
+    return db.conn.execute(RAW_TRACE_QUERY).fetchall(), RAW_STEP_SECONDS
+
+
+def build_traces(db_path=DB_PATH, trace_dir=TRACE_DIR, resolution=TRACE_RESOLUTION, rebuild=False):
+    """Writes the trace files (skipped if they exist, unless rebuild). Returns the number of trace rows."""
+    if resolution not in RESOLUTION_SECONDS:
+        raise ValueError(f"Unknown resolution {resolution!r}; expected one of {sorted(RESOLUTION_SECONDS)}.")
+    traces_path = os.path.join(trace_dir, "traces.npy")
+    if os.path.exists(traces_path) and not rebuild:
+        return len(np.load(traces_path, mmap_mode="r"))
+    db = DatabaseManager(db_path=db_path, read_only=True)
+    db.connect()
+    try:
+        rows, step_seconds = _read_rows(db, resolution)
+    finally:
+        db.close()
+    if not rows:
+        raise ValueError("No metrics recorded yet; run the simulation before building traces.")
+
+    names = np.array([row[0] for row in rows])
+    times = np.array([row[1] for row in rows], dtype="datetime64[s]").astype(np.int64)
+    values = np.array([row[2:] for row in rows], dtype=np.float64)
+    values /= (MAX_UTILIZATION, MAX_POWER_WATTS, MAX_TEMPERATURE)
+    np.clip(values, 0, 1, out=values)
+    # Rows arrive ordered by cluster and time; a segment ends where the cluster changes or the recording skips a step.
+    new_cluster = np.concatenate(([True], names[1:] != names[:-1]))
+    gap = np.concatenate(([False], np.diff(times) > step_seconds))
+    starts = np.flatnonzero(new_cluster | gap)
+    offsets = np.append(starts, len(names)).astype(np.int64)
+    cluster_names = names[new_cluster]
+    segment_clusters = (np.cumsum(new_cluster) - 1)[starts].astype(np.int64)
+
+    os.makedirs(trace_dir, exist_ok=True)
+    offsets_path = os.path.join(trace_dir, "offsets.npy")
+    segment_clusters_path = os.path.join(trace_dir, "segment_clusters.npy")
+    clusters_path = os.path.join(trace_dir, "clusters.txt")
+    np.save(traces_path + ".tmp.npy", values.astype(np.float32))
+    np.save(offsets_path + ".tmp.npy", offsets)
+    np.save(segment_clusters_path + ".tmp.npy", segment_clusters)
+    with open(clusters_path + ".tmp", "w") as f:
+        f.write("\n".join(cluster_names.tolist()) + "\n")
+    # traces.npy is renamed last, so an interrupted build is never mistaken for a finished one.
+    os.replace(offsets_path + ".tmp.npy", offsets_path)
+    os.replace(segment_clusters_path + ".tmp.npy", segment_clusters_path)
+    os.replace(clusters_path + ".tmp", clusters_path)
+    os.replace(traces_path + ".tmp.npy", traces_path)
+    _loaded.pop(trace_dir, None)
+    print(f"Wrote {len(values)} trace rows in {len(starts)} segments for {len(cluster_names)} clusters to {trace_dir}.")
+    return len(values)
+
+
+def load_traces(trace_dir=TRACE_DIR):
+    """(traces, offsets, segment_clusters, clusters); traces is memory-mapped and opened once per process."""
+    if trace_dir not in _loaded:
+        traces = np.load(os.path.join(trace_dir, "traces.npy"), mmap_mode="r")
+        offsets = np.load(os.path.join(trace_dir, "offsets.npy"))
+        segment_clusters = np.load(os.path.join(trace_dir, "segment_clusters.npy"))
+        with open(os.path.join(trace_dir, "clusters.txt")) as f:
+            clusters = [line.strip() for line in f if line.strip()]
+        _loaded[trace_dir] = (traces, offsets, segment_clusters, clusters)
+    return _loaded[trace_dir]
+
+
+class TraceGPUSchedulingEnv(gym.Env):
+    """
+    GPUSchedulingEnv whose state follows recorded fleet metrics.
+
+    The observation is the cluster's (utilization, power, temperature) at the
+    current minute, each in [0, 1]. The action shifts this step's utilization by
+    up to +/-ACTION_EFFECT / 2 around the trace, and power moves with it.
+
+    Reward is 0.7*utilization + 0.2*(1 - power) + 0.1*(1 - temperature). The
+    weights are GPUSchedulingEnv's, but its third term, speed, is not recorded
+    in gpu_metrics, so it is deliberately replaced by temperature headroom. The
+    two envs' rewards are therefore not directly comparable.
+
+    `cluster` pins episodes to one cluster's segments (a name, or an index that
+    wraps around the recorded clusters, e.g. a federated cluster id); by default
+    windows are drawn from every cluster. A window never crosses a segment
+    boundary, so each episode replays one uninterrupted recording.
+    """
+    def __init__(self, trace_dir=TRACE_DIR, cluster=None, max_steps=MAX_STEPS, seed=None):
+        super(TraceGPUSchedulingEnv, self).__init__()
+        self.observation_space = spaces.Box(low=0, high=1, shape=(3,), dtype=np.float32)
+        self.action_space = spaces.Box(low=0, high=1, shape=(1,), dtype=np.float32)
+        self.traces, offsets, segment_clusters, clusters = load_traces(trace_dir)
+        self.max_steps = max_steps
+        self.rng = np.random.default_rng(seed)
+        starts, ends = offsets[:-1], offsets[1:]
+        if cluster is not None:
+            position = cluster % len(clusters) if isinstance(cluster, int) else clusters.index(cluster)
+            selected = segment_clusters == position
+            starts, ends = starts[selected], ends[selected]
+        # Every start leaving room for max_steps transitions, as ranges per segment.
+        self._starts = starts
+        self._counts = np.maximum(ends - starts - max_steps, 0)
+        if self._counts.sum() == 0:
+            raise ValueError(f"No uninterrupted recorded trace is longer than {max_steps} samples.")
+        self._cumulative = np.cumsum(self._counts)
+        self.window = None
+        self.state = np.zeros(3, dtype=np.float32)
+        self.step_count = 0
+
+    def reset(self, *, seed=None, options=None):
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+        draw = self.rng.integers(self._cumulative[-1])
+        run = np.searchsorted(self._cumulative, draw, side="right")
+        start = self._starts[run] + draw - (self._cumulative[run] - self._counts[run])
+        # A private copy of the window; the memmap itself is only read here.
+        self.window = np.array(self.traces[start:start + self.max_steps + 1])
+        self.state[:] = self.window[0]
+        self.step_count = 0
+        return self.state.copy(), {}
+
+    def step(self, action):
+        self.step_count += 1
+        load = (float(action[0]) - 0.5) * ACTION_EFFECT
+        utilization, power, temperature = self.window[self.step_count]
+        self.state[0] = min(max(utilization + load, 0.0), 1.0)
+        self.state[1] = min(max(power + load * POWER_PER_UTILIZATION, 0.0), 1.0)
+        self.state[2] = temperature
+        reward = 0.7*self.state[0] + 0.2*(1-self.state[1]) + 0.1*(1-self.state[2])
+        done = self.step_count >= self.max_steps
+        return self.state.copy(), float(reward), done, False, {}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export per-cluster metric traces for TraceGPUSchedulingEnv.")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--output", default=TRACE_DIR)
+    parser.add_argument("--resolution", default=TRACE_RESOLUTION, help="Rollup resolution to read (1m, 1h, 1d).")
+    parser.add_argument("--rebuild", action="store_true")
+    args = parser.parse_args()
+    build_traces(args.db, args.output, args.resolution, args.rebuild)
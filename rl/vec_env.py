@@ -0,0 +1,110 @@
+import numpy as np
+from gymnasium import spaces
+from stable_baselines3.common.vec_env import VecEnv
+
+# Same dynamics as rl.federated_ppo.GPUSchedulingEnv.
+MAX_STEPS = 50
+NOISE = 0.05
+DRIFT = 0.1
+ENERGY_COST = 0.05
+# reward = 0.7*utilization + 0.2*(1 - energy) + 0.1*speed, as a dot product plus a constant.
+REWARD_WEIGHTS = np.array([0.7, -0.2, 0.1], dtype=np.float32)
+REWARD_BIAS = 0.2
+
+
+class VecGPUSchedulingEnv(VecEnv):
+    """
+    num_envs copies of GPUSchedulingEnv stepped together as one (num_envs, 3) array.
+
+    State, noise and reward live in preallocated NumPy buffers and every step is a
+    handful of vectorized operations drawn from one seeded Generator, so stepping
+    64 environments costs about the same as stepping one. Finished environments are
+    reset in place and report their last observation as info["terminal_observation"],
+    like stable-baselines3's DummyVecEnv.
+    """
+    def __init__(self, num_envs, seed=None, max_steps=MAX_STEPS):
+        self.render_mode = None
+        self.max_steps = max_steps
+        self.rng = np.random.default_rng(seed)
+        self._state = np.empty((num_envs, 3), dtype=np.float32)
+        self._noise = np.empty((num_envs, 3), dtype=np.float32)
+        self._rewards = np.empty(num_envs, dtype=np.float32)
+        self._step_counts = np.zeros(num_envs, dtype=np.int64)
+        self._actions = np.zeros(num_envs, dtype=np.float32)
+        observation_space = spaces.Box(low=0, high=1, shape=(3,), dtype=np.float32)
+        action_space = spaces.Box(low=0, high=1, shape=(1,), dtype=np.float32)
+        super().__init__(num_envs, observation_space, action_space)
+
+    def seed(self, seed=None):
+        self.rng = np.random.default_rng(seed)
+        return [seed] * self.num_envs
+
+    def reset(self):
+        self.rng.random(out=self._state, dtype=np.float32)
+        self._step_counts[:] = 0
+        self.reset_infos = [{} for _ in range(self.num_envs)]
+        return self._state.copy()
+
+    def step_async(self, actions):
+        self._actions[:] = np.asarray(actions, dtype=np.float32).reshape(self.num_envs)
+
+    def step_wait(self):
+        state = self._state
+        noise = self._noise
+        self.rng.random(out=noise, dtype=np.float32)
+        noise *= 2 * NOISE
+        noise -= NOISE
+        drift = (self._actions - 0.5) * DRIFT
+        state[:, 0] += drift
+        state[:, 1] -= self._actions * ENERGY_COST
+        state[:, 2] += drift
+        state += noise
+        np.clip(state, 0, 1, out=state)
+
+        rewards = self._rewards
+        np.dot(state, REWARD_WEIGHTS, out=rewards)
+        rewards += REWARD_BIAS
+
+        self._step_counts += 1
+        dones = self._step_counts >= self.max_steps
+        infos = [{} for _ in range(self.num_envs)]
+        if dones.any():
+            finished = np.flatnonzero(dones)
+            for i in finished:
+                infos[i]["terminal_observation"] = state[i].copy()
+                infos[i]["TimeLimit.truncated"] = False
+            state[finished] = self.rng.random((len(finished), 3), dtype=np.float32)
+            self._step_counts[finished] = 0
+        return state.copy(), rewards.copy(), dones, infos
+
+    def close(self):
+        pass
+
+    def _indices(self, indices):
+        if indices is None:
+            return range(self.num_envs)
+        if isinstance(indices, int):
+            return [indices]
+        return indices
+
+    def get_attr(self, attr_name, indices=None):
+        value = getattr(self, attr_name)
+        return [value for _ in self._indices(indices)]
+
+    def _require_whole_batch(self, indices, what):
+        # There are no per-environment objects: anything that changes state applies to the whole batch.
+        if indices is not None and sorted(self._indices(indices)) != list(range(self.num_envs)):
+            raise ValueError(f"VecGPUSchedulingEnv cannot {what} for individual environments; pass indices=None")
+
+    def set_attr(self, attr_name, value, indices=None):
+        self._require_whole_batch(indices, f"set {attr_name}")
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        """Calls the method once on the batch; every environment reports its result."""
+        self._require_whole_batch(indices, f"call {method_name}")
+        result = getattr(self, method_name)(*method_args, **method_kwargs)
+        return [result] * self.num_envs
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._indices(indices)]
@@ -0,0 +1,139 @@
+import numpy as np
+
+# Demand assumed for tasks that are plain ids rather than dicts.
+DEFAULT_TASK_MEMORY_GB = 4.0
+DEFAULT_TASK_UTILIZATION = 10.0
+# A GPU is not given more work once its projected utilization would pass this.
+MAX_UTILIZATION = 95.0
+# Candidates pulled from a CapacityIndex per task in a group (never fewer than MIN_CANDIDATES).
+CANDIDATES_PER_TASK = 4
+MIN_CANDIDATES = 64
+
+
+def task_id(task):
+    return task["task_id"] if isinstance(task, dict) else task
+
+
+def task_demand(task):
+    """(memory_gb, utilization) a task needs. Tasks are dicts with task_id, memory_gb and utilization, or plain ids."""
+    if isinstance(task, dict):
+        return (float(task.get("memory_gb", DEFAULT_TASK_MEMORY_GB)),
+                float(task.get("utilization", DEFAULT_TASK_UTILIZATION)))
+    return DEFAULT_TASK_MEMORY_GB, DEFAULT_TASK_UTILIZATION
+
+
+def task_placement(task):
+    """(cluster, vendor) a task is restricted to; None means any."""
+    if isinstance(task, dict):
+        return task.get("cluster"), task.get("vendor")
+    return None, None
+
+
+def model_scores(features):
+    # Imported here so the matcher (and the scheduler) load without torch until the model is used.
+    from scheduling.nnp_predictor import score_gpus
+    return score_gpus(features).numpy()
+
+
+def headroom_scores(features):
+    """Model-free fallback with the same target the NNP is trained on (100 - utilization)."""
+    return 100.0 - np.asarray(features)[:, 0]
+
+
+def score_after(score_fn, utilization, memory_used, profile_util, profile_mem):
+    """scores[p, g]: suitability of GPU g after it takes one task of profile p, from a single score_fn call."""
+    features = np.column_stack([(utilization[None, :] + profile_util[:, None]).ravel(),
+                                (memory_used[None, :] + profile_mem[:, None]).ravel()])
+    return np.asarray(score_fn(features), dtype=np.float64).reshape(len(profile_util), len(utilization))
+
+
+def assign_tasks(tasks, gpu_ids, utilization, memory_used, memory_total, score_fn=None,
+                 max_utilization=MAX_UTILIZATION):
+    """
+    Places a batch of tasks on the fleet in one pass.
+
+    Tasks are grouped into demand profiles and every profile is scored against
+    every GPU at once, using the GPU's state after placement ([utilization,
+    memory_used_gb], as the NNP was trained). Tasks are then placed greedily,
+    largest first, on the best-scoring GPU that still has room, in rounds: a GPU
+    takes at most one task per round, and the GPUs that took one are rescored
+    together before the next round, so later tasks see the load earlier ones
+    added instead of all landing on the same GPU. score_fn runs once up front
+    and once per round, not once per task; with candidate sets larger than the
+    batch (as assign_tasks_indexed pulls them) that is one round.
+
+    Returns ([(task, gpu_id, score), ...], [unplaced tasks]).
+    """
+    if score_fn is None:
+        score_fn = model_scores
+    if not tasks or len(gpu_ids) == 0:
+        return [], list(tasks)
+    util = np.array(utilization, dtype=np.float64)
+    mem = np.array(memory_used, dtype=np.float64)
+    free_mem = np.asarray(memory_total, dtype=np.float64) - mem
+
+    demands = [task_demand(task) for task in tasks]
+    profiles = sorted(set(demands))
+    profile_index = {profile: index for index, profile in enumerate(profiles)}
+    profile_mem = np.array([profile[0] for profile in profiles])
+    profile_util = np.array([profile[1] for profile in profiles])
+    scores = score_after(score_fn, util, mem, profile_util, profile_mem)
+
+    assignments = []
+    unassigned = []
+    pending = sorted(range(len(tasks)), key=lambda i: demands[i], reverse=True)
+    while pending:
+        taken = np.zeros(len(gpu_ids), dtype=bool)
+        deferred = []
+        for position in pending:
+            task = tasks[position]
+            demand_mem, demand_util = demands[position]
+            fits = (free_mem >= demand_mem) & (util + demand_util <= max_utilization)
+            if not fits.any():
+                unassigned.append(task)
+                continue
+            # Scores of GPUs that took a task this round are stale until the round ends.
+            open_gpus = fits & ~taken
+            if not open_gpus.any():
+                deferred.append(position)
+                continue
+            row = scores[profile_index[demands[position]]]
+            gpu = int(np.argmax(np.where(open_gpus, row, -np.inf)))
+            assignments.append((task, gpu_ids[gpu], float(row[gpu])))
+            util[gpu] += demand_util
+            mem[gpu] += demand_mem
+            free_mem[gpu] -= demand_mem
+            taken[gpu] = True
+        if deferred:
+            columns = np.flatnonzero(taken)
+            scores[:, columns] = score_after(score_fn, util[columns], mem[columns], profile_util, profile_mem)
+        pending = deferred
+    return assignments, unassigned
+
+
+def assign_tasks_indexed(tasks, index, score_fn=None, max_utilization=MAX_UTILIZATION):
+    """
+    Like assign_tasks, but only scores GPUs a CapacityIndex says can fit.
+
+    Tasks are grouped by their cluster/vendor restriction; each group pulls a
+    small candidate set from the index and runs the matcher on it. Placements are
+    booked in the index, so later groups and ticks see the added load.
+    """
+    groups = {}
+    for task in tasks:
+        groups.setdefault(task_placement(task), []).append(task)
+    assignments = []
+    unassigned = []
+    for (cluster, vendor), group in groups.items():
+        demands = [task_demand(task) for task in group]
+        candidate_ids = index.candidates(min(demand[0] for demand in demands), min(demand[1] for demand in demands),
+                                         cluster=cluster, vendor=vendor, max_utilization=max_utilization,
+                                         limit=max(MIN_CANDIDATES, CANDIDATES_PER_TASK * len(group)))
+        utilization, memory_used, memory_total = index.state(candidate_ids)
+        placed, missed = assign_tasks(group, candidate_ids, utilization, memory_used, memory_total,
+                                      score_fn=score_fn, max_utilization=max_utilization)
+        for task, gpu_id, _ in placed:
+            index.reserve(gpu_id, *task_demand(task))
+        assignments.extend(placed)
+        unassigned.extend(missed)
+    return assignments, unassigned
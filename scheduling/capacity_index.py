@@ -0,0 +1,149 @@
+import bisect
+import threading
+import numpy as np
+from scheduling.assignment import MAX_UTILIZATION
+
+# Lower edges (GB) of the free-memory buckets.
+FREE_MEMORY_BUCKETS_GB = (0, 2, 4, 8, 12, 16, 24, 32, 48, 64, 96)
+UTILIZATION_BAND_WIDTH = 10
+DEFAULT_CANDIDATE_LIMIT = 256
+
+
+def memory_bucket(free_gb):
+    return max(bisect.bisect_right(FREE_MEMORY_BUCKETS_GB, free_gb) - 1, 0)
+
+
+def utilization_band(utilization):
+    return int(min(max(utilization, 0.0), 100.0) // UTILIZATION_BAND_WIDTH)
+
+
+class CapacityIndex:
+    """
+    In-memory index of where spare GPU capacity is.
+
+    GPUs are filed into cells keyed by (free-memory bucket, utilization band),
+    and inside each cell by cluster and vendor. candidates() walks only the cells
+    that can fit a task, least loaded first, and checks exact values only in the
+    boundary cells, so a lookup touches a handful of cells and at most `limit`
+    GPUs regardless of fleet size. The index is seeded from
+    DatabaseManager.get_fleet_snapshot() and then kept current by update(),
+    which takes committed metric rows (e.g. as an IngestionService commit
+    listener), and by reserve(), which books a placement until the next sample.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cells = {}    # (memory bucket, utilization band) -> {cluster: {vendor: {gpu_id}}}
+        self._gpus = {}     # gpu_id -> [cluster, vendor, memory_total, utilization, memory_used, timestamp, cell]
+        self.updates = 0
+
+    def __len__(self):
+        return len(self._gpus)
+
+    def _remove(self, gpu_id):
+        entry = self._gpus.get(gpu_id)
+        if entry is not None and entry[6] is not None:
+            self._cells[entry[6]][entry[0]][entry[1]].discard(gpu_id)
+            entry[6] = None
+
+    def _place(self, gpu_id):
+        entry = self._gpus[gpu_id]
+        cluster, vendor, memory_total, utilization, memory_used, _, cell = entry
+        key = (memory_bucket(memory_total - memory_used), utilization_band(utilization))
+        if key == cell:
+            return
+        self._remove(gpu_id)
+        self._cells.setdefault(key, {}).setdefault(cluster, {}).setdefault(vendor, set()).add(gpu_id)
+        entry[6] = key
+
+    def load_snapshot(self, snapshot):
+        """(Re)loads static specs and latest metrics from a get_fleet_snapshot() result."""
+        columns = (snapshot["gpu_id"], snapshot["cluster_name"], snapshot["vendor"], snapshot["memory_total_gb"],
+                   snapshot["utilization"], snapshot["memory_used_gb"], snapshot["timestamp"])
+        with self._lock:
+            for gpu_id, cluster, vendor, memory_total, utilization, memory_used, timestamp in zip(*(c.tolist() for c in columns)):
+                self._remove(gpu_id)
+                self._gpus[gpu_id] = [cluster, vendor, memory_total, utilization, memory_used, timestamp, None]
+                self._place(gpu_id)
+
+    def update(self, records):
+        """
+        Applies committed (gpu_id, utilization, memory_used_gb, temperature, power_watts, timestamp)
+        rows. Rows older than what the index holds and GPUs it does not know are skipped.
+        """
+        with self._lock:
+            for gpu_id, utilization, memory_used, _, _, timestamp in records:
+                entry = self._gpus.get(gpu_id)
+                if entry is None or (entry[5] is not None and timestamp < entry[5]):
+                    continue
+                entry[3], entry[4], entry[5] = utilization, memory_used, timestamp
+                self._place(gpu_id)
+                self.updates += 1
+
+    def reserve(self, gpu_id, memory_gb, utilization):
+        """Books a placement so later lookups see the load before the GPU reports it."""
+        with self._lock:
+            entry = self._gpus.get(gpu_id)
+            if entry is not None:
+                entry[3] += utilization
+                entry[4] += memory_gb
+                self._place(gpu_id)
+
+    def candidates(self, memory_gb, utilization=0.0, cluster=None, vendor=None,
+                   max_utilization=MAX_UTILIZATION, limit=DEFAULT_CANDIDATE_LIMIT):
+        """Up to `limit` GPUs with memory_gb free and room for `utilization` more load, least loaded first."""
+        utilization_limit = max_utilization - utilization
+        if utilization_limit < 0:
+            return []
+        min_bucket = memory_bucket(memory_gb)
+        max_band = utilization_band(utilization_limit)
+        found = []
+        with self._lock:
+            for band in range(max_band + 1):
+                for bucket in range(len(FREE_MEMORY_BUCKETS_GB) - 1, min_bucket - 1, -1):
+                    cell = self._cells.get((bucket, band))
+                    if not cell:
+                        continue
+                    # Only boundary cells can hold GPUs that do not actually fit.
+                    exact = bucket == min_bucket or band == max_band
+                    by_cluster = cell.values() if cluster is None else [cell.get(cluster, {})]
+                    for by_vendor in by_cluster:
+                        gpu_sets = by_vendor.values() if vendor is None else [by_vendor.get(vendor, ())]
+                        for gpu_set in gpu_sets:
+                            for gpu_id in gpu_set:
+                                if exact:
+                                    entry = self._gpus[gpu_id]
+                                    if entry[2] - entry[4] < memory_gb or entry[3] > utilization_limit:
+                                        continue
+                                found.append(gpu_id)
+                                if len(found) >= limit:
+                                    return found
+        return found
+
+    def above(self, utilization):
+        """GPUs whose utilization is over `utilization`."""
+        first_band = utilization_band(utilization)
+        with self._lock:
+            return [
+                gpu_id
+                for (_, band), cell in self._cells.items() if band >= first_band
+                for by_vendor in cell.values()
+                for gpu_set in by_vendor.values()
+                for gpu_id in gpu_set
+                if self._gpus[gpu_id][3] > utilization
+            ]
+
+    def gpu(self, gpu_id):
+        with self._lock:
+            entry = self._gpus.get(gpu_id)
+            if entry is None:
+                return None
+            return {"cluster": entry[0], "vendor": entry[1], "memory_total_gb": entry[2],
+                    "utilization": entry[3], "memory_used_gb": entry[4]}
+
+    def state(self, gpu_ids):
+        """(utilization, memory_used_gb, memory_total_gb) arrays for the given GPUs, in order."""
+        with self._lock:
+            rows = [self._gpus[gpu_id] for gpu_id in gpu_ids]
+        return (np.array([row[3] for row in rows], dtype=np.float64),
+                np.array([row[4] for row in rows], dtype=np.float64),
+                np.array([row[2] for row in rows], dtype=np.float64))
@@ -1,3 +1,8 @@
+import argparse
+import copy
+import os
+import threading
+import numpy as np
 import torch
 import torch.nn as nn
 
@@ -21,24 +26,103 @@ class NNPredictor(nn.Module):
     def forward(self,x):
         return self.model(x)
 
-_predicctor = None
+MODEL_PATH = "ai_model/nnp_model.pth"
+# Frozen TorchScript export of MODEL_PATH (int8 when nnp_train --quantize validated it); preferred when present.
+SCRIPTED_MODEL_PATH = "ai_model/nnp_model.ts"
+# Intra-op threads for CPU inference. Small MLP batches stop scaling after a few cores,
+# and the scheduler shares its node with other control-plane work.
+INFERENCE_THREADS = int(os.environ.get("NNP_NUM_THREADS", min(4, os.cpu_count() or 1)))
+# Rows per forward pass when scoring a fleet; bounds the activation memory (~chunk x 128 floats per layer).
+SCORE_CHUNK_SIZE = 65536
 
-def load_predictor(model_path="ai_model/nnp_model.pth"):
+_predictor = None
+_predictor_lock = threading.Lock()
+
+
+def load_weights(model, model_path=MODEL_PATH):
+    """Loads a state_dict saved by nnp_train into model."""
+    try:
+        state = torch.load(model_path, map_location=torch.device('cpu'), weights_only=True)
+    except Exception as e:
+        # Older nnp_train runs pickled the whole module, which only unpickles inside nnp_train itself.
+        raise RuntimeError(f"{model_path} is not a state_dict; run nnp_train.py once to convert it") from e
+    model.load_state_dict(state)
+    return model.eval()
+
+
+def export_predictor(model, path=SCRIPTED_MODEL_PATH, quantize=False):
+    """
+    Writes a frozen TorchScript artifact for CPU inference. With quantize, the
+    Linear layers are dynamically quantized to int8 first (weights stored as int8,
+    activations quantized per batch), which cuts inference time and model size.
+    """
+    model = copy.deepcopy(model).eval()
+    if quantize:
+        model = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+    frozen = torch.jit.freeze(torch.jit.script(model))
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    torch.jit.save(frozen, path)
+    print(f"Exported {'int8 ' if quantize else ''}TorchScript predictor to {path}")
+    return path
+
+
+def load_predictor(model_path=None):
+    """
+    Returns the process-wide predictor, loading it on first use. The TorchScript
+    artifact is preferred; the eager state_dict is the fallback. model_path
+    overrides the choice (a .ts/.pt file is loaded as TorchScript).
+    """
     global _predictor
-    if _predictor is None:
-        _predictor = NNPredictor()
-        _predictor.load_state_dict(torch.load(model_path, map_location=torch.device('cpu')))
-        _predictor.eval()
+    if _predictor is not None:
+        return _predictor
+    with _predictor_lock:
+        if _predictor is None:
+            torch.set_num_threads(INFERENCE_THREADS)
+            path = model_path or (SCRIPTED_MODEL_PATH if os.path.exists(SCRIPTED_MODEL_PATH) else MODEL_PATH)
+            if path.endswith((".ts", ".pt")):
+                _predictor = torch.jit.load(path, map_location=torch.device('cpu')).eval()
+            else:
+                _predictor = load_weights(NNPredictor(), path)
+            print(f"Loaded NNP predictor from {path} ({INFERENCE_THREADS} threads).")
     return _predictor
 
-def predict_best_gpu(task, gpu_features):
-    model = load_predictor()
-    best_score = float('inf')
-    best_gpu = None
-    for gpu_id, features in gpu_features.items():
-        x = torch.tensor(features, dtype=torch.float32).unsqueeze(0)
-        score = model(x).item()
-        if score < best_score:
-            best_score = score
-            best_gpu = gpu_id
-    return best_gpu
\ No newline at end of file
+
+def score_gpus(features, model=None, chunk_size=SCORE_CHUNK_SIZE):
+    """Scores an (N, input_dim) feature matrix in chunked inference-mode passes. Returns N suitability scores."""
+    if model is None:
+        model = load_predictor()
+    features = torch.as_tensor(np.asarray(features, dtype=np.float32))
+    with torch.inference_mode():
+        scores = torch.empty(features.shape[0])
+        for start in range(0, features.shape[0], chunk_size):
+            scores[start:start + chunk_size] = model(features[start:start + chunk_size]).squeeze(-1)
+    return scores
+
+def predict_top_gpus(gpu_ids, features, k=1, model=None, chunk_size=SCORE_CHUNK_SIZE):
+    """
+    Scores every candidate in one batched pass and returns the k best as
+    [(gpu_id, score), ...], best first. The model predicts suitability
+    (trained on 100 - utilization), so a higher score is better.
+    """
+    if len(gpu_ids) == 0:
+        return []
+    scores = score_gpus(features, model=model, chunk_size=chunk_size)
+    top = torch.topk(scores, min(k, len(gpu_ids)))
+    return [(gpu_ids[i], score) for score, i in zip(top.values.tolist(), top.indices.tolist())]
+
+def predict_best_gpu(task, gpu_features, model=None):
+    if not gpu_features:
+        return None
+    gpu_ids = list(gpu_features)
+    best = predict_top_gpus(gpu_ids, [gpu_features[gpu_id] for gpu_id in gpu_ids], k=1, model=model)
+    return best[0][0]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the trained NNP to a frozen TorchScript artifact")
+    parser.add_argument("--weights", default=MODEL_PATH)
+    parser.add_argument("--output", default=SCRIPTED_MODEL_PATH)
+    parser.add_argument("--quantize", action="store_true",
+                        help="Quantize Linear layers to int8 (unvalidated; nnp_train --quantize checks accuracy first)")
+    args = parser.parse_args()
+    export_predictor(load_weights(NNPredictor(), args.weights), args.output, quantize=args.quantize)
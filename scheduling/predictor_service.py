@@ -0,0 +1,161 @@
+import collections
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+from scheduling.nnp_predictor import SCORE_CHUNK_SIZE, load_predictor, score_gpus
+
+# How long the first request of a batch waits for others to join it (seconds).
+DEFAULT_MAX_WAIT = 0.002
+# A batch is dispatched as soon as it holds this many feature rows.
+DEFAULT_MAX_BATCH_ROWS = SCORE_CHUNK_SIZE
+
+
+def model_input_dim(model):
+    """in_features of the model's first layer, or None when it cannot be read (e.g. a frozen TorchScript graph)."""
+    if model is None or not hasattr(model, "modules"):
+        return None
+    for module in model.modules():
+        in_features = getattr(module, "in_features", None)
+        if isinstance(in_features, int):
+            return in_features
+    return None
+
+
+class PredictorService:
+    """
+    Shares one NNP across threads by micro-batching.
+
+    Callers submit() feature matrices from any thread and get a Future of their
+    scores. A single worker thread takes the first waiting request, lets others
+    join for up to max_wait seconds (or until max_batch_rows rows are queued),
+    scores the concatenation in one forward pass and hands each caller its
+    slice. Under bursty load many small calls become a few large passes; an idle
+    service sleeps. score() has the score_fn signature the assignment code takes.
+
+    The feature width is input_dim, else read from the model, else fixed by the
+    first submission; matrices of any other shape are rejected in submit().
+    """
+    def __init__(self, model=None, max_wait=DEFAULT_MAX_WAIT, max_batch_rows=DEFAULT_MAX_BATCH_ROWS, input_dim=None):
+        self.model = model
+        self.input_dim = input_dim or model_input_dim(model)
+        self.max_wait = max_wait
+        self.max_batch_rows = max_batch_rows
+        self._queue = collections.deque()
+        self._queued_rows = 0
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread = None
+        self.requests = 0
+        self.batches = 0
+        self.rows = 0
+        self.busy_seconds = 0.0
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="predictor-service", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is None:
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._thread = None
+
+    def submit(self, features):
+        """Queues an (N, input_dim) feature matrix; the Future resolves to N float32 scores."""
+        features = np.asarray(features, dtype=np.float32)
+        if features.ndim != 2:
+            raise ValueError(f"features must be an (N, input_dim) matrix, got shape {features.shape}")
+        future = Future()
+        if len(features) == 0:
+            future.set_result(np.empty(0, dtype=np.float32))
+            return future
+        with self._cond:
+            if self._stopping or self._thread is None:
+                raise RuntimeError("PredictorService is not running")
+            if self.input_dim is None:
+                self.input_dim = features.shape[1]
+            elif features.shape[1] != self.input_dim:
+                raise ValueError(f"features have {features.shape[1]} columns, the model takes {self.input_dim}")
+            self._queue.append((features, future))
+            self._queued_rows += len(features)
+            self.requests += 1
+            self._cond.notify_all()
+        return future
+
+    def score(self, features, timeout=None):
+        return self.submit(features).result(timeout)
+
+    def top_gpus(self, gpu_ids, features, k=1, timeout=None):
+        """[(gpu_id, score), ...] for the k best candidates, best first."""
+        scores = self.score(features, timeout)
+        k = min(k, len(scores))
+        if k == 0:
+            return []
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(gpu_ids[i], float(scores[i])) for i in best]
+
+    def stats(self):
+        with self._cond:
+            queued = len(self._queue)
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "rows": self.rows,
+            "queued_requests": queued,
+            "avg_requests_per_batch": round(self.requests / self.batches, 2) if self.batches else 0.0,
+            "busy_seconds": round(self.busy_seconds, 3),
+        }
+
+    def _next_batch(self):
+        with self._cond:
+            self._cond.wait_for(lambda: self._queue or self._stopping)
+            if not self._queue:
+                return None
+            deadline = time.monotonic() + self.max_wait
+            while self._queued_rows < self.max_batch_rows and not self._stopping:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch, rows = [], 0
+            while self._queue and (not batch or rows + len(self._queue[0][0]) <= self.max_batch_rows):
+                features, future = self._queue.popleft()
+                batch.append((features, future))
+                rows += len(features)
+            self._queued_rows -= rows
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                break
+            live = [(features, future) for features, future in batch if future.set_running_or_notify_cancel()]
+            if not live:
+                continue
+            start = time.perf_counter()
+            try:
+                if self.model is None:
+                    self.model = load_predictor()
+                scores = score_gpus(np.concatenate([features for features, _ in live]), model=self.model).numpy()
+            except Exception as e:
+                print(f"Error scoring predictor batch: {e}")
+                for _, future in live:
+                    future.set_exception(e)
+                continue
+            offset = 0
+            for features, future in live:
+                future.set_result(scores[offset:offset + len(features)])
+                offset += len(features)
+            self.busy_seconds += time.perf_counter() - start
+            self.batches += 1
+            self.rows += offset
@@ -0,0 +1,168 @@
+import threading
+import time
+from sqlite3 import Error
+from config import DB_PATH
+from db.database import DatabaseManager
+
+# A GPU counts as hot above OVERLOAD_UTILIZATION and as recovered again below
+# RECOVERED_UTILIZATION; in between it keeps its count (hysteresis).
+OVERLOAD_UTILIZATION = 80.0
+RECOVERED_UTILIZATION = 70.0
+# Consecutive hot ticks before load is moved off a GPU.
+SUSTAINED_TICKS = 3
+# Ticks a GPU is left alone after a move, so the move can show up in its metrics.
+COOLDOWN_TICKS = 5
+# Destination candidates considered per task.
+DESTINATION_CANDIDATES = 8
+# A placement nobody reports as completed is dropped after this many seconds.
+PLACEMENT_TTL_SECONDS = 6 * 3600
+
+
+class Rebalancer:
+    """
+    Moves tasks off GPUs that stay overloaded.
+
+    The scheduler reports every placement with track() and every finished task
+    with forget(); placements never forgotten expire after `placement_ttl`
+    seconds, so finished tasks are not moved around forever. observe() is called once
+    per metrics tick with the scheduler's CapacityIndex: a GPU that has been over
+    `overload` for `sustained_ticks` ticks in a row (and has not dropped below
+    `recovered` in between) gets just enough of its tracked tasks moved to bring
+    it down to `recovered` - one task if a single one covers the excess,
+    otherwise the largest first. Destinations are the least loaded GPUs in the
+    same cluster that stay under `recovered` after the move. Every move is
+    booked in the index and written to task_migrations.
+    """
+    def __init__(self, db_path=DB_PATH, overload=OVERLOAD_UTILIZATION, recovered=RECOVERED_UTILIZATION,
+                 sustained_ticks=SUSTAINED_TICKS, cooldown_ticks=COOLDOWN_TICKS, placement_ttl=PLACEMENT_TTL_SECONDS):
+        self.db_path = db_path
+        self.overload = overload
+        self.recovered = recovered
+        self.sustained_ticks = sustained_ticks
+        self.cooldown_ticks = cooldown_ticks
+        self.placement_ttl = placement_ttl
+        self._lock = threading.Lock()
+        self._placements = {}   # task_id -> [gpu_id, memory_gb, utilization, tracked_at], oldest first
+        self._by_gpu = {}       # gpu_id -> {task_id}
+        self._hot_ticks = {}    # gpu_id -> consecutive hot ticks
+        self._cooldown_until = {}
+        self.ticks = 0
+        self.migrations = 0
+        self.expired = 0
+        self.db = None
+
+    def track(self, task_id, gpu_id, memory_gb, utilization):
+        with self._lock:
+            self._forget(task_id)
+            self._placements[task_id] = [gpu_id, memory_gb, utilization, time.monotonic()]
+            self._by_gpu.setdefault(gpu_id, set()).add(task_id)
+
+    def forget(self, task_id):
+        """Stops tracking a finished task. Returns False if it was not tracked."""
+        with self._lock:
+            return self._forget(task_id) is not None
+
+    def _forget(self, task_id):
+        placement = self._placements.pop(task_id, None)
+        if placement is not None:
+            self._by_gpu[placement[0]].discard(task_id)
+        return placement
+
+    def _expire(self):
+        # Placements are kept in tracking order, so the expired ones are a prefix.
+        cutoff = time.monotonic() - self.placement_ttl
+        while self._placements:
+            task_id, placement = next(iter(self._placements.items()))
+            if placement[3] > cutoff:
+                break
+            self._forget(task_id)
+            self.expired += 1
+
+    def tracked_count(self):
+        """Placements still live (not forgotten and not expired)."""
+        with self._lock:
+            self._expire()
+            return len(self._placements)
+
+    def placements(self):
+        with self._lock:
+            return {task_id: placement[0] for task_id, placement in self._placements.items()}
+
+    def observe(self, index):
+        """Advances one tick. Returns the migrations made as (task_id, from_gpu, to_gpu, cluster, task_util, task_mem, source_util)."""
+        self.ticks += 1
+        hot = set(index.above(self.overload))
+        for gpu_id in hot:
+            self._hot_ticks[gpu_id] = self._hot_ticks.get(gpu_id, 0) + 1
+        cooling = [gpu_id for gpu_id in self._hot_ticks if gpu_id not in hot]
+        if cooling:
+            utilization, _, _ = index.state(cooling)
+            for gpu_id, util in zip(cooling, utilization.tolist()):
+                if util < self.recovered:
+                    del self._hot_ticks[gpu_id]
+        moves = []
+        with self._lock:
+            self._expire()
+            for gpu_id, count in list(self._hot_ticks.items()):
+                if count < self.sustained_ticks or self._cooldown_until.get(gpu_id, 0) > self.ticks:
+                    continue
+                gpu_moves = self._relieve(index, gpu_id)
+                if gpu_moves:
+                    self._hot_ticks[gpu_id] = 0
+                    self._cooldown_until[gpu_id] = self.ticks + self.cooldown_ticks
+                    moves.extend(gpu_moves)
+        if moves:
+            self._record(moves)
+        return moves
+
+    def _relieve(self, index, gpu_id):
+        source = index.gpu(gpu_id)
+        if source is None:
+            return []
+        excess = source["utilization"] - self.recovered
+        tasks = sorted(self._by_gpu.get(gpu_id, ()), key=lambda task_id: self._placements[task_id][2])
+        # One move if any single task covers the excess, otherwise biggest first.
+        single = [task_id for task_id in tasks if self._placements[task_id][2] >= excess]
+        order = single[:1] or tasks[::-1]
+        moves = []
+        for task_id in order:
+            if excess <= 0:
+                break
+            placement = self._placements[task_id]
+            _, memory_gb, utilization, _ = placement
+            destinations = [candidate for candidate in index.candidates(
+                memory_gb, utilization, cluster=source["cluster"], max_utilization=self.recovered,
+                limit=DESTINATION_CANDIDATES) if candidate != gpu_id]
+            if not destinations:
+                continue
+            target = destinations[0]
+            index.reserve(target, memory_gb, utilization)
+            index.reserve(gpu_id, -memory_gb, -utilization)
+            # Moved in place: the placement keeps its tracking time and position.
+            self._by_gpu[gpu_id].discard(task_id)
+            placement[0] = target
+            self._by_gpu.setdefault(target, set()).add(task_id)
+            moves.append((task_id, gpu_id, target, source["cluster"], utilization, memory_gb, source["utilization"]))
+            excess -= utilization
+        return moves
+
+    def _record(self, moves):
+        if self.db is None:
+            self.db = DatabaseManager(db_path=self.db_path)
+            self.db.connect()
+        try:
+            self.db.conn.executemany("""
+                INSERT INTO task_migrations
+                    (task_id, from_gpu_id, to_gpu_id, cluster_name, task_utilization, task_memory_gb, source_utilization)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, [(str(move[0]),) + move[1:] for move in moves])
+            self.db.conn.commit()
+            self.migrations += len(moves)
+        except Error as e:
+            self.db.conn.rollback()
+            print(f"Error recording task migrations: {e}")
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
@@ -1,76 +1,324 @@
 import time
-import random
 import threading
+from concurrent.futures import Future
 from queue import Queue
+import numpy as np
+from config import DB_PATH
 from db.database import DatabaseManager
-from scheduling.nnp_predictor import predict_best_gpu
-
-def predict_best_gpu(task, gpu_states):
-    best_gpu = None
-    best_util = 100.0
-    for state in gpu_states:
-        dynamic = state.get("dynamic")
-        if dynamic:
-            util = dynamic[2] 
-            if util < best_util:
-                best_util = util
-                best_gpu = state["static"][0]
-    return best_gpu
-
-
-def scheduler_loop(scheduler_interval=30, task_queue=None):
+from scheduling.assignment import assign_tasks_indexed, task_demand, task_id, task_placement
+from scheduling.capacity_index import CapacityIndex
+from scheduling.rebalancer import Rebalancer
+
+# With a live ingestion feed the index is resynced from a full snapshot every this many ticks (new GPUs, drift).
+SNAPSHOT_RESYNC_TICKS = 10
+# Events landing within this many seconds of the first one are handled in a single pass.
+DEFAULT_COALESCE_SECONDS = 0.005
+# Without an in-process ingestion feed, the ingest generation is polled this often while tasks wait.
+DEFAULT_POLL_INTERVAL = 1.0
+# Full snapshot reload (picks up new GPUs and drops stale reservations) at least this often.
+DEFAULT_RESYNC_SECONDS = 300
+
+def drain_queue(task_queue):
+    tasks = []
+    while not task_queue.empty():
+        tasks.append(task_queue.get())
+    return tasks
+
+
+def scheduler_loop(scheduler_interval=30, task_queue=None, batch=True, ingestion=None, rebalance=True,
+                   done_queue=None):
+    """
+    Places queued tasks every scheduler_interval seconds. Candidate GPUs come from a
+    CapacityIndex; pass the running IngestionService to keep it current between
+    snapshots, otherwise it is reloaded from one snapshot query per tick. With
+    rebalance on, tasks on GPUs that stay overloaded are moved within their cluster;
+    put the ids of finished tasks on done_queue so they are no longer moved.
+    """
     db = DatabaseManager()
     db.connect()
+    index = CapacityIndex()
+    rebalancer = Rebalancer() if rebalance else None
+    if ingestion is not None:
+        ingestion.add_commit_listener(index.update)
+    ticks = 0
     try:
         while True:
-            cursor = db.conn.cursor()
-            gpu_ids = [row[0] for row in cursor.execute("SELECT id FROM gpu_static").fetchall()]
-            gpu_features = {}
-            for gpu_id in gpu_ids:
-                state = db.get_gpu_state(gpu_id)
-                if state["static"] is not None and state["dynamic"] is not None:
-                    static = state["static"]
-                    dynamic = state["dynamic"]
-                    total_memory = static[2] 
-                    utilization = dynamic[2]  
-                    memory_used = dynamic[3]  
-                    temperature = dynamic[4]  
-                    power_w = dynamic[5]      
-                    features = [
-                        utilization / 100.0, 
-                        memory_used / total_memory if total_memory > 0 else 0,  
-                        temperature / 100.0,
-                        power_w / 400.0                                  
-                    ]
-                    while len(features) < 10:
-                        features.append(0.0)
-                    gpu_features[gpu_id] = features
-            if task_queue is not None:
+            if ingestion is None or ticks % SNAPSHOT_RESYNC_TICKS == 0:
+                index.load_snapshot(db.get_fleet_snapshot())
+            ticks += 1
+            if done_queue is not None:
+                for finished in drain_queue(done_queue):
+                    if rebalancer is not None:
+                        rebalancer.forget(finished)
+            if task_queue is not None and batch:
+                tasks = drain_queue(task_queue)
+                if tasks:
+                    assignments, unassigned = assign_tasks_indexed(tasks, index)
+                    for task, gpu_id, score in assignments:
+                        if rebalancer is not None:
+                            rebalancer.track(task_id(task), gpu_id, *task_demand(task))
+                        print(f"Task {task_id(task)} assigned to GPU {gpu_id} (score {score:.2f}).")
+                    if unassigned:
+                        # No GPU has headroom left this tick; retry on the next snapshot.
+                        for task in unassigned:
+                            task_queue.put(task)
+                        print(f"{len(unassigned)} tasks could not be placed and were requeued.")
+            elif task_queue is not None:
+                from scheduling.nnp_predictor import predict_top_gpus
                 while not task_queue.empty():
                     task = task_queue.get()
-                    best_gpu = predict_best_gpu(task, gpu_features)
-                    if best_gpu is None and gpu_ids:
-                        best_gpu = random.choice(gpu_ids)
-                    print(f"Task {task} assigned to GPU {best_gpu} based on NNP prediction.")
+                    memory_gb, utilization = task_demand(task)
+                    cluster, vendor = task_placement(task)
+                    candidate_ids = index.candidates(memory_gb, utilization, cluster=cluster, vendor=vendor)
+                    candidate_util, candidate_mem, _ = index.state(candidate_ids)
+                    best = predict_top_gpus(candidate_ids, np.column_stack([candidate_util, candidate_mem]), k=1)
+                    best_gpu = best[0][0] if best else None
+                    if best_gpu is None:
+                        task_queue.put(task)
+                        print(f"No GPU can fit task {task_id(task)} right now; requeued.")
+                        break
+                    index.reserve(best_gpu, memory_gb, utilization)
+                    if rebalancer is not None:
+                        rebalancer.track(task_id(task), best_gpu, memory_gb, utilization)
+                    print(f"Task {task_id(task)} assigned to GPU {best_gpu} based on NNP prediction.")
             else:
                 print("No task queue provided. Scheduler running without tasks.")
             
-            threshold = 80
-            for gpu_id, features in gpu_features.items():
-                util_percent = features[0] * 100
-                if util_percent > threshold:
-                    print(f"GPU {gpu_id} is overloaded (utilization {util_percent}%). Triggering reassignment...")
+            if rebalancer is not None:
+                for move in rebalancer.observe(index):
+                    print(f"GPU {move[1]} stayed overloaded (utilization {move[6]:.1f}%). Moved task {move[0]} to GPU {move[2]}.")
             
             time.sleep(scheduler_interval)
     except KeyboardInterrupt:
         print("Scheduler loop interrupted.")
     finally:
+        if ingestion is not None:
+            ingestion.remove_commit_listener(index.update)
+        if rebalancer is not None:
+            rebalancer.close()
         db.close()
 
-def start_scheduler():
+class EventDrivenScheduler:
+    """
+    Places tasks as soon as they arrive instead of on a fixed interval.
+
+    submit() returns a Future that resolves to (gpu_id, score) once the task is
+    placed. A single scheduler thread sleeps on a condition variable and wakes
+    when tasks are submitted or, while some task is still waiting for room, when
+    new metrics are committed. Events that land within coalesce_seconds of each
+    other are handled in one batched pass through the capacity index, so a burst
+    of submissions costs one matcher run and an idle scheduler costs nothing.
+
+    Pass the running IngestionService to follow metrics as they are committed;
+    without it the ingest generation is polled while tasks are waiting and the
+    index is reloaded from a fleet snapshot when it moves. With rebalance on,
+    every metrics tick also goes through a Rebalancer that moves tasks off GPUs
+    that stay overloaded; report finished tasks with complete() so they are no
+    longer moved and, once none are left, metrics stop waking the scheduler.
+    """
+    def __init__(self, db_path=DB_PATH, ingestion=None, coalesce_seconds=DEFAULT_COALESCE_SECONDS,
+                 poll_interval=DEFAULT_POLL_INTERVAL, resync_seconds=DEFAULT_RESYNC_SECONDS, rebalance=True,
+                 score_fn=None):
+        self.db_path = db_path
+        self.ingestion = ingestion
+        self.coalesce_seconds = coalesce_seconds
+        self.poll_interval = poll_interval
+        self.resync_seconds = resync_seconds
+        self.index = CapacityIndex()
+        self.rebalancer = Rebalancer(db_path=db_path) if rebalance else None
+        self.score_fn = score_fn
+        self._cond = threading.Condition()
+        self._arrivals = []     # (request, task, future, submitted_at) not yet tried
+        self._waiting = []      # tried, but nothing fit; retried when metrics move
+        self._metrics_changed = False
+        self._stopping = False
+        self._thread = None
+        self._generation = None
+        self._last_resync = None
+        self.placed = 0
+        self.passes = 0
+        self.total_latency = 0.0
+        self.last_pass_seconds = 0.0
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        self._stopping = False
+        if self.ingestion is not None:
+            self.ingestion.add_commit_listener(self._on_commit)
+        self._thread = threading.Thread(target=self._run, name="event-scheduler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is None:
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._thread = None
+        if self.ingestion is not None:
+            self.ingestion.remove_commit_listener(self._on_commit)
+
+    def submit(self, task):
+        """Queues a task (plain id or dict with memory_gb, utilization, cluster, vendor); returns a Future."""
+        memory_gb, utilization = task_demand(task)
+        cluster, vendor = task_placement(task)
+        # A fresh dict per submission, so identical task ids still map back to their own Future.
+        request = {"task_id": task_id(task), "memory_gb": memory_gb, "utilization": utilization,
+                   "cluster": cluster, "vendor": vendor}
+        future = Future()
+        with self._cond:
+            if self._stopping:
+                raise RuntimeError("EventDrivenScheduler is stopped")
+            self._arrivals.append((request, task, future, time.perf_counter()))
+            self._cond.notify_all()
+        return future
+
+    def complete(self, task_id):
+        """Marks a placed task as finished. Returns False if it was not being tracked."""
+        if self.rebalancer is None:
+            return False
+        return self.rebalancer.forget(task_id)
+
+    def stats(self):
+        with self._cond:
+            waiting = len(self._waiting) + len(self._arrivals)
+        return {
+            "placed": self.placed,
+            "waiting": waiting,
+            "passes": self.passes,
+            "avg_placement_ms": round(self.total_latency / self.placed * 1000, 3) if self.placed else 0.0,
+            "last_pass_ms": round(self.last_pass_seconds * 1000, 3),
+        }
+
+    def _on_commit(self, rows):
+        self.index.update(rows)
+        with self._cond:
+            self._metrics_changed = True
+            if self._watch_metrics():
+                self._cond.notify_all()
+
+    def _watch_metrics(self):
+        """Metrics only matter while a task waits for room or the rebalancer has live placements to look after."""
+        return bool(self._waiting) or (self.rebalancer is not None and self.rebalancer.tracked_count() > 0)
+
+    def _has_work(self):
+        return self._stopping or self._arrivals or (self._metrics_changed and self._watch_metrics())
+
+    def _refresh(self, db):
+        now = time.monotonic()
+        if self._last_resync is None or now - self._last_resync >= self.resync_seconds:
+            self.index.load_snapshot(db.get_fleet_snapshot())
+            self._generation = db.get_ingest_generation()
+            self._last_resync = now
+        elif self.ingestion is None:
+            generation = db.get_ingest_generation()
+            if generation != self._generation:
+                self.index.load_snapshot(db.get_fleet_snapshot())
+                self._generation = generation
+                with self._cond:
+                    self._metrics_changed = True
+
+    def _run(self):
+        db = DatabaseManager(db_path=self.db_path)
+        db.connect()
+        try:
+            while True:
+                with self._cond:
+                    # Only wake on a timer when metrics matter and nobody pushes them to us.
+                    timeout = self.poll_interval if (self.ingestion is None and self._watch_metrics()) else None
+                    self._cond.wait_for(self._has_work, timeout=timeout)
+                    if self._stopping:
+                        break
+                if self.coalesce_seconds:
+                    time.sleep(self.coalesce_seconds)
+                try:
+                    self._refresh(db)
+                    refresh_error = None
+                except Exception as e:
+                    print(f"Error refreshing the capacity index: {e}")
+                    refresh_error = e
+                with self._cond:
+                    requests = self._arrivals
+                    self._arrivals = []
+                    metrics_changed = self._metrics_changed
+                    if metrics_changed or refresh_error is not None:
+                        requests = self._waiting + requests
+                        self._waiting = []
+                        self._metrics_changed = False
+                if refresh_error is not None:
+                    # Without a current index nothing can be placed; let callers see why.
+                    self._fail(requests, refresh_error)
+                    continue
+                if requests:
+                    try:
+                        self._place(requests)
+                    except Exception as e:
+                        print(f"Error placing tasks: {e}")
+                        self._fail(requests, e)
+                if metrics_changed and self.rebalancer is not None:
+                    try:
+                        for move in self.rebalancer.observe(self.index):
+                            print(f"GPU {move[1]} stayed overloaded (utilization {move[6]:.1f}%). Moved task {move[0]} to GPU {move[2]}.")
+                    except Exception as e:
+                        print(f"Error rebalancing: {e}")
+        finally:
+            if self.rebalancer is not None:
+                self.rebalancer.close()
+            db.close()
+            with self._cond:
+                # Also reached if the thread dies: later submit() calls raise instead of queueing forever.
+                self._stopping = True
+                pending = self._arrivals + self._waiting
+                self._arrivals = []
+                self._waiting = []
+            self._fail(pending, RuntimeError("EventDrivenScheduler stopped before the task was placed"))
+
+    def _fail(self, entries, error):
+        for _, _, future, _ in entries:
+            if not future.done():
+                future.set_exception(error)
+
+    def _place(self, requests):
+        start = time.perf_counter()
+        # Futures start running on their first pass; cancelled (or already failed) ones are dropped.
+        live = [entry for entry in requests
+                if not entry[2].done() and (entry[2].running() or entry[2].set_running_or_notify_cancel())]
+        by_request = {id(entry[0]): entry for entry in live}
+        try:
+            assignments, unassigned = assign_tasks_indexed([entry[0] for entry in live], self.index,
+                                                             score_fn=self.score_fn)
+        except Exception as e:
+            print(f"Error placing tasks: {e}")
+            self._fail(live, e)
+            return
+        now = time.perf_counter()
+        for request, gpu_id, score in assignments:
+            _, task, future, submitted_at = by_request[id(request)]
+            self.placed += 1
+            self.total_latency += now - submitted_at
+            future.set_result((gpu_id, score))
+            if self.rebalancer is not None:
+                self.rebalancer.track(request["task_id"], gpu_id, request["memory_gb"], request["utilization"])
+            print(f"Task {task_id(task)} assigned to GPU {gpu_id} (score {score:.2f}).")
+        if unassigned:
+            with self._cond:
+                self._waiting.extend(by_request[id(request)] for request in unassigned)
+        self.passes += 1
+        self.last_pass_seconds = time.perf_counter() - start
+
+
+def start_scheduler(event_driven=True, ingestion=None):
+    if event_driven:
+        scheduler = EventDrivenScheduler(ingestion=ingestion).start()
+        for i in range(1, 101):
+            scheduler.submit(f"TASK_{i}")
+        return scheduler
     task_queue = Queue()
     for i in range(1,101):
         task_queue.put(f"TASK_{i}")
-        scheduler_thread = threading.Thread(target=scheduler_loop, args=(30, task_queue))
-        scheduler_thread.start()
-        return scheduler_thread
\ No newline at end of file
+    scheduler_thread = threading.Thread(target=scheduler_loop, args=(30, task_queue), kwargs={"ingestion": ingestion})
+    scheduler_thread.start()
+    return scheduler_thread
@@ -0,0 +1,38 @@
+import os
+import sys
+import types
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import config  # noqa: F401
+except ImportError:
+    # config.py holds machine-local settings and is not committed; tests pass their own paths.
+    config = types.ModuleType("config")
+    config.DB_PATH = "gpu_dashboard_test.db"
+    config.MONITOR_INTERVAL = 5
+    config.NUM_WORKERS = 1
+    config.SIMULATION_OUTPUT_DIR = "data/simulation"
+    sys.modules["config"] = config
+
+from db.database import DatabaseManager  # noqa: E402
+
+
+@pytest.fixture
+def fleet_db(tmp_path):
+    """A migrated database with 8 GPUs in one rack, each with one metrics sample."""
+    db_path = str(tmp_path / "fleet.db")
+    db = DatabaseManager(db_path=db_path)
+    db.connect()
+    db.create_tables()
+    db.insert_cluster("cluster-a")
+    db.insert_rack("rack-1", "cluster-a")
+    records = []
+    for i in range(8):
+        gpu_id = f"GPU_{i}"
+        db.insert_gpu(gpu_id, "rack-1", "NVIDIA", "A100", 80, 312.0, 2039)
+        records.append((gpu_id, 10.0 * i, 8.0, 50.0, 200.0, "2026-01-01 00:00:00"))
+    db.insert_gpu_metrics_batch(records)
+    db.close()
+    return db_path
@@ -0,0 +1,37 @@
+import pytest
+
+pytest.importorskip("fastapi")
+import api.api as api  # noqa: E402
+from db.database import ConnectionPool  # noqa: E402
+
+
+class PoolCheckingService:
+    """Stands in for the predictor: fails if /predict still holds the pool's only connection."""
+    def __init__(self, pool):
+        self.pool = pool
+
+    def top_gpus(self, gpu_ids, features, k=1, timeout=None):
+        with self.pool.connection():
+            pass
+        ranked = sorted(zip(gpu_ids, (100 - row[0] for row in features)), key=lambda item: -item[1])
+        return ranked[:k]
+
+
+@pytest.fixture
+def single_connection_pool(fleet_db, monkeypatch):
+    pool = ConnectionPool(db_path=fleet_db, size=1, timeout=0.1)
+    monkeypatch.setattr(api, "db_pool", pool)
+    monkeypatch.setattr(api, "predictor_service", PoolCheckingService(pool))
+    yield pool
+    pool.close()
+
+
+def test_predict_by_gpu_ids_releases_the_connection_before_scoring(single_connection_pool):
+    result = api.predict(api.PredictRequest(gpu_ids=["GPU_3", "GPU_1", "missing"], k=1))
+    assert result == {"candidates": [{"gpu_id": "GPU_1", "score": 90.0}]}
+
+
+def test_predict_with_explicit_states(single_connection_pool):
+    body = api.PredictRequest(gpus=[{"gpu_id": "x", "utilization": 70, "memory_used_gb": 1},
+                                    {"gpu_id": "y", "utilization": 20, "memory_used_gb": 1}], k=2)
+    assert [c["gpu_id"] for c in api.predict(body)["candidates"]] == ["y", "x"]
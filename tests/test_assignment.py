@@ -0,0 +1,52 @@
+import numpy as np
+from scheduling.assignment import assign_tasks, headroom_scores
+
+
+class CountingScorer:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, features):
+        self.calls += 1
+        return headroom_scores(features)
+
+
+def fleet(num_gpus, utilization=0.0):
+    gpu_ids = [f"GPU_{i}" for i in range(num_gpus)]
+    return gpu_ids, np.full(num_gpus, utilization), np.zeros(num_gpus), np.full(num_gpus, 80.0)
+
+
+def test_batch_smaller_than_the_fleet_is_scored_in_one_call():
+    gpu_ids, utilization, memory_used, memory_total = fleet(100)
+    tasks = [{"task_id": i, "memory_gb": 4, "utilization": 10 + i % 3} for i in range(40)]
+    scorer = CountingScorer()
+    placed, unplaced = assign_tasks(tasks, gpu_ids, utilization, memory_used, memory_total, score_fn=scorer)
+    assert unplaced == []
+    assert len({gpu_id for _, gpu_id, _ in placed}) == 40
+    # Profiles scored up front; every task fits on a GPU of its own, so no rescoring.
+    assert scorer.calls == 1
+
+
+def test_later_rounds_see_earlier_placements():
+    gpu_ids, utilization, memory_used, memory_total = fleet(2)
+    utilization[1] = 30.0
+    tasks = [{"task_id": i, "memory_gb": 1, "utilization": 20} for i in range(4)]
+    scorer = CountingScorer()
+    placed, unplaced = assign_tasks(tasks, gpu_ids, utilization, memory_used, memory_total, score_fn=scorer)
+    assert unplaced == []
+    by_gpu = {}
+    for _, gpu_id, _ in placed:
+        by_gpu[gpu_id] = by_gpu.get(gpu_id, 0) + 1
+    # Each round both GPUs take one task, best-scoring first; the round ends with one rescoring call.
+    assert by_gpu == {"GPU_0": 2, "GPU_1": 2}
+    assert [gpu_id for _, gpu_id, _ in placed] == ["GPU_0", "GPU_1", "GPU_0", "GPU_1"]
+    assert [score for _, _, score in placed] == [80.0, 50.0, 60.0, 30.0]
+    assert scorer.calls == 2
+
+
+def test_tasks_that_fit_nowhere_are_returned():
+    gpu_ids, utilization, memory_used, memory_total = fleet(2, utilization=90.0)
+    placed, unplaced = assign_tasks(["a", "b"], gpu_ids, utilization, memory_used, memory_total,
+                                    score_fn=headroom_scores)
+    assert placed == []
+    assert unplaced == ["a", "b"]
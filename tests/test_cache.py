@@ -0,0 +1,74 @@
+import threading
+import time
+import pytest
+from api.cache import ResponseCache
+from db.database import DatabaseManager
+
+
+def test_hits_until_ttl_expires():
+    cache = ResponseCache(ttl=0.05)
+    calls = []
+    compute = lambda: calls.append(1) or len(calls)
+    assert cache.get_or_compute("overview", 1, compute) == 1
+    assert cache.get_or_compute("overview", 1, compute) == 1
+    time.sleep(0.06)
+    assert cache.get_or_compute("overview", 1, compute) == 2
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_new_generation_invalidates_at_once():
+    cache = ResponseCache(ttl=60)
+    assert cache.get_or_compute("overview", 1, lambda: "old") == "old"
+    assert cache.get_or_compute("overview", 2, lambda: "new") == "new"
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_concurrent_misses_compute_once():
+    cache = ResponseCache(ttl=60)
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "value"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("k", 1, slow)))
+               for _ in range(8)]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while cache.stats()["coalesced"] < 7 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == ["value"] * 8
+    assert len(calls) == 1
+    assert cache.stats()["coalesced"] == 7
+
+
+def test_errors_reach_waiters_and_are_not_cached():
+    cache = ResponseCache(ttl=60)
+
+    def fail():
+        raise RuntimeError("database is locked")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute("k", 1, fail)
+    assert cache.get_or_compute("k", 1, lambda: "ok") == "ok"
+
+
+def test_generation_is_zero_before_migrations(tmp_path):
+    db = DatabaseManager(db_path=str(tmp_path / "empty.db"))
+    db.connect()
+    try:
+        assert db.get_ingest_generation() == 0
+    finally:
+        db.close()
@@ -0,0 +1,74 @@
+import numpy as np
+from scheduling.capacity_index import CapacityIndex, utilization_band
+
+CLUSTERS = ("c0", "c1", "c2")
+VENDORS = ("NVIDIA", "AMD")
+
+
+def random_fleet(num_gpus, seed=0):
+    rng = np.random.default_rng(seed)
+    memory_total = rng.choice([16.0, 24.0, 40.0, 80.0, 96.0], num_gpus)
+    return {
+        "gpu_id": np.array([f"GPU_{i}" for i in range(num_gpus)]),
+        "cluster_name": rng.choice(CLUSTERS, num_gpus),
+        "vendor": rng.choice(VENDORS, num_gpus),
+        "memory_total_gb": memory_total,
+        "utilization": rng.uniform(0, 100, num_gpus),
+        "memory_used_gb": rng.uniform(0, 1, num_gpus) * memory_total,
+        "timestamp": np.array(["2026-01-01 00:00:00"] * num_gpus),
+    }
+
+
+def brute_force(fleet, memory_gb, utilization, cluster=None, vendor=None, max_utilization=95.0):
+    fits = ((fleet["memory_total_gb"] - fleet["memory_used_gb"] >= memory_gb)
+            & (fleet["utilization"] <= max_utilization - utilization))
+    if cluster is not None:
+        fits &= fleet["cluster_name"] == cluster
+    if vendor is not None:
+        fits &= fleet["vendor"] == vendor
+    return set(fleet["gpu_id"][fits].tolist())
+
+
+def test_candidates_match_brute_force_filter():
+    fleet = random_fleet(3000)
+    index = CapacityIndex()
+    index.load_snapshot(fleet)
+    rng = np.random.default_rng(1)
+    for _ in range(200):
+        memory_gb = float(rng.choice([0.5, 2, 3.5, 8, 20, 50]))
+        utilization = float(rng.uniform(0, 60))
+        cluster = rng.choice([None, *CLUSTERS])
+        vendor = rng.choice([None, *VENDORS])
+        found = index.candidates(memory_gb, utilization, cluster=cluster, vendor=vendor, limit=len(fleet["gpu_id"]))
+        assert len(found) == len(set(found))
+        assert set(found) == brute_force(fleet, memory_gb, utilization, cluster, vendor)
+
+
+def test_limited_lookups_return_least_loaded_bands_first():
+    fleet = random_fleet(3000, seed=2)
+    index = CapacityIndex()
+    index.load_snapshot(fleet)
+    found = index.candidates(4, 10, limit=50)
+    expected = brute_force(fleet, 4, 10)
+    assert len(found) == 50 and set(found) <= expected
+    utilization = dict(zip(fleet["gpu_id"].tolist(), fleet["utilization"].tolist()))
+    bands = [utilization_band(utilization[gpu_id]) for gpu_id in found]
+    assert bands == sorted(bands)
+    assert max(bands) <= min(utilization_band(utilization[gpu_id]) for gpu_id in expected - set(found))
+
+
+def test_updates_and_reservations_move_gpus_between_cells():
+    fleet = random_fleet(500, seed=3)
+    index = CapacityIndex()
+    index.load_snapshot(fleet)
+    gpu_id = "GPU_0"
+    index.update([(gpu_id, 0.0, 0.0, 40.0, 100.0, "2026-01-01 00:01:00")])
+    fleet["utilization"][0], fleet["memory_used_gb"][0] = 0.0, 0.0
+    assert gpu_id in index.candidates(1, 50, limit=500)
+    # Older samples are ignored.
+    index.update([(gpu_id, 99.0, 0.0, 40.0, 100.0, "2026-01-01 00:00:30")])
+    assert gpu_id in index.candidates(1, 50, limit=500)
+    index.reserve(gpu_id, 0.0, 90.0)
+    fleet["utilization"][0] = 90.0
+    for memory_gb, utilization in ((1, 0), (1, 10), (8, 3)):
+        assert set(index.candidates(memory_gb, utilization, limit=500)) == brute_force(fleet, memory_gb, utilization)
@@ -0,0 +1,68 @@
+import threading
+import time
+import pytest
+from db.database import DatabaseManager
+from db.ingestion import IngestionService
+
+
+def rows(count, start=0):
+    return [(f"GPU_{i % 8}", 50.0, 8.0, 50.0, 200.0, f"2026-01-01 00:01:{i % 60:02d}")
+            for i in range(start, start + count)]
+
+
+def test_commits_rows_and_notifies_listeners(fleet_db):
+    seen = []
+    service = IngestionService(db_path=fleet_db, batch_size=10, flush_interval=0.05)
+    service.add_commit_listener(lambda batch: seen.append(len(batch)))
+    service.start()
+    try:
+        service.submit(rows(25))
+        assert service.flush(timeout=5)
+    finally:
+        service.stop()
+    assert service.committed_rows == 25
+    assert sum(seen) == 25
+    db = DatabaseManager(db_path=fleet_db)
+    db.connect()
+    assert db.conn.execute("SELECT COUNT(*) FROM gpu_metrics").fetchone()[0] == 8 + 25
+    db.close()
+
+
+def test_submit_times_out_while_queue_is_full(fleet_db):
+    # Writer never started, so nothing drains the queue.
+    service = IngestionService(db_path=fleet_db, max_pending_rows=10)
+    assert service.submit(rows(10))
+    start = time.monotonic()
+    assert service.submit(rows(5), timeout=0.1) is False
+    assert time.monotonic() - start >= 0.1
+    assert service.pending_rows == 10
+
+
+def test_stop_writes_queued_rows(fleet_db):
+    service = IngestionService(db_path=fleet_db, batch_size=1000, flush_interval=60).start()
+    service.submit(rows(30))
+    service.stop(timeout=5)
+    assert service.committed_rows == 30
+    with pytest.raises(RuntimeError):
+        service.submit(rows(1))
+
+
+def test_blocked_producer_fails_when_writer_dies(tmp_path):
+    service = IngestionService(db_path=str(tmp_path / "missing" / "fleet.db"), max_pending_rows=10)
+    service.submit(rows(10))
+    errors = []
+
+    def produce():
+        try:
+            service.submit(rows(5))
+        except RuntimeError as e:
+            errors.append(e)
+
+    producer = threading.Thread(target=produce)
+    producer.start()
+    time.sleep(0.05)
+    # The writer cannot open the database and stops; the blocked producer must not hang.
+    service.start()
+    producer.join(timeout=5)
+    assert not producer.is_alive()
+    assert len(errors) == 1
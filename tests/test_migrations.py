@@ -0,0 +1,71 @@
+from db import migrations
+from db.database import DatabaseManager
+
+
+def open_db(db_path):
+    db = DatabaseManager(db_path=db_path)
+    db.connect()
+    return db
+
+
+def applied_versions(db):
+    return [row[0] for row in db.conn.execute("SELECT version FROM schema_version ORDER BY version")]
+
+
+def test_existing_database_is_upgraded_once(tmp_path, monkeypatch, capsys):
+    db_path = str(tmp_path / "old.db")
+    # A database created while only the first migration existed, with data in it.
+    monkeypatch.setattr(migrations, "MIGRATIONS", migrations.MIGRATIONS[:1])
+    db = open_db(db_path)
+    db.create_tables()
+    db.insert_cluster("cluster-a")
+    db.insert_rack("rack-1", "cluster-a")
+    db.insert_gpu("GPU_0", "rack-1", "NVIDIA", "A100", 80, 312.0, 2039)
+    # Plain SQL: the ingest path already expects later migrations (ingest_state).
+    db.conn.execute("""
+        INSERT INTO gpu_metrics (gpu_id, utilization, memory_used_gb, temperature, power_watts, timestamp)
+        VALUES ('GPU_0', 10.0, 8.0, 50.0, 200.0, '2026-01-01 00:00:00')
+    """)
+    db.conn.commit()
+    assert applied_versions(db) == [1]
+    db.close()
+    monkeypatch.undo()
+    capsys.readouterr()
+
+    db = open_db(db_path)
+    try:
+        db.create_tables()
+        latest = migrations.MIGRATIONS[-1][0]
+        assert applied_versions(db) == list(range(1, latest + 1))
+        assert capsys.readouterr().out.count("Applied migration") == latest - 1
+        # Running again is a no-op.
+        db.create_tables()
+        assert migrations.get_schema_version(db.conn) == latest
+        assert applied_versions(db) == list(range(1, latest + 1))
+        assert "Applied migration" not in capsys.readouterr().out
+        assert db.conn.execute("SELECT COUNT(*) FROM gpu_metrics").fetchone()[0] == 1
+        indexes = {row[0] for row in db.conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert set(migrations.GPU_METRICS_INDEXES) <= indexes
+    finally:
+        db.close()
+
+
+def test_target_version_limits_the_upgrade(tmp_path):
+    db = open_db(str(tmp_path / "fresh.db"))
+    try:
+        db.create_tables()
+        assert migrations.apply_migrations(db.conn, target_version=2) == migrations.MIGRATIONS[-1][0]
+    finally:
+        db.close()
+    db = open_db(str(tmp_path / "partial.db"))
+    try:
+        migrations.ensure_version_table(db.conn)
+        db.conn.execute("CREATE TABLE gpu_metrics (metric_id INTEGER PRIMARY KEY, gpu_id TEXT, utilization REAL, "
+                        "memory_used_gb REAL, temperature REAL, power_watts REAL, timestamp DATETIME)")
+        db.conn.execute("CREATE TABLE racks (rack_id TEXT PRIMARY KEY, cluster_name TEXT)")
+        db.conn.execute("CREATE TABLE gpus (gpu_id TEXT PRIMARY KEY, rack_id TEXT)")
+        db.conn.commit()
+        assert migrations.apply_migrations(db.conn, target_version=2) == 2
+        assert applied_versions(db) == [1, 2]
+    finally:
+        db.close()
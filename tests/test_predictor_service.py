@@ -0,0 +1,49 @@
+import threading
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+from scheduling.predictor_service import PredictorService  # noqa: E402
+
+
+def linear_model():
+    """score = utilization + 10 * memory, so every row's score is easy to predict."""
+    model = torch.nn.Linear(2, 1, bias=False)
+    with torch.no_grad():
+        model.weight.copy_(torch.tensor([[1.0, 10.0]]))
+    return model.eval()
+
+
+def test_concurrent_requests_share_batches_and_get_their_own_slice():
+    service = PredictorService(model=linear_model(), max_wait=0.05).start()
+    matrices = [np.array([[float(i), float(row)] for row in range(i % 4 + 1)]) for i in range(12)]
+    results = [None] * len(matrices)
+
+    def call(i):
+        results[i] = service.score(matrices[i], timeout=5)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(len(matrices))]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        service.stop()
+    for features, scores in zip(matrices, results):
+        np.testing.assert_allclose(scores, features[:, 0] + 10 * features[:, 1])
+    assert service.batches < service.requests == len(matrices)
+
+
+def test_top_gpus_and_shape_validation():
+    service = PredictorService(model=linear_model()).start()
+    try:
+        ranked = service.top_gpus(["a", "b", "c"], [[10, 1], [50, 0], [0, 8]], k=2, timeout=5)
+        with pytest.raises(ValueError):
+            service.submit([[1, 2, 3]])
+        with pytest.raises(ValueError):
+            service.submit([1, 2])
+    finally:
+        service.stop()
+    assert [gpu_id for gpu_id, _ in ranked] == ["c", "b"]
+    assert ranked[0][1] == pytest.approx(80.0)
@@ -0,0 +1,69 @@
+from db.database import DatabaseManager
+from scheduling.capacity_index import CapacityIndex
+from scheduling.rebalancer import Rebalancer
+
+
+def hot_index(db_path):
+    """fleet_db's index with GPU_7 pushed to 95% utilization."""
+    db = DatabaseManager(db_path=db_path)
+    db.connect()
+    try:
+        index = CapacityIndex()
+        index.load_snapshot(db.get_fleet_snapshot())
+    finally:
+        db.close()
+    index.update([("GPU_7", 95.0, 8.0, 50.0, 200.0, "2026-01-01 00:01:00")])
+    return index
+
+
+def observe_ticks(rebalancer, index, ticks):
+    moves = []
+    for _ in range(ticks):
+        moves.extend(rebalancer.observe(index))
+    return moves
+
+
+def test_moves_task_off_sustained_hot_gpu(fleet_db):
+    index = hot_index(fleet_db)
+    rebalancer = Rebalancer(db_path=fleet_db, sustained_ticks=3)
+    rebalancer.track("t1", "GPU_7", 4, 30)
+    try:
+        assert observe_ticks(rebalancer, index, 2) == []
+        moves = observe_ticks(rebalancer, index, 1)
+    finally:
+        rebalancer.close()
+    assert [move[:2] for move in moves] == [("t1", "GPU_7")]
+    assert rebalancer.placements() == {"t1": moves[0][2]}
+
+
+def test_completed_tasks_are_not_moved(fleet_db):
+    index = hot_index(fleet_db)
+    rebalancer = Rebalancer(db_path=fleet_db, sustained_ticks=3)
+    rebalancer.track("done", "GPU_7", 4, 30)
+    rebalancer.track("running", "GPU_7", 4, 30)
+    assert rebalancer.forget("done")
+    assert not rebalancer.forget("done")
+    try:
+        moves = observe_ticks(rebalancer, index, 3)
+    finally:
+        rebalancer.close()
+    assert [move[0] for move in moves] == ["running"]
+    db = DatabaseManager(db_path=fleet_db)
+    db.connect()
+    try:
+        recorded = db.conn.execute("SELECT task_id FROM task_migrations").fetchall()
+    finally:
+        db.close()
+    assert recorded == [("running",)]
+
+
+def test_placements_expire_after_ttl(fleet_db):
+    index = hot_index(fleet_db)
+    rebalancer = Rebalancer(db_path=fleet_db, sustained_ticks=1, placement_ttl=0)
+    rebalancer.track("t1", "GPU_7", 4, 30)
+    try:
+        assert rebalancer.tracked_count() == 0
+        assert observe_ticks(rebalancer, index, 3) == []
+    finally:
+        rebalancer.close()
+    assert rebalancer.expired == 1
@@ -0,0 +1,99 @@
+import datetime
+import pytest
+from db.database import DatabaseManager
+from db.retention import RetentionManager
+from db.rollups import RollupCompactor
+
+NOW = datetime.datetime(2026, 1, 20, 12, 0, 0)
+
+
+def insert_minutes(db_path, start, minutes, gpu_ids=("GPU_0", "GPU_1"), utilization=50.0):
+    records = [(gpu_id, utilization, 8.0, 50.0, 200.0,
+                (start + datetime.timedelta(minutes=minute)).strftime("%Y-%m-%d %H:%M:%S"))
+               for minute in range(minutes) for gpu_id in gpu_ids]
+    db = DatabaseManager(db_path=db_path)
+    db.connect()
+    try:
+        db.insert_gpu_metrics_batch(records)
+    finally:
+        db.close()
+
+
+def query(db_path, sql, params=()):
+    db = DatabaseManager(db_path=db_path)
+    db.connect()
+    try:
+        return db.conn.execute(sql, params).fetchall()
+    finally:
+        db.close()
+
+
+def retention(db_path, **kwargs):
+    kwargs.setdefault("pause_seconds", 0)
+    return RetentionManager(db_path=db_path, **kwargs)
+
+
+def test_nothing_is_pruned_before_the_first_compaction(fleet_db):
+    insert_minutes(fleet_db, NOW - datetime.timedelta(days=10), 5)
+    assert retention(fleet_db).prune(now=NOW) == 0
+    assert query(fleet_db, "SELECT COUNT(*) FROM gpu_metrics")[0][0] == 8 + 10
+
+
+def test_prunes_rows_older_than_the_cutoff_in_batches(fleet_db):
+    old = NOW - datetime.timedelta(days=10)
+    insert_minutes(fleet_db, old, 30)
+    insert_minutes(fleet_db, NOW - datetime.timedelta(days=1), 5)
+    RollupCompactor(db_path=fleet_db).compact(now=NOW)
+    generation = query(fleet_db, "SELECT generation FROM ingest_state")[0][0]
+
+    manager = retention(fleet_db, batch_size=7, rollup_retention_days={})
+    # fleet_db's own 8 samples (2026-01-01) plus the 60 ten-day-old ones.
+    assert manager.prune(now=NOW) == 8 + 60
+    remaining = query(fleet_db, "SELECT MIN(timestamp), COUNT(*) FROM gpu_metrics")[0]
+    assert remaining[0] >= (NOW - datetime.timedelta(days=7)).strftime("%Y-%m-%d %H:%M:%S")
+    assert remaining[1] == 10
+    # One generation bump per batch of 7.
+    assert query(fleet_db, "SELECT generation FROM ingest_state")[0][0] == generation + 10
+
+
+def test_rows_committed_below_the_watermark_are_rolled_up_before_pruning(fleet_db):
+    old = NOW - datetime.timedelta(days=10)
+    insert_minutes(fleet_db, old, 10)
+    RollupCompactor(db_path=fleet_db).compact(now=NOW)
+    # A backfill lands for minutes the compactor has already passed.
+    insert_minutes(fleet_db, old, 10, gpu_ids=("GPU_2",), utilization=90.0)
+    manager = retention(fleet_db, rollup_retention_days={})
+    manager.prune(now=NOW)
+    late = query(fleet_db, "SELECT COUNT(*) FROM gpu_metrics WHERE gpu_id = 'GPU_2' AND timestamp >= '2026-01-02'")
+    assert late[0][0] == 10
+
+    RollupCompactor(db_path=fleet_db).compact(now=NOW)
+    minute = old.strftime("%Y-%m-%d %H:%M:%S")
+    cluster = query(fleet_db, """
+        SELECT sample_count, utilization_avg, utilization_max FROM metric_rollups
+        WHERE resolution = '1m' AND scope = 'cluster' AND bucket_start = ?
+    """, (minute,))
+    assert cluster == [(3, pytest.approx(190.0 / 3), 90.0)]
+    hour = query(fleet_db, """
+        SELECT sample_count FROM metric_rollups
+        WHERE resolution = '1h' AND scope = 'cluster' AND bucket_start = ?
+    """, (old.strftime("%Y-%m-%d %H:00:00"),))
+    assert hour == [(30,)]
+    manager.prune(now=NOW)
+    assert query(fleet_db, "SELECT COUNT(*) FROM gpu_metrics WHERE timestamp < '2026-01-19'")[0][0] == 0
+
+
+def test_rollup_resolutions_have_their_own_windows(fleet_db):
+    insert_minutes(fleet_db, NOW - datetime.timedelta(days=40), 3)
+    insert_minutes(fleet_db, NOW - datetime.timedelta(days=3), 3)
+    RollupCompactor(db_path=fleet_db).compact(now=NOW)
+    retention(fleet_db, rollup_retention_days={"1m": 30, "1h": 20, "1d": None}).prune(now=NOW)
+
+    by_resolution = dict(query(fleet_db, """
+        SELECT resolution, MIN(bucket_start) FROM metric_rollups WHERE scope = 'cluster' GROUP BY resolution
+    """))
+    thirty_days = (NOW - datetime.timedelta(days=30)).strftime("%Y-%m-%d %H:%M:%S")
+    assert by_resolution["1m"] > thirty_days
+    assert by_resolution["1h"] > thirty_days
+    # 1d rows are kept.
+    assert by_resolution["1d"] == "2025-12-11 00:00:00"
@@ -0,0 +1,86 @@
+import datetime
+import numpy as np
+import pytest
+from db.database import DatabaseManager
+from db.rollups import RollupCompactor, aggregate, STAT_COLUMNS
+
+NOW = datetime.datetime(2026, 1, 1, 3, 0, 0)
+
+
+def insert(db_path, records):
+    db = DatabaseManager(db_path=db_path)
+    db.connect()
+    try:
+        db.insert_gpu_metrics_batch(records)
+    finally:
+        db.close()
+
+
+def query(db_path, sql, params=()):
+    db = DatabaseManager(db_path=db_path)
+    db.connect()
+    try:
+        return db.conn.execute(sql, params).fetchall()
+    finally:
+        db.close()
+
+
+def raw_stats(values):
+    values = np.asarray(values, dtype=np.float64)
+    return {name: values for name in STAT_COLUMNS}
+
+
+def test_aggregate_matches_numpy_per_group():
+    rng = np.random.default_rng(0)
+    values = rng.uniform(0, 100, 200)
+    buckets = np.array(["2026-01-01 00:00:00", "2026-01-01 00:01:00"] * 100)
+    scope_ids = np.array(["a"] * 100 + ["b"] * 100)
+    rows = aggregate(buckets, scope_ids, np.ones(200), raw_stats(values))
+    assert len(rows) == 4
+    for scope_id, bucket, count, util_avg, util_min, util_max, util_p95, *_ in rows:
+        group = values[(scope_ids == scope_id) & (buckets == bucket)]
+        assert count == len(group) == 50
+        assert util_avg == pytest.approx(group.mean())
+        assert util_min == group.min()
+        assert util_max == group.max()
+        # Inverted-CDF percentile: the smallest sample with at least 95% of the group at or below it.
+        assert util_p95 == np.percentile(group, 95, method="inverted_cdf")
+
+
+def test_weighted_merge_of_child_rows():
+    stats = {name: np.array([10.0, 30.0]) for name in STAT_COLUMNS}
+    stats.update({name: np.array([5.0, 20.0]) for name in STAT_COLUMNS if name.endswith("_min")})
+    rows = aggregate(np.array(["h", "h"]), np.array(["x", "x"]), np.array([1, 3]), stats)
+    (_, _, count, avg, low, high, p95, *_), = rows
+    assert count == 4
+    assert avg == pytest.approx((10 + 3 * 30) / 4)
+    assert (low, high, p95) == (5.0, 30.0, 30.0)
+
+
+def test_compact_rolls_up_closed_buckets_and_advances_the_watermark(fleet_db):
+    # fleet_db holds one sample per GPU at 00:00:00; add a second minute and one still-open minute.
+    insert(fleet_db, [(f"GPU_{i}", 50.0, 8.0, 50.0, 200.0, "2026-01-01 00:01:30") for i in range(8)])
+    compactor = RollupCompactor(db_path=fleet_db)
+    written = compactor.compact(now=datetime.datetime(2026, 1, 1, 0, 2, 40))
+    # 2 minutes x (8 GPUs + 1 rack + 1 cluster); the 00:02 minute is not closed yet.
+    assert written["1m"] == 20
+    assert written["1h"] == 0
+    cluster = query(fleet_db, """
+        SELECT bucket_start, sample_count, utilization_avg, utilization_min, utilization_max
+        FROM metric_rollups WHERE resolution = '1m' AND scope = 'cluster' ORDER BY bucket_start
+    """)
+    assert cluster == [("2026-01-01 00:00:00", 8, pytest.approx(35.0), 0.0, 70.0),
+                       ("2026-01-01 00:01:00", 8, 50.0, 50.0, 50.0)]
+    assert query(fleet_db, "SELECT completed_until FROM rollup_watermarks WHERE resolution = '1m'") == \
+        [("2026-01-01 00:02:00",)]
+
+    # A second run only picks up what closed since, and the hour rolls up once 1m has passed it.
+    insert(fleet_db, [("GPU_0", 90.0, 8.0, 50.0, 200.0, "2026-01-01 01:10:00")])
+    written = compactor.compact(now=NOW)
+    assert written["1m"] == 3
+    hours = query(fleet_db, """
+        SELECT bucket_start, sample_count, utilization_max FROM metric_rollups
+        WHERE resolution = '1h' AND scope = 'cluster' ORDER BY bucket_start
+    """)
+    assert hours == [("2026-01-01 00:00:00", 16, 70.0), ("2026-01-01 01:00:00", 1, 90.0)]
+    assert compactor.compact(now=NOW) == {"1m": 0, "1h": 0, "1d": 0}
@@ -0,0 +1,92 @@
+import time
+import pytest
+from scheduling.assignment import headroom_scores
+from scheduling.scheduler import EventDrivenScheduler
+
+
+def make_scheduler(db_path, **kwargs):
+    kwargs.setdefault("rebalance", False)
+    kwargs.setdefault("coalesce_seconds", 0.01)
+    return EventDrivenScheduler(db_path=db_path, score_fn=headroom_scores, **kwargs).start()
+
+
+def test_submit_resolves_to_least_loaded_gpu(fleet_db):
+    scheduler = make_scheduler(fleet_db)
+    try:
+        gpu_id, score = scheduler.submit({"task_id": "t1", "memory_gb": 4, "utilization": 10}).result(timeout=5)
+    finally:
+        scheduler.stop()
+    assert gpu_id == "GPU_0"
+    # Scored after the placement: 100 - (0 + 10) headroom.
+    assert score == pytest.approx(90.0)
+    assert scheduler.stats()["placed"] == 1
+
+
+def test_burst_is_coalesced_into_one_pass(fleet_db):
+    scheduler = make_scheduler(fleet_db, coalesce_seconds=0.2)
+    try:
+        futures = [scheduler.submit({"task_id": f"t{i}", "memory_gb": 1, "utilization": 1}) for i in range(40)]
+        results = [future.result(timeout=5) for future in futures]
+    finally:
+        scheduler.stop()
+    assert len(results) == 40
+    assert scheduler.stats()["passes"] == 1
+
+
+def test_stop_fails_tasks_still_waiting(fleet_db):
+    scheduler = make_scheduler(fleet_db)
+    future = scheduler.submit({"task_id": "huge", "memory_gb": 10000, "utilization": 10})
+    time.sleep(0.1)
+    assert not future.done()
+    scheduler.stop()
+    with pytest.raises(RuntimeError):
+        future.result(timeout=5)
+    with pytest.raises(RuntimeError):
+        scheduler.submit("late")
+
+
+def test_refresh_error_fails_futures_instead_of_hanging(tmp_path):
+    scheduler = make_scheduler(str(tmp_path / "missing" / "fleet.db"))
+    try:
+        future = scheduler.submit("t1")
+        assert future.exception(timeout=5) is not None
+        # The scheduler thread survives and keeps serving.
+        assert scheduler._thread.is_alive()
+    finally:
+        scheduler.stop()
+
+
+def test_idle_scheduler_does_not_poll(fleet_db):
+    scheduler = EventDrivenScheduler(db_path=fleet_db, score_fn=headroom_scores, rebalance=True, poll_interval=0.01)
+    refreshes = []
+    original = scheduler._refresh
+    scheduler._refresh = lambda db: (refreshes.append(1), original(db))
+    scheduler.start()
+    try:
+        time.sleep(0.2)
+        assert refreshes == []
+        # Once a placement is tracked by the rebalancer, metrics are watched again.
+        scheduler.submit({"task_id": "t1"}).result(timeout=5)
+        polled = len(refreshes)
+        time.sleep(0.2)
+        assert len(refreshes) > polled
+    finally:
+        scheduler.stop()
+
+
+def test_completed_tasks_stop_metric_polling(fleet_db):
+    scheduler = EventDrivenScheduler(db_path=fleet_db, score_fn=headroom_scores, rebalance=True, poll_interval=0.01)
+    refreshes = []
+    original = scheduler._refresh
+    scheduler._refresh = lambda db: (refreshes.append(1), original(db))
+    scheduler.start()
+    try:
+        scheduler.submit({"task_id": "t1"}).result(timeout=5)
+        assert scheduler.complete("t1")
+        assert not scheduler.complete("t1")
+        time.sleep(0.05)
+        polled = len(refreshes)
+        time.sleep(0.2)
+        assert len(refreshes) == polled
+    finally:
+        scheduler.stop()